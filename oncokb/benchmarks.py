@@ -0,0 +1,338 @@
+"""
+Benchmarks for the OncoKB ETL. The lookup tables that transform reads from Oracle are served by an in-memory SQLite
+stand-in, so these run without a database connection.
+
+Run from this directory, for example:
+    python benchmarks.py transform --rows 1000000
+    python benchmarks.py load --rows 200000 --batch-size 5000
+    python benchmarks.py load-delta --rows 200000
+    python benchmarks.py stream --rows 1000000 --files 20
+    python benchmarks.py check-fixtures
+"""
+import argparse
+import glob
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+
+import oncokbETL as etl
+
+# The OncoKB annotated files of the NCI-60 cell lines from the SQL*Loader version of the ETL
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'oncoKB_sqlloader', 'archive')
+
+GENES = ['TP53', 'KRAS', 'EGFR', 'BRAF', 'PTEN', 'PIK3CA', 'APC', 'NRAS', 'CDKN2A', 'HLA-A', 'NOTAGENE']
+VARIANT_CLASSES = ['Missense_Mutation', 'Nonsense_Mutation', 'Frame_Shift_Del', 'Frame_Shift_Ins', 'Splice_Site',
+                   'In_Frame_Del', 'Silent']
+CELL_LINES = list(etl.cell_name_map) + ['MCF7', 'SK_MEL_5', 'OVCAR_4', 'HCT_116', 'MOLT_4', '786_0']
+
+
+def sqlite_engine(genes=GENES, variant_classes=VARIANT_CLASSES[:-1]):
+    """
+    Creates an in-memory SQLite engine with the COMMON.VARIANTCLASS and COMMON.HUGOGENESYMBOL lookup tables and an
+    empty COMMON.ONCOKBGENEPANEL, the Oracle COMMON schema being an attached database. The last gene of GENES is left out so unknown symbols are covered.
+    :param genes: list: hugo gene symbols, numbered from 1
+    :param variant_classes: list: variant class descriptions
+    :return: Engine: the SQLite engine
+    """
+    engine = create_engine('sqlite://', poolclass=StaticPool)
+
+    @event.listens_for(engine, 'connect')
+    def attach_common(dbapi_connection, connection_record):
+        dbapi_connection.execute("ATTACH DATABASE ':memory:' AS COMMON")
+
+    with engine.begin() as conn:
+        pd.DataFrame({'variantclassdescription': variant_classes}).to_sql(
+            'VARIANTCLASS', conn, schema='COMMON', index=False)
+        pd.DataFrame({'hugogenesymbolseqnbr': range(1, len(genes)),
+                      'hugogenesymboldescription': genes[:-1]}).to_sql(
+            'HUGOGENESYMBOL', conn, schema='COMMON', index=False)
+        conn.exec_driver_sql(f'CREATE TABLE {etl.load_table} ({", ".join(etl.db_cols)})')
+    return engine
+
+
+def make_maf(n_rows, seed=0):
+    """
+    Creates a synthetic extract of OncoKB annotated MAF rows, with the kept columns and dtypes of read_data.
+    :param n_rows: int: number of rows
+    :param seed: int: random seed
+    :return: DataFrame: the rows
+    """
+    rng = np.random.default_rng(seed)
+
+    def pick(values, p_missing=0.0):
+        column = pd.Series(np.asarray(values, dtype=object)[rng.integers(0, len(values), n_rows)], dtype='string')
+        column[rng.random(n_rows) < p_missing] = pd.NA
+        return column
+
+    def pick_unique(*parts, p_missing=0.0):
+        column = pd.Series(parts[0], index=range(n_rows), dtype='string')
+        for part in parts[1:]:
+            column = column + (part if isinstance(part, str) else pd.Series(part).astype(str).astype('string'))
+        column[rng.random(n_rows) < p_missing] = pd.NA
+        return column
+
+    start = rng.integers(1, 10 ** 8, n_rows)
+    df = pd.DataFrame({
+        'Tumor_Sample_Barcode': pick(CELL_LINES),
+        'Hugo_Symbol': pick(GENES),
+        'Chromosome': pick([str(c) for c in range(1, 23)] + ['X', 'Y']),
+        'Start_Position': start,
+        'End_Position': start + rng.integers(0, 5, n_rows),
+        'Variant_Classification': pick(VARIANT_CLASSES + ['Unknown_Class']),
+        'Reference_Allele': pick(list('ACGT') + ['-']),
+        'Tumor_Seq_Allele2': pick(list('ACGT') + ['-']),
+        # Nearly every variant has its own cDNA change
+        'HGVSc': pick_unique('ENST00000', rng.integers(100000, 999999, n_rows), ':c.', start % 5000, 'A>G',
+                             p_missing=0.05),
+        'HGVSp_Short': pick(['p.G12D', 'p.V600E', 'p.R273H', 'p.X217_splice'], p_missing=0.1),
+        'Existing_variation': pick(['rs121913529,COSV55497369', 'COSV57014428'], p_missing=0.3),
+        't_depth': rng.integers(5, 800, n_rows),
+        'tumor_vaf': pick([f'{v:.2f}%' for v in np.linspace(1, 100, 997)] + ['n/a'], p_missing=0.02),
+        'SIFT': pick(['deleterious(0)', 'tolerated(0.32)'], p_missing=0.2),
+        'PolyPhen': pick(['probably_damaging(0.998)', 'benign(0.01)'], p_missing=0.2),
+        'ONCOGENIC': pick(['Oncogenic', 'Likely Oncogenic', 'Unknown']),
+        'MUTATION_EFFECT': pick(['Gain-of-function', 'Loss-of-function', 'Unknown']),
+        'Version': pick(['v3.16'])
+    })
+    return df
+
+
+def legacy_transform(df, engine):
+    """
+    The row by row transform before the vectorized functions, kept to check and measure against.
+    """
+    df_variants = pd.read_sql(etl.variants_sql, engine)
+    df_hugo = pd.read_sql(etl.hugo_sql, engine)
+    var_dict = dict()
+    hugo_dict = dict()
+    for i in range(0, df_variants.size):
+        var_dict[df_variants.iloc[i, 0]] = i
+    for i in df_hugo.index:
+        hugo_dict[df_hugo['hugogenesymboldescription'][i]] = df_hugo['hugogenesymbolseqnbr'][i]
+
+    df.index = range(0, df.index.size)
+    df = df[etl.keep_cols].copy()
+    df['HGVSc'] = df['HGVSc'].apply(etl.dna_change).copy()
+    df['tumor_vaf'] = df['tumor_vaf'].apply(etl.vaf_type_change).copy()
+    df['Chromosome'] = df['Chromosome'].apply(etl.chr_change).copy()
+    df.columns = etl.db_cols
+    df['CELLLINENAME'] = df['CELLLINENAME'].apply(etl.cell_line_changes).copy()
+    df['HUGOGENESYMBOLSEQNBR'] = df['HUGOGENESYMBOLSEQNBR'].apply(etl.hugo_map, hugo_dict=hugo_dict).copy()
+    df['VARIANTCLASSSEQNBR'] = df['VARIANTCLASSSEQNBR'].map(var_dict).fillna(0)
+    return df.convert_dtypes()
+
+
+def same_output(legacy, vectorized):
+    """
+    :return: bool: whether two transformed frames have the same dtypes and the same CSV bytes
+    """
+    return (legacy.dtypes.equals(vectorized.dtypes) and
+            legacy.to_csv(index=False).encode() == vectorized.to_csv(index=False).encode())
+
+
+def timed(func):
+    """
+    :return: tuple: the result of func and its elapsed milliseconds
+    """
+    start = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def bench_transform(args):
+    """
+    Compares the row by row .apply functions against their vectorized versions on a synthetic extract, one column
+    at a time and for the whole transform.
+    """
+    df = make_maf(args.rows)
+    engine = sqlite_engine()
+    hugo_dict = dict(zip(GENES[:-1], range(1, len(GENES))))
+    columns = [
+        ('tumor_vaf', etl.vaf_type_change, etl.vaf_type_change_vectorized),
+        ('Chromosome', etl.chr_change, etl.chr_change_vectorized),
+        ('Tumor_Sample_Barcode', etl.cell_line_changes, etl.cell_line_changes_vectorized),
+        ('Hugo_Symbol', lambda h: etl.hugo_map(h, hugo_dict), lambda s: etl.hugo_map_vectorized(s, hugo_dict))
+    ]
+
+    print(f'{args.rows:,} synthetic MAF rows')
+    for column, row_func, vectorized_func in columns:
+        legacy, legacy_ms = timed(lambda: df[column].apply(row_func).copy())
+        vectorized, vectorized_ms = timed(lambda: vectorized_func(df[column]))
+        same = legacy.astype(object).equals(vectorized.astype(object))
+        print(f'{column:>20}: apply {legacy_ms:9.1f} ms | vectorized {vectorized_ms:8.1f} ms | '
+              f'{legacy_ms / vectorized_ms:6.1f}x | identical {same}')
+
+    legacy, legacy_ms = timed(lambda: legacy_transform(df.copy(), engine))
+    vectorized, vectorized_ms = timed(lambda: etl.transform(df.copy(), engine))
+    print(f'{"transform":>20}: apply {legacy_ms:9.1f} ms | vectorized {vectorized_ms:8.1f} ms | '
+          f'{legacy_ms / vectorized_ms:6.1f}x | identical {same_output(legacy, vectorized)}')
+
+
+def bench_load(args):
+    """
+    Compares DataFrame.to_sql against the executemany load into the SQLite stand-in of COMMON.ONCOKBGENEPANEL, and
+    checks that both leave the same rows in the table.
+    """
+    df = etl.transform(make_maf(args.rows), sqlite_engine())
+    select_sql = f'SELECT * FROM {etl.load_table} ORDER BY rowid'
+    print(f'{args.rows:,} transformed rows')
+
+    engine = sqlite_engine()
+    _, to_sql_ms = timed(lambda: df.to_sql(name='oncokbgenepanel', dtype=etl.oracle_dtypes, con=engine,
+                                           schema='COMMON', if_exists='append', index=False))
+    print(f'{"to_sql":>20}: {to_sql_ms:9.1f} ms | {args.rows / to_sql_ms * 1000:9.0f} rows/sec')
+    with engine.connect() as conn:
+        expected = conn.exec_driver_sql(select_sql).all()
+
+    for batch_size in args.batch_size or [1000, etl.load_batch_size, 100000]:
+        engine = sqlite_engine()
+        _, load_ms = timed(lambda: etl.load(df, engine, batch_size))
+        with engine.connect() as conn:
+            same = conn.exec_driver_sql(select_sql).all() == expected
+        print(f'{f"executemany {batch_size}":>20}: {load_ms:9.1f} ms | {args.rows / load_ms * 1000:9.0f} rows/sec | '
+              f'{to_sql_ms / load_ms:6.1f}x | identical {same}')
+
+
+def bench_load_delta(args):
+    """
+    Times the delta load of a synthetic extract into the SQLite stand-in: the first load without a manifest, a
+    rerun with the same rows, which must touch none, and a rerun with 1% of the rows changed and 1% replaced.
+    """
+    df = etl.transform(make_maf(args.rows), sqlite_engine())
+    n = max(args.rows // 100, 1)
+    changed = pd.concat([df.iloc[n:], etl.transform(make_maf(n, seed=1), sqlite_engine())], ignore_index=True)
+    changed.loc[:n - 1, 'TOTALREADS'] += 1
+
+    engine = sqlite_engine()
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f'CREATE INDEX COMMON.ONCOKBGENEPANEL_KEY ON ONCOKBGENEPANEL ({", ".join(etl.key_cols)})')
+    manifest = os.path.join(tempfile.mkdtemp(), os.path.basename(etl.manifest_path))
+    print(f'{args.rows:,} transformed rows')
+    try:
+        for name, rows in [('first load', df), ('same rows', df), ('1% changed', changed)]:
+            (deleted, inserted), ms = timed(lambda: etl.load_delta(rows, engine, manifest, missing_ok=True))
+            print(f'{name:>20}: {ms:9.1f} ms | deleted {deleted} variants | inserted {inserted} rows')
+    finally:
+        shutil.rmtree(os.path.dirname(manifest))
+
+
+def write_maf_files(directory, n_rows, n_files):
+    """
+    Writes a synthetic extract as one annotated MAF file per cell line, with a few duplicated variant rows.
+    :param directory: str: folder to write the files to
+    :param n_rows: int: total number of rows
+    :param n_files: int: number of files
+    """
+    for i in range(n_files):
+        df = make_maf(n_rows // n_files, seed=i)
+        df['Tumor_Sample_Barcode'] = f'CELL_LINE_{i}'
+        df = pd.concat([df, df.iloc[::1000]], ignore_index=True)
+        df.to_csv(os.path.join(directory, f'CELL_LINE_{i}.oncokb.txt'), sep='\t', index=False)
+
+
+def bench_stream(args):
+    """
+    Compares the whole frame pipeline with the --stream pipeline, by file and by row chunks, on synthetic MAF files.
+    Each pipeline loads an empty SQLite stand-in, timed and then again with tracemalloc for its peak traced memory,
+    and reruns on the loaded table, which must touch no rows. All must leave the same table.
+    """
+    directory = tempfile.mkdtemp()
+    manifest = os.path.join(directory, os.path.basename(etl.manifest_path))
+    etl.data_dir = os.path.join(directory, 'data')
+    os.mkdir(etl.data_dir)
+    write_maf_files(etl.data_dir, args.rows, args.files)
+    chunk_size = args.chunk_size or max(args.rows // args.files // 4, 1)
+    select_sql = f'SELECT * FROM {etl.load_table} ORDER BY {", ".join(etl.db_cols)}'
+    print(f'{args.rows:,} synthetic MAF rows in {args.files} files')
+
+    pipelines = [
+        ('whole frame', lambda engine: etl.load_delta(etl.transform(etl.extract(workers=1), engine), engine, manifest,
+                                                      missing_ok=True)),
+        ('stream by file', lambda engine: etl.stream(engine, None, manifest, missing_ok=True)),
+        (f'stream {chunk_size} rows', lambda engine: etl.stream(engine, chunk_size, manifest, missing_ok=True))
+    ]
+    expected = None
+    try:
+        for name, pipeline in pipelines:
+            for traced in (False, True):
+                if os.path.exists(manifest):
+                    os.remove(manifest)
+                engine = sqlite_engine()
+                if traced:
+                    tracemalloc.start()
+                (_, inserted), ms = timed(lambda: pipeline(engine))
+                if traced:
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                else:
+                    load_ms = ms
+            rerun = pipeline(engine)
+            with engine.connect() as conn:
+                table = conn.exec_driver_sql(select_sql).all()
+            expected = expected or table
+            print(f'{name:>20}: {load_ms:9.1f} ms | peak {peak / 2 ** 20:7.1f} MiB | inserted {inserted} rows | '
+                  f'rerun deleted {rerun[0]} variants, inserted {rerun[1]} rows | same table {table == expected}')
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_check_fixtures(args):
+    """
+    Checks that the vectorized transform gives byte for byte the output of the row by row transform on the
+    annotated NCI-60 files in oncoKB_sqlloader/archive, plus a copy of their first variant without a reference
+    allele. The delta load of the output must then replace and delete that variant although its REFERENCEALLELE key
+    column is NULL, leaving the same table as a plain load.
+    """
+    files = sorted(glob.glob(os.path.join(FIXTURES, '*.oncoKB.txt')))
+    df = pd.concat([pd.read_csv(f, delimiter='\t', usecols=etl.keep_cols, dtype=etl.read_dtypes) for f in files],
+                   ignore_index=True)
+    null_key = df.iloc[[0]].copy()
+    null_key['Reference_Allele'] = pd.NA
+    df = pd.concat([df, null_key], ignore_index=True)
+    engine = sqlite_engine(sorted(df['Hugo_Symbol'].dropna().unique()) + ['NOTAGENE'],
+                           sorted(df['Variant_Classification'].dropna().unique()))
+    legacy = legacy_transform(df.copy(), engine)
+    vectorized = etl.transform(df.copy(), engine)
+    print(f'{len(df)} rows from {len(files)} fixture files, identical output: {same_output(legacy, vectorized)}')
+
+    changed = vectorized.copy()
+    changed.loc[changed.index[-1], 'TOTALREADS'] += 1
+    select_sql = f'SELECT * FROM {etl.load_table} ORDER BY {", ".join(etl.db_cols)}'
+    manifest = os.path.join(tempfile.mkdtemp(), os.path.basename(etl.manifest_path))
+    try:
+        for name, rows in [('first load', vectorized), ('null key changed', changed),
+                           ('null key deleted', vectorized.iloc[:-1])]:
+            deleted, inserted = etl.load_delta(rows, engine, manifest, missing_ok=True)
+            expected_engine = sqlite_engine()
+            etl.load(rows, expected_engine)
+            with engine.connect() as conn, expected_engine.connect() as expected_conn:
+                same = conn.exec_driver_sql(select_sql).all() == expected_conn.exec_driver_sql(select_sql).all()
+            print(f'{name:>20}: deleted {deleted} variants | inserted {inserted} rows | same table as a load {same}')
+    finally:
+        shutil.rmtree(os.path.dirname(manifest))
+
+
+BENCHMARKS = {
+    'transform': bench_transform,
+    'load': bench_load,
+    'load-delta': bench_load_delta,
+    'stream': bench_stream,
+    'check-fixtures': bench_check_fixtures
+}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='OncoKB ETL benchmarks on synthetic data')
+    parser.add_argument('benchmark', choices=BENCHMARKS.keys())
+    parser.add_argument('--rows', type=int, default=1000000, help='number of synthetic MAF rows')
+    parser.add_argument('--batch-size', type=int, action='append', help='load batch size, can be repeated')
+    parser.add_argument('--files', type=int, default=20, help='number of synthetic MAF files of the stream benchmark')
+    parser.add_argument('--chunk-size', type=int, help='rows per chunk of the stream benchmark')
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
@@ -7,11 +7,16 @@ v1.1.0
 """
 from sqlalchemy import create_engine
 from sqlalchemy.dialects.oracle import NUMBER, VARCHAR2
+import argparse
 import pandas as pd
 import numpy as np
 import os
 import oracledb
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
 oracledb.version = "8.3.0"
 sys.modules["cx_Oracle"] = oracledb
 
@@ -62,11 +67,52 @@ db_cols = [
         'MUTATIONEFFECT', 'ONCOKBVERSION'
         ]
 
+# Declared data types of the kept columns when reading the annotated files
+read_dtypes = {
+    'Tumor_Sample_Barcode': 'string',
+    'Hugo_Symbol': 'string',
+    'Chromosome': 'string',
+    'Start_Position': np.int64,
+    'End_Position': np.int64,
+    'Variant_Classification': 'string',
+    'Reference_Allele': 'string',
+    'Tumor_Seq_Allele2': 'string',
+    'HGVSc': 'string',
+    'HGVSp_Short': 'string',
+    'Existing_variation': 'string',
+    't_depth': np.int64,
+    'tumor_vaf': 'string',
+    'SIFT': 'string',
+    'PolyPhen': 'string',
+    'ONCOGENIC': 'string',
+    'MUTATION_EFFECT': 'string',
+    'Version': 'string'
+}
+
+# Folder of the OncoKB annotated files, and the pandas parser used to read them: 'c' or 'pyarrow'
+data_dir = 'data'
+read_engine = 'c'
+
 # SQL to load Variants Class Description data from lookup table
 variants_sql = 'SELECT variantclassdescription FROM COMMON.VARIANTCLASS'
 # SQL to load HugoGeneSymbol data from lookup table
 hugo_sql = 'SELECT * FROM COMMON.HUGOGENESYMBOL'
 
+# Table the annotated variants are loaded into, and the number of
+# rows sent to the database in each executemany call
+load_table = 'COMMON.ONCOKBGENEPANEL'
+load_batch_size = 10000
+
+# Columns that identify a variant row between loads, and the local
+# manifest of the variants that are in the table after the last load
+key_cols = [
+        'CELLLINENAME', 'HUGOGENESYMBOLSEQNBR', 'CHROMOSOME', 'STARTPOSITION',
+        'ENDPOSITION', 'REFERENCEALLELE', 'ALTALLELE', 'ONCOKBVERSION'
+        ]
+manifest_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'oncokbgenepanel_manifest.csv')
+manifest_chunk_size = 100000
+
 # Oracle specific data type conversion
 oracle_dtypes = {
     'CELLLINENAME': VARCHAR2(50),
@@ -89,6 +135,13 @@ oracle_dtypes = {
     'ONCOKBVERSION': VARCHAR2(10)
 }
 
+# pandas data types of the database columns.  Rows are hashed with
+# these, as convert_dtypes can infer others for a part of the data.
+db_dtypes = {
+    c: 'string' if isinstance(t, VARCHAR2) else 'Float64' if t.scale else 'Int64'
+    for c, t in oracle_dtypes.items()
+}
+
 
 # ========== END: Initializing Variables and Database Connections ==========
 
@@ -126,22 +179,23 @@ def chr_change(ch):
     return 'chr{}'.format(str(ch))
 
 
-def read_data(f):
+def read_data(f, directory, usecols, dtypes, engine=read_engine,
+              chunksize=None):
     """
-    Reads the TSV files in the data directory.
-    Some columns are given data type definitions.
+    Reads a TSV file in the given directory.
+    Only the usecols columns are parsed, with the dtypes data types.
+    Everything is passed in rather than read from the module globals
+    so that worker processes started with spawn parse the same files.
+    With a chunksize, returns a reader of DataFrames of that many
+    rows instead, which needs the 'c' engine.
     """
     return pd.read_csv(
-                        'data/{}'.format(f),
+                        os.path.join(directory, f),
                         delimiter='\t',
-                        dtype={
-                            'Chromosome': 'string',
-                            'Start_Position': np.int64,
-                            'End_Position': np.int64,
-                            't_depth': int,
-                            'HGVSc': 'string'
-                        },
-                        engine='python'
+                        usecols=usecols,
+                        dtype=dtypes,
+                        engine=engine,
+                        chunksize=chunksize
                     )
 
 
@@ -170,42 +224,124 @@ def blacklist_filter(row):
         return True
 
 def hugo_map(hugo, hugo_dict):
-		"""
-		Normalizes hugo gene symbols.
-		"""
+    """
+    Normalizes hugo gene symbols.
+    """
     if hugo in hugo_dict:
         return hugo_dict[hugo]
     else:
-        return 0      
+        return 0
+
+
+def transform_uniques(values, func):
+    """
+    Runs a vectorized transform once per distinct value of a Series
+    and spreads the results back over the rows.  Missing values are
+    kept as a distinct value, so func decides what they become.
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    result = func(pd.Series(uniques, dtype=values.dtype))
+    return pd.Series(result.to_numpy()[codes], index=values.index)
+
+
+def vaf_numbers(vaf):
+    """
+    Vectorized vaf_type_change over a Series.  Missing values and
+    values that do not parse as a number after removing the % are
+    0.0 like in vaf_type_change.  pd.to_numeric only finds the valid
+    values; they are parsed with astype, which rounds like float().
+    """
+    stripped = vaf.astype('string').str.replace('%', '', regex=False)
+    valid = pd.to_numeric(stripped, errors='coerce').notna().to_numpy(dtype=bool)
+    vaf_ret = np.zeros(len(vaf), dtype=np.float64)
+    vaf_ret[valid] = stripped[valid].astype(np.float64).to_numpy() / 100
+    return pd.Series(vaf_ret, index=vaf.index)
+
+
+def vaf_type_change_vectorized(vaf):
+    """Vectorized vaf_type_change over a Series"""
+    return transform_uniques(vaf, vaf_numbers).astype(np.float64)
+
+
+def chr_change_vectorized(ch):
+    """Vectorized chr_change over a Series"""
+    return transform_uniques(ch, lambda u: ('chr' + u.astype(str)).astype(object))
+
+
+def cell_line_changes_vectorized(cl):
+    """
+    Vectorized cell_line_changes over a Series: the special cell
+    line names are mapped, then underscores converted to dashes.
+    """
+    return transform_uniques(
+        cl, lambda u: u.map(cell_name_map).fillna(u).str.replace('_', '-', regex=False).astype(object))
+
+
+def hugo_map_vectorized(hugo, hugo_dict):
+    """
+    Vectorized hugo_map over a Series with the hugo symbol lookup
+    dict; symbols that are not in it become 0.
+    """
+    return hugo.astype(object).map(hugo_dict).fillna(0)
+
 
 # ========== END: Define Utility Functions ==========
 
 
-def extract():
+def extract(workers=None, engine=read_engine):
     '''
     Extracts the data from the OncoKB Annotator output files
     into a dataframe.  All input files are located in a co-located
-    folder called data.
+    folder called data.  The files are parsed in parallel by a pool
+    of worker processes and concatenated once.
+
+    workers is the number of processes (default: one per CPU),
+    engine the pandas parser, 'c' or 'pyarrow'.
 
     Returns DataFrame with all data amalgamated.
     '''
+    start = time.perf_counter()
     # Collect all file paths for files in data directory
-    filepaths = [f for f in os.listdir("data/")]
+    filepaths = sorted(os.listdir(data_dir))
 
-    # Sequentially concatenate data from each file into one DF
-    df = pd.concat(map(read_data, filepaths))
+    read = partial(read_data, directory=data_dir, usecols=keep_cols,
+                   dtypes=read_dtypes, engine=engine)
+    if workers == 1 or len(filepaths) < 2:
+        frames = [read(f) for f in filepaths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            frames = list(pool.map(read, filepaths))
+    df = pd.concat(frames, ignore_index=True)
 
+    elapsed = time.perf_counter() - start
+    print(f'Extracted {len(df)} rows from {len(filepaths)} files in '
+          f'{elapsed:.2f}s ({len(df) / elapsed:.0f} rows/sec)')
     return df
 
 
-def transform(df, engine):
+def extract_chunks(chunksize=None, engine=read_engine):
     '''
-    Transforms loaded data into final format of data to represent
-    what will be inserted into Oracle or whatever db.
+    Extracts the data of the OncoKB Annotator output files one
+    piece at a time: a DataFrame per file, or with a chunksize
+    DataFrames of at most that many rows, read with the 'c' engine.
 
-    Returns DataFrame after necessary transformations.
+    Yields the DataFrames in file order.
     '''
+    for f in sorted(os.listdir(data_dir)):
+        if chunksize is None:
+            yield read_data(f, data_dir, keep_cols, read_dtypes, engine)
+        else:
+            with read_data(f, data_dir, keep_cols, read_dtypes, 'c',
+                           chunksize) as reader:
+                yield from reader
 
+
+def lookup_maps(engine):
+    '''
+    Reads the variant class and hugo gene symbol lookup tables.
+
+    Returns the variant class and the hugo symbol mapping dicts.
+    '''
     # DataFrame of the variants data
     df_variants = pd.read_sql(variants_sql, engine)
     # DataFrame of the HugoGene data
@@ -220,6 +356,18 @@ def transform(df, engine):
     for i in df_hugo.index:
         hugo_dict[df_hugo['hugogenesymboldescription'][i]] = \
             df_hugo['hugogenesymbolseqnbr'][i]
+    return var_dict, hugo_dict
+
+
+def transform(df, engine, maps=None):
+    '''
+    Transforms loaded data into final format of data to represent
+    what will be inserted into Oracle or whatever db.  maps are the
+    lookup_maps of the engine, read here if not given.
+
+    Returns DataFrame after necessary transformations.
+    '''
+    var_dict, hugo_dict = maps or lookup_maps(engine)
 
     # Trying to adapt TC code to dataFrame here
     # These two should reflect his whole Script
@@ -235,15 +383,17 @@ def transform(df, engine):
     df.index = range(0, df.index.size)
 
     # Select only the columns we need, discard others
-    df = df[keep_cols]
+    df = df[keep_cols].copy()
 
     # Perform mapping as well as reformatting for columns and column data
-    df['HGVSc'] = df['HGVSc'].apply(dna_change).copy()
-    df['tumor_vaf'] = df['tumor_vaf'].apply(vaf_type_change).copy()
-    df['Chromosome'] = df['Chromosome'].apply(chr_change).copy()
+    # Nearly every cDNA change is distinct, so a vectorized split is
+    # no faster than applying dna_change row by row
+    df['HGVSc'] = df['HGVSc'].apply(dna_change)
+    df['tumor_vaf'] = vaf_type_change_vectorized(df['tumor_vaf'])
+    df['Chromosome'] = chr_change_vectorized(df['Chromosome'])
     df.columns = db_cols
-    df['CELLLINENAME'] = df['CELLLINENAME'].apply(cell_line_changes).copy()
-    df['HUGOGENESYMBOLSEQNBR'] = df['HUGOGENESYMBOLSEQNBR'].apply(hugo_map,hugo_dict=hugo_dict).copy()
+    df['CELLLINENAME'] = cell_line_changes_vectorized(df['CELLLINENAME'])
+    df['HUGOGENESYMBOLSEQNBR'] = hugo_map_vectorized(df['HUGOGENESYMBOLSEQNBR'], hugo_dict)
 
     # For this column, 0, should be in place of any null or NaN values
     df['VARIANTCLASSSEQNBR'] = df['VARIANTCLASSSEQNBR'].map(var_dict).fillna(0)
@@ -254,41 +404,402 @@ def transform(df, engine):
     return df
 
 
-def load(df, engine):
+def bind_variables(paramstyle, n):
+    '''
+    n bind variables in the style of the DB API driver: ':1', ':2',
+    ... for python-oracledb, '?' for sqlite3.
+    '''
+    if paramstyle == 'qmark':
+        return ['?'] * n
+    return [f':{i}' for i in range(1, n + 1)]
+
+
+def insert_sql(paramstyle, table=load_table, columns=db_cols):
+    '''
+    INSERT statement of the load in the bind variable style of the
+    DB API driver.
+    '''
+    binds = bind_variables(paramstyle, len(columns))
+    return (f'INSERT INTO {table} ({", ".join(columns)}) '
+            f'VALUES ({", ".join(binds)})')
+
+
+def delete_sql(paramstyle, table=load_table, columns=key_cols,
+               null_columns=()):
+    '''
+    DELETE statement of the rows of one variant key in the bind
+    variable style of the DB API driver.  'col = NULL' is never true,
+    so the key columns that are NULL for the keys of the statement
+    are matched with IS NULL instead of a bind variable; the other
+    columns keep plain equalities, which can use the key index.
+    '''
+    binds = iter(bind_variables(paramstyle,
+                                len(columns) - len(null_columns)))
+    return (f'DELETE FROM {table} WHERE ' +
+            ' AND '.join(f'{c} IS NULL' if c in null_columns
+                         else f'{c} = {next(binds)}' for c in columns))
+
+
+def load_rows(df, columns=db_cols):
+    '''
+    Rows of the DataFrame as tuples of plain Python values, with
+    None in place of missing values, in the order of columns.
+    '''
+    values = df[columns].astype(object).to_numpy()
+    values[pd.isna(values)] = None
+    return [tuple(row) for row in values.tolist()]
+
+
+def delete_statements(paramstyle, df, columns=key_cols):
+    '''
+    The (sql, rows) of execute_batches that delete the variant keys
+    of the DataFrame: one delete_sql per set of NULL key columns, with
+    the values of the other key columns.  Keys without NULLs, nearly
+    all of them, share the first statement.
+    '''
+    nulls = df[columns].isna()
+    statements = []
+    for pattern, keys in df.groupby([nulls[c] for c in columns],
+                                    sort=True):
+        null_columns = [c for c, null in zip(columns, pattern) if null]
+        statements.append((
+            delete_sql(paramstyle, columns=columns,
+                       null_columns=null_columns),
+            load_rows(keys, [c for c in columns if c not in null_columns])))
+    return statements
+
+
+@contextmanager
+def transaction(engine):
+    '''
+    Cursor of the DB API connection behind the engine, in a single
+    transaction that is committed at the end of the with block or
+    rolled back on any error.
+    '''
+    connection = engine.raw_connection()
+    try:
+        yield connection.cursor()
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+def execute_batches(cursor, statements, batch_size=load_batch_size):
+    '''
+    Runs each (sql, rows) of statements with executemany, batch_size
+    rows at a time, or once with execute when rows is None.
+    python-oracledb sends each batch as array binds; a SQLite engine
+    works the same as a local stand-in.
+    '''
+    for sql, rows in statements:
+        if rows is None:
+            cursor.execute(sql)
+            continue
+        for i in range(0, len(rows), batch_size):
+            cursor.executemany(sql, rows[i:i + batch_size])
+
+
+def load(df, engine, batch_size=load_batch_size):
     '''
     Loads data from Dataframe into database.  For now, that is Oracle.
-    We use Pandas to_sql Function to insert to the table.  We do not want it
-    to use index of the dataframe for the database table index.  Still not
-    certain if we need to append new data every time we run OncoKB Annotator.
-    That is to say-- are we looking for differences every time?  I assume data
-    will be mostly the same each time unless a new 'hit' is identified in
-    OncoKB, and would appear here ultimately.
+    All rows are appended with execute_batches in one transaction.
+    Still not certain if we need to append new data every time we
+    run OncoKB Annotator.  That is to say-- are we looking for
+    differences every time?  I assume data will be mostly the same
+    each time unless a new 'hit' is identified in OncoKB, and would
+    appear here ultimately.  That case is load_delta, which only
+    sends the differences.
+
+    Returns the number of rows inserted.
     '''
-    df.to_sql(
-        name='oncokbgenepanel', dtype=oracle_dtypes, con=engine,
-        schema='COMMON', if_exists='append', index=False
-        )
-    print('Data Loaded to Oracle.')
+    start = time.perf_counter()
+    rows = load_rows(df)
+    with transaction(engine) as cursor:
+        execute_batches(cursor, [(insert_sql(engine.dialect.paramstyle), rows)],
+                        batch_size)
+
+    elapsed = time.perf_counter() - start
+    print(f'Loaded {len(rows)} rows into {load_table} in batches of '
+          f'{batch_size} in {elapsed:.2f}s '
+          f'({len(rows) / max(elapsed, 1e-9):.0f} rows/sec)')
+    return len(rows)
+
+
+def key_hashes(df):
+    '''
+    Hashes of the variant keys of the transformed rows.
+    '''
+    return pd.util.hash_pandas_object(
+        df[key_cols].astype({c: db_dtypes[c] for c in key_cols}), index=False)
+
+
+def variant_manifest(df):
+    '''
+    Manifest of the transformed rows: one row per variant key with
+    the key columns, key_hash and row_hash.  row_hash adds up the
+    hashes of every column of the rows of the key, so it changes
+    when any of them changes, whatever their order, and the row_hash
+    of a key with rows in several chunks is the sum of theirs.
+    '''
+    df = df[db_cols].astype(db_dtypes)
+    hashes = pd.DataFrame({
+        'key_hash': key_hashes(df),
+        'row_hash': pd.util.hash_pandas_object(df, index=False)
+    })
+    manifest = df[key_cols].copy()
+    manifest['key_hash'] = hashes['key_hash']
+    manifest = manifest.drop_duplicates('key_hash').set_index('key_hash')
+    # uint64 sums wrap around, which is fine for a hash
+    manifest['row_hash'] = hashes.groupby('key_hash')['row_hash'].sum()
+    return manifest
+
+
+def read_manifest_hashes(path=manifest_path):
+    '''
+    Reads the hashes of the manifest of the last load, or None if
+    there is none.  A manifest written by chunks lists a key once per
+    chunk with rows of it, and those row hashes add up.
+
+    Returns row_hash Series indexed by key_hash.
+    '''
+    if not os.path.exists(path):
+        return None
+    hashes = pd.read_csv(path, usecols=['key_hash', 'row_hash'],
+                         dtype=np.uint64)
+    return hashes.groupby('key_hash')['row_hash'].sum()
+
+
+def read_manifest_keys(path, hashes):
+    '''
+    Reads the key columns of the given key hashes from the manifest,
+    manifest_chunk_size rows at a time.
+
+    Returns DataFrame of the key columns.
+    '''
+    dtypes = {c: db_dtypes[c] for c in key_cols}
+    dtypes.update(key_hash=np.uint64, row_hash=np.uint64)
+    keys = []
+    if len(hashes):
+        with pd.read_csv(path, dtype=dtypes, keep_default_na=False,
+                         na_values=[''],
+                         chunksize=manifest_chunk_size) as reader:
+            for chunk in reader:
+                chunk = chunk[chunk['key_hash'].isin(hashes)]
+                if len(chunk):
+                    keys.append(chunk)
+    if not keys:
+        return pd.DataFrame(columns=key_cols)
+    return pd.concat(keys).drop_duplicates('key_hash')[key_cols]
+
+
+def variant_delta(df, previous, visited, pending, current_hash):
+    '''
+    Compares a chunk of the transformed rows with the row hashes of
+    the last load, previous.  visited, pending and current_hash are
+    arrays over the keys of previous, updated here: whether a chunk
+    had rows of the key, whether its rows so far differ from the last
+    load, and the sum of their row hashes.  A key can have rows in
+    several chunks, so whether it changed is only known after the
+    last chunk: the rows of pending keys are held until then.  Other
+    rows of keys seen before are inserted, as their earlier rows are
+    new or already in the table.
+
+    Returns the manifest of df, the rows of df to insert now, the
+    rows to hold and the hashes of the new keys, which can also be
+    in other chunks.
+    '''
+    current = variant_manifest(df)
+    row_hash = current['row_hash'].to_numpy()
+    positions = previous.index.get_indexer(current.index)
+    known = positions >= 0
+    p = positions[known]
+    first = ~visited[p]
+    differ = first & (row_hash[known] != previous.to_numpy()[p])
+    pending[p[differ]] = True
+    visited[p] = True
+    current_hash[p] += row_hash[known]
+
+    keys = key_hashes(df)
+    known_keys = current.index[known]
+    inserts = df[keys.isin(current.index[~known].union(
+        known_keys[~first & ~pending[p]])).to_numpy()]
+    held = df[keys.isin(known_keys[pending[p]]).to_numpy()]
+    return current, inserts, held, current.index[~known]
+
+
+def load_delta_chunks(chunks, engine, path=manifest_path,
+                      batch_size=load_batch_size, full=False,
+                      missing_ok=False):
+    '''
+    Loads only the differences from the last load recorded in the
+    manifest at path, one chunk of transformed rows at a time: rows
+    of new variants are inserted as each chunk comes, then the rows
+    of changed variants and of variants in no chunk are deleted, and
+    the rows of changed variants inserted.  It all runs in one
+    transaction.  The manifest of each chunk is appended to a new
+    manifest, which replaces the old one once the transaction is
+    committed.  A rerun with the same data touches no rows.  full
+    deletes every row of the table first, for a table that was loaded
+    without a manifest.  Otherwise a missing manifest raises
+    FileNotFoundError, as loading every row as new would duplicate the
+    table, unless missing_ok says the table is known to be empty.
+
+    Apart from a chunk, only the hashes of the last load and of new
+    variants are held in memory, with the rows of changed variants.
+
+    Returns the number of variants deleted and of rows inserted.
+    '''
+    start = time.perf_counter()
+    previous = None if full else read_manifest_hashes(path)
+    if previous is None:
+        if not (full or missing_ok):
+            raise FileNotFoundError(
+                f'No manifest of the last load at {path}: run with --full '
+                f'to reload {load_table}, or --no-manifest-ok if it is empty')
+        if not full:
+            print(f'No manifest at {path}, every row is loaded as new')
+        previous = pd.Series([], dtype=np.uint64,
+                             index=pd.Index([], dtype=np.uint64))
+    visited = np.zeros(len(previous), dtype=bool)
+    pending = np.zeros(len(previous), dtype=bool)
+    current_hash = np.zeros(len(previous), dtype=np.uint64)
+    paramstyle = engine.dialect.paramstyle
+
+    held = []
+    new_keys = []
+    n_chunks = n_rows = n_inserted = 0
+    new_path = f'{path}.tmp'
+    try:
+        with open(new_path, 'w', newline='') as manifest_file, \
+                transaction(engine) as cursor:
+            variant_manifest(pd.DataFrame(columns=db_cols)).to_csv(manifest_file)
+            if full:
+                execute_batches(cursor, [(f'DELETE FROM {load_table}', None)])
+            for df in chunks:
+                current, inserts, chunk_held, chunk_new = variant_delta(
+                    df, previous, visited, pending, current_hash)
+                execute_batches(cursor, [(insert_sql(paramstyle),
+                                          load_rows(inserts))], batch_size)
+                current.to_csv(manifest_file, header=False)
+                if len(chunk_held):
+                    held.append(chunk_held)
+                n_chunks += 1
+                n_rows += len(df)
+                new_keys.append(chunk_new.to_numpy())
+                n_inserted += len(inserts)
+
+            changed = pending & (current_hash != previous.to_numpy())
+            deleted = ~visited
+            deletes = read_manifest_keys(path, previous.index[changed | deleted])
+            held = (pd.concat(held, ignore_index=True) if held
+                    else pd.DataFrame(columns=db_cols))
+            inserts = held[key_hashes(held).isin(previous.index[changed]).to_numpy()]
+            execute_batches(cursor, delete_statements(paramstyle, deletes) +
+                            [(insert_sql(paramstyle), load_rows(inserts))],
+                            batch_size)
+            n_inserted += len(inserts)
+        os.replace(new_path, path)
+    except BaseException:
+        if os.path.exists(new_path):
+            os.remove(new_path)
+        raise
+
+    elapsed = time.perf_counter() - start
+    n_changed = int((visited & (current_hash != previous.to_numpy())).sum())
+    # A new variant with rows in several chunks is new in each of them
+    n_new = len(np.unique(np.concatenate(new_keys))) if new_keys else 0
+    print(f'{n_new} new, {n_changed} changed, {deleted.sum()} deleted and '
+          f'{visited.sum() - n_changed} unchanged variants in {n_rows} rows '
+          f'of {n_chunks} chunks')
+    print(f'Deleted the rows of {len(deletes)} variants and inserted '
+          f'{n_inserted} rows into {load_table} in {elapsed:.2f}s '
+          f'({n_rows / max(elapsed, 1e-9):.0f} rows/sec)')
+    return len(deletes), n_inserted
+
+
+def load_delta(df, engine, path=manifest_path, batch_size=load_batch_size,
+               full=False, missing_ok=False):
+    '''
+    load_delta_chunks of the whole transformed DataFrame at once.
+
+    Returns the number of variants deleted and of rows inserted.
+    '''
+    return load_delta_chunks([df], engine, path, batch_size, full,
+                             missing_ok)
+
+
+def stream(engine, chunksize=None, path=manifest_path,
+           batch_size=load_batch_size, full=False, missing_ok=False):
+    '''
+    Runs extract, transform and load_delta as a pipeline of
+    generators, each file or chunk of chunksize rows going through
+    all three before the next is read.  Only one chunk is held in
+    memory at a time, with the manifests of the variants.
+
+    Returns the number of variants deleted and of rows inserted.
+    '''
+    maps = lookup_maps(engine)
+    chunks = (transform(df, engine, maps) for df in extract_chunks(chunksize))
+    return load_delta_chunks(chunks, engine, path, batch_size, full,
+                             missing_ok)
 
 
 # Driver section.  Checks and sets input args.
 if __name__ == '__main__':
-    if len(sys.argv) == 5:
-        # There are 4 args, allegedly username and password
-        print('Initializing ETL Connections')
-        host = sys.argv[3]  # Staging Database
-        service = sys.argv[4]  # Staging Database Service
-        port = 1521  # Staging Database port
-        username = sys.argv[1]
-        pw = sys.argv[2]
-
-        # SQL Alchemy Engine creation for Oracle Databases
-        engine = create_engine(f'oracle://{username}:{pw}@',
-                               connect_args={
-                                'host': host,
-                                'port': port,
-                                'service_name': service
-                                })
+    parser = argparse.ArgumentParser(
+        description='Loads the OncoKB annotated MAF files into '
+                    'COMMON.ONCOKBGENEPANEL.  Note: if your password has '
+                    'special characters then you will need to escape them '
+                    'using a backslash such as \\$ or \\"')
+    parser.add_argument('username')
+    parser.add_argument('password')
+    parser.add_argument('host', help='Staging Database')
+    parser.add_argument('service', help='Staging Database Service')
+    parser.add_argument('--batch-size', type=int, default=load_batch_size,
+                        help='rows sent to Oracle in each executemany call')
+    parser.add_argument('--manifest', default=manifest_path,
+                        help='manifest of the variants of the last load')
+    parser.add_argument('--full', action='store_true',
+                        help='delete every row of the table and load all '
+                             'rows, instead of only the differences from '
+                             'the manifest')
+    parser.add_argument('--no-manifest-ok', action='store_true',
+                        help='load every row as new when there is no '
+                             'manifest, only for an empty table')
+    parser.add_argument('--stream', action='store_true',
+                        help='extract, transform and load one file, or one '
+                             'chunk of --chunk-size rows, at a time')
+    parser.add_argument('--chunk-size', type=int,
+                        help='rows per chunk of --stream (default: a file)')
+    args = parser.parse_args()
+    if args.chunk_size is not None and not args.stream:
+        parser.error('--chunk-size only applies with --stream')
+    # Checked before the extract: every row would be loaded again
+    if not (args.full or args.no_manifest_ok or
+            os.path.exists(args.manifest)):
+        parser.error(f'no manifest of the last load at {args.manifest}; '
+                     f'use --full to reload {load_table}, or '
+                     f'--no-manifest-ok if it is empty')
+
+    print('Initializing ETL Connections')
+    port = 1521  # Staging Database port
+
+    # SQL Alchemy Engine creation for Oracle Databases
+    engine = create_engine(f'oracle://{args.username}:{args.password}@',
+                           connect_args={
+                            'host': args.host,
+                            'port': port,
+                            'service_name': args.service
+                            })
+    if args.stream:
+        print('Starting streamed extraction, transformations and load...')
+        stream(engine, args.chunk_size, args.manifest, args.batch_size,
+               args.full, args.no_manifest_ok)
+        print('...data Loaded to database.')
+    else:
         print('Starting Extraction...')
         df = extract()
         print('...done.')
@@ -296,18 +807,8 @@ if __name__ == '__main__':
         df = transform(df, engine)
         print('...done.')
         print('Starting load of data into Oracle...')
-        load(df, engine)  # Comment out for testing
+        load_delta(df, engine, args.manifest, args.batch_size,
+                   args.full, args.no_manifest_ok)  # Comment out for testing
         print('...data Loaded to database.')
-        engine.dispose()
-        print('ETL complete, connections closed.')
-    else:
-        print(
-            '''
-            Unable to run without necessary arguments.
-            You need to pass in username, password, host, and service:
-            python oncokbETL.py usernameHere passwordHere host service
-            Note: if your password has special characters
-            then you will need to escape them using a backslash
-            such as \$ or \\"
-            '''
-            )
+    engine.dispose()
+    print('ETL complete, connections closed.')
@@ -3,8 +3,14 @@
 # app.py is the driver of the application and orchestrates the integration
 # of all the other parts of the graphing application.
 
-from dash import Dash, html, dcc, Output, Input
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dash import Dash, html, dcc, Output, Input, State
 import dash
+from flask import abort, jsonify, request
 import dash_bootstrap_components as dbc
 from pages.dataservice import dataService
 
@@ -28,6 +34,22 @@ app = Dash(
     suppress_callback_exceptions=True
 )
 
+# Internal endpoint on the underlying Flask server that reports Mongo query counts and latencies, connection pool
+# usage, and cache statistics as JSON. It is off unless INTERNAL_STATS_ENABLED=true, and then only answers requests
+# from the host itself.
+INTERNAL_STATS_ENABLED = os.getenv('INTERNAL_STATS_ENABLED', '').lower() == 'true'
+LOOPBACK_ADDRESSES = ('127.0.0.1', '::1')
+
+
+@app.server.route('/internal/stats')
+def internal_stats():
+    if not INTERNAL_STATS_ENABLED:
+        abort(404)
+    if request.remote_addr not in LOOPBACK_ADDRESSES:
+        abort(403)
+    return jsonify(dataService.get_service_stats())
+
+
 # Variable for CSS spacing
 ROW_PADDING = {
     "paddingTop": "calc(var(--bs-gutter-x) * .5)",
@@ -40,36 +62,41 @@ ROW_PADDING = {
 @app.callback(
     Output('app-store', 'data'),
     Output('initializer', 'children'),
-    Input('initializer', 'style')
+    Output('initializer-interval', 'disabled'),
+    Output('initializer-loaded', 'data'),
+    Input('initializer-interval', 'n_intervals'),
+    State('initializer-loaded', 'data')
 )
-def initialize(_):
+def initialize(_, loaded):
     '''
     This initially loads values for the dropdowns on the various pages to help simulate
     the fact that every expid or nsc was not pre-loaded, only a certain part of it.
     I have arbitrarily picked 25 values from each of the collections to help bootstrap it.
+    The loaders run concurrently in the background, once per process, so this polls on an interval and hands
+    each session whatever has finished loading. The store is only written when a loader finished since the last
+    write, and the interval is disabled once every loader succeeded or gave up.
     :param _:
+    :param loaded: list: the keys that had finished loading at the last write of the session's store, None before it
     :return:
         dict: data_dict contains all values that were initialized.
             static keys: 'fd_dict' for 5 dose, 'compounds' for compounds,
                 'invivo_dict' for invivo experiments, 'onedose_dict' for one dose expids
                 'nci_60_fd' for all the nci 60 cells and their respective expids. This is not functional
                 right now.
+        string: empty children for the initializer
+        boolean: True when every loader has settled and the interval can stop
+        list: the keys that have finished loading
     '''
-    data_dict = {'fd_dict': load_exp_ids()}
+    futures = start_store_loaders()
+    finished = sorted(key for key, future in futures.items() if future.done() and future.exception() is None)
+    settled = all(store_loader_settled(key, future) for key, future in futures.items())
+    if finished == loaded:
+        return dash.no_update, dash.no_update, settled, dash.no_update
+    data_dict = {}
+    for key, future in futures.items():
+        data_dict[key] = future.result() if key in finished else STORE_DEFAULTS[key]
     # TODO:Refactor all of this to autocomplete
-    print(f'Five dose exp ids loaded...')
-
-    data_dict['compounds'] = load_comps()
-    print(f'Compound NSCs loaded...')
-
-    data_dict['invivo_dict'] = get_invivo_expids()
-    print(f'Invivo Exp Nbrs loaded...')
-
-    data_dict['onedose_dict'] = get_od_expids()
-    print(f'One Dose expIds loaded...')
-
-    data_dict['nci_60_fd'] = get_fd_cells()
-    return data_dict, ''
+    return data_dict, '', settled, finished
 
     # Functions to load data
 
@@ -227,6 +254,86 @@ def get_od_expids():
     return onedose_dict
 
 
+# Loaders of the app-store keys and the values used until each one finishes
+STORE_LOADERS = {
+    'fd_dict': load_exp_ids,
+    'compounds': load_comps,
+    'invivo_dict': get_invivo_expids,
+    'onedose_dict': get_od_expids,
+    'nci_60_fd': get_fd_cells
+}
+STORE_DEFAULTS = {'fd_dict': {}, 'compounds': [], 'invivo_dict': {}, 'onedose_dict': {}, 'nci_60_fd': []}
+
+# The loaders are run once per process and their results are shared by every session. A loader that fails is
+# resubmitted after STORE_RETRY_SECONDS, doubled after each failure, until it has been tried STORE_MAX_ATTEMPTS times.
+APP_START = time.perf_counter()
+STORE_MAX_ATTEMPTS = 4
+STORE_RETRY_SECONDS = 5
+store_executor = ThreadPoolExecutor(max_workers=len(STORE_LOADERS), thread_name_prefix='app-store')
+store_futures = {}
+store_attempts = {}
+store_retry_at = {}
+store_lock = threading.Lock()
+
+
+def timed_load(key, loader):
+    """
+    Runs a store loader and logs how long it took and how long after start-up it finished.
+    :param key: string: the app-store key being loaded
+    :param loader: function: the loader
+    :return: object: the loaded value
+    """
+    start = time.perf_counter()
+    value = loader()
+    end = time.perf_counter()
+    print(f'{key} loaded in {end - start:.2f}s, {end - APP_START:.2f}s after start-up')
+    return value
+
+
+def store_loader_settled(key, future):
+    """
+    :param key: string: the app-store key
+    :param future: Future: the last submitted loader of the key
+    :return: bool: True when the loader succeeded, or failed and has used all its attempts
+    """
+    return future.done() and (future.exception() is None or store_attempts[key] >= STORE_MAX_ATTEMPTS)
+
+
+def start_store_loaders():
+    """
+    Submits the store loaders to the thread pool the first time it is called. A loader that failed is logged once
+    and resubmitted when its backoff has passed, until it gives up after STORE_MAX_ATTEMPTS attempts.
+    :return: dict: app-store key to the Future of its loader
+    """
+    with store_lock:
+        now = time.perf_counter()
+        for key, loader in STORE_LOADERS.items():
+            future = store_futures.get(key)
+            if future is not None:
+                if not future.done() or future.exception() is None:
+                    continue
+                attempts = store_attempts[key]
+                if key not in store_retry_at:
+                    if attempts >= STORE_MAX_ATTEMPTS:
+                        print(f'{key} failed to load, giving up after {attempts} attempts: {future.exception()}')
+                        store_retry_at[key] = float('inf')
+                        continue
+                    store_retry_at[key] = now + STORE_RETRY_SECONDS * 2 ** (attempts - 1)
+                    print(f'{key} failed to load, attempt {attempts} of {STORE_MAX_ATTEMPTS}: {future.exception()}')
+                if now < store_retry_at[key]:
+                    continue
+                del store_retry_at[key]
+            store_attempts[key] = store_attempts.get(key, 0) + 1
+            store_futures[key] = store_executor.submit(timed_load, key, loader)
+        return dict(store_futures)
+
+
+# Start loading as soon as the server starts, so the first page render does not wait on Mongo
+start_store_loaders()
+dataService.start_autocomplete_refresh()
+dataService.start_control_index_refresh()
+
+
 # Navigation Bar with each route
 # pills is a styling technique to highlight the current, active route
 # navbar is a toggle to the rendering engine to specify that this is a navigation bar
@@ -287,7 +394,10 @@ app.layout = dbc.Container(
                         dcc.Loading([
                             dcc.Store(id='app-store'),
                             html.Div(id='initializer')
-                        ])
+                        ]),
+                        dcc.Store(id='initializer-loaded'),
+                        # Stops polling after 10 minutes even if a loader is still retrying
+                        dcc.Interval(id='initializer-interval', interval=500, max_intervals=1200)
                     ], id='mainContent')
                 ], color='dark', outline=True)
             ),
@@ -0,0 +1,745 @@
+"""
+Benchmarks for the DataService query and processing paths. These run against synthetic data so they can be executed
+without access to the NCIDCTD cluster; mongomock is used unless a local mongod URI is given.
+
+Run from this directory, for example:
+    python benchmarks.py fivedose-pipeline
+    python benchmarks.py fivedose-pipeline --mongo-uri mongodb://localhost:27017
+    python benchmarks.py conc-resp --nscs 100
+    python benchmarks.py fivedose-heatmap --nscs 200
+    python benchmarks.py cursor-to-df --rows 200000
+    python benchmarks.py cell-graphs --rows 50000
+    python benchmarks.py invivo-tabs --groups 10
+    python benchmarks.py invivo-summary --days 100
+    python benchmarks.py median-trace
+    python benchmarks.py day-matrix --days 500
+    python benchmarks.py kaplan-meier --groups 20
+    python benchmarks.py app-store-init --rows 20000 --latency 50
+    python benchmarks.py mean-graph-batch --nscs 50
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+import bson
+import dash
+import numpy as np
+import pandas as pd
+
+from pages.dataservice import DataService, InvivoExperiment, MetricMatrixStore, SummaryStore, dataService, \
+    cursor_to_df, fit_kaplan_meier, QUERY_SCHEMAS
+
+# The NCI-60 panel codes used when generating synthetic cell lines
+PANELS = ['LEU', 'LNS', 'COL', 'CNS', 'MEL', 'OVA', 'REN', 'PRO', 'BRE']
+
+
+def get_collection(mongo_uri, name):
+    """
+    Returns an empty collection for the benchmark, either on a local mongod or in mongomock.
+    :param mongo_uri: string: URI of a local mongod, or None to use mongomock
+    :param name: string: name of the collection
+    :return: Collection: an empty collection
+    """
+    if mongo_uri:
+        import pymongo
+        coll = pymongo.MongoClient(mongo_uri).get_database('benchmarks').get_collection(name)
+    else:
+        import mongomock
+        coll = mongomock.MongoClient().get_database('benchmarks').get_collection(name)
+    coll.drop()
+    return coll
+
+
+def make_fivedose_experiment(expid, n_nscs, n_lines=60, n_conc=5):
+    """
+    Creates a synthetic fivedose experiment document shaped like the documents in the fivedose collection.
+    :param expid: string: experiment ID
+    :param n_nscs: int: number of compounds tested in the experiment
+    :param n_lines: int: number of cell lines per compound
+    :param n_conc: int: number of concentrations per cell line
+    :return: dict: the experiment document
+    """
+    tline = []
+    for nsc in range(1, n_nscs + 1):
+        for line in range(n_lines):
+            panel = PANELS[line % len(PANELS)]
+            tline.append({
+                'nsc': nsc,
+                'cellline': {'cellname': f'CELL-{line}', 'panelcde': panel},
+                'cellpnl': {'panelnme': f'{panel} Panel'},
+                'gi50': {'Average': -4.0 - random.random() * 4},
+                'tgi': {'Average': -4.0 - random.random() * 3},
+                'lc50': {'Average': -4.0 - random.random() * 2},
+                'GrowthPercent': {'Average': random.uniform(-100, 100)},
+                'wgroup': [{'conc': -8.0 + i, 'wg_growth_percent': {'Average': random.uniform(-100, 100)}}
+                           for i in range(n_conc)]
+            })
+    return {
+        'expid': expid,
+        'fivedosensc': ','.join(str(n) for n in range(1, n_nscs + 1)),
+        'tline': tline
+    }
+
+
+def legacy_tline_pipeline(expid, nsc):
+    """
+    The pipeline used before the $filter query builder, which unwinds every tline of the experiment.
+    :param expid: string: experiment ID
+    :param nsc: string: NSC within the experiment
+    :return: list: the aggregation pipeline
+    """
+    return [
+        {'$match': {'expid': expid}},
+        {'$project': {'_id': 0, 'tline': 1}},
+        {'$unwind': {'path': '$tline'}},
+        {'$replaceRoot': {'newRoot': '$tline'}},
+        {'$match': {'nsc': int(nsc)}}
+    ]
+
+
+def time_pipeline(coll, pipeline, repeat):
+    """
+    Runs the pipeline repeatedly and measures latency and the BSON size of what the server returned.
+    :param coll: Collection: the collection to aggregate on
+    :param pipeline: list: the aggregation pipeline
+    :param repeat: int: number of runs
+    :return: tuple: mean latency in milliseconds, bytes returned, number of documents returned
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        docs = [d for d in coll.aggregate(pipeline)]
+    elapsed = (time.perf_counter() - start) / repeat * 1000
+    return elapsed, sum(len(bson.encode(d)) for d in docs), len(docs)
+
+
+def bench_fivedose_pipeline(args):
+    """
+    Compares the legacy $unwind pipeline against the $filter query builder on a multi-NSC experiment.
+    """
+    coll = get_collection(args.mongo_uri, 'fivedose')
+    coll.insert_one(make_fivedose_experiment('BENCH-1', args.nscs))
+    nsc = args.nscs // 2
+
+    print(f'Experiment with {args.nscs} NSCs x 60 cell lines ({args.nscs * 60} tline rows), {args.repeat} runs')
+    for label, pipeline in [('legacy $unwind', legacy_tline_pipeline('BENCH-1', nsc)),
+                            ('$filter rows', DataService.build_tline_pipeline('BENCH-1', nsc)),
+                            ('$filter + $map', DataService.build_tline_pipeline(
+                                'BENCH-1', nsc, {'nsc': 1, 'growth': '$GrowthPercent.Average'}))]:
+        ms, size, count = time_pipeline(coll, pipeline, args.repeat)
+        print(f'{label:>16}: {ms:9.2f} ms | {size:>10,} bytes | {count} docs')
+
+
+
+def legacy_heatmap_table(coll, expid, metric):
+    """
+    The per-metric query and pivot_table the fivedose heatmap was built from before the metric matrix.
+    :param coll: Collection: the fivedose collection
+    :param expid: string: experiment ID
+    :param metric: string: gi50, tgi or lc50
+    :return: DataFrame: the metric by cell line and NSC
+    """
+    df = pd.DataFrame(coll.aggregate([
+        {'$match': {'expid': expid}},
+        {'$project': {'nsc': '$tline.nsc', 'cell_line': '$tline.cellline.cellname', 'panel': '$tline.cellline.panelcde',
+                      metric: f'$tline.{metric}.Average', '_id': 0}}
+    ]).next())
+    df['nsc'] = df['nsc'].apply(lambda x: str(x))
+    return pd.pivot_table(df, values=metric, index=['cell_line'], columns=['nsc']).fillna(0)
+
+
+def bench_fivedose_heatmap(args):
+    """
+    Compares switching between the three heatmap metrics of an experiment with a query and pivot per metric, with
+    the metric matrix built once from Mongo, and with the memory mapped matrix store.
+    """
+    coll = get_collection(args.mongo_uri, 'fivedose')
+    coll.insert_one(make_fivedose_experiment('BENCH-1', args.nscs))
+    dataService.FIVEDOSE_COLL = coll
+    metrics = ['gi50', 'tgi', 'lc50']
+
+    def matrix_tables():
+        dataService.RESULT_CACHE.clear()
+        for metric in metrics:
+            matrix = dataService.get_fivedose_matrix('BENCH-1')
+            pd.DataFrame(matrix.values[matrix.metrics.index(metric)], index=matrix.cell_lines, columns=matrix.nscs,
+                         copy=False).dropna(how='all').dropna(axis=1, how='all').fillna(0)
+
+    print(f'Experiment with {args.nscs} NSCs x 60 cell lines, three metrics, {args.repeat} runs')
+    with tempfile.TemporaryDirectory() as path:
+        store = MetricMatrixStore(path)
+        store.write('BENCH-1', dataService.create_fivedose_matrix('BENCH-1'))
+        runs = [('query + pivot', None, lambda: [legacy_heatmap_table(coll, 'BENCH-1', m) for m in metrics]),
+                ('matrix', None, matrix_tables),
+                ('matrix store', store, matrix_tables)]
+        for label, matrix_store, switch in runs:
+            dataService.MATRIX_STORE = matrix_store
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                switch()
+            print(f'{label:>14}: {(time.perf_counter() - start) * 1000 / args.repeat:9.2f} ms')
+
+def legacy_conc_resp_df(df):
+    """
+    The row-by-row concentration response pivot used before the long-format implementation.
+    :param df: DataFrame: dataframe of response data in five dose.
+    :return: DataFrame: concentrations by cell lines
+    """
+    new_df = None
+    for row in range(df.index.size):
+        cellline = df.iloc[row].cellline['cellname']
+        conc_resp = [x for x in df.iloc[row].wgroup]
+        growth_dict = {'conc': [x['conc'] for x in conc_resp],
+                       cellline: [x['wg_growth_percent']['Average'] for x in conc_resp]}
+        tdf = pd.DataFrame(growth_dict)
+        tdf.set_index('conc', inplace=True)
+        new_df = tdf.copy() if new_df is None else pd.concat([new_df, tdf], axis=1)
+    return new_df
+
+
+def legacy_grouped_data_dict(df):
+    """
+    The row-by-row per-panel pivot used before the long-format implementation.
+    :param df: DataFrame: dataframe of response data in five dose.
+    :return: dict: concentrations by cell lines per panel code
+    """
+    data_dict = dict()
+    for row in range(df.index.size):
+        panelcde = df.iloc[row].cellline['panelcde']
+        cellline = df.iloc[row].cellline['cellname']
+        conc_resp = [x for x in df.iloc[row].wgroup]
+        growth_dict = {'conc': [x['conc'] for x in conc_resp],
+                       cellline: [x['wg_growth_percent']['Average'] for x in conc_resp]}
+        tdf = pd.DataFrame(growth_dict)
+        tdf.set_index('conc', inplace=True)
+        if panelcde in data_dict.keys():
+            data_dict[panelcde] = pd.concat([data_dict[panelcde], tdf], axis=1)
+        else:
+            data_dict[panelcde] = tdf
+    return data_dict
+
+
+def bench_conc_resp(args):
+    """
+    Compares the row-by-row concentration response pivots against the long-format pivots for every NSC of an
+    NCI-60 sized experiment (60 cell lines x 5 concentrations per NSC).
+    """
+    experiment = make_fivedose_experiment('BENCH-1', args.nscs)
+    frames = [pd.DataFrame([t for t in experiment['tline'] if t['nsc'] == nsc]) for nsc in range(1, args.nscs + 1)]
+
+    for df in frames:
+        pd.testing.assert_frame_equal(legacy_conc_resp_df(df), dataService.create_conc_resp_df(df),
+                                      check_names=False)
+
+    print(f'{args.nscs} NSCs x 60 cell lines x 5 concentrations, {args.repeat} runs')
+    for label, full, grouped in [('legacy concat', legacy_conc_resp_df, legacy_grouped_data_dict),
+                                 ('long + pivot', dataService.create_conc_resp_df,
+                                  dataService.create_grouped_data_dict)]:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for df in frames:
+                full(df)
+                grouped(df)
+        ms = (time.perf_counter() - start) / (args.repeat * len(frames)) * 1000
+        print(f'{label:>16}: {ms:9.2f} ms per NSC (full + per-panel)')
+
+
+def make_invivo_experiment(expid, exp_nbr, n_groups, n_animals=10, n_days=30):
+    """
+    Creates a synthetic invivo document shaped like the documents in the invivo collection. The first group is the
+    999999 control.
+    :param expid: string: experiment ID
+    :param exp_nbr: int: experiment number within the experiment ID
+    :param n_groups: int: number of treatment groups
+    :param n_animals: int: number of animals per group
+    :param n_days: int: number of observation days per animal
+    :return: dict: the experiment document
+    """
+    tgroup = []
+    for g in range(n_groups):
+        animals = []
+        for a in range(n_animals):
+            days = range(0, n_days * 2, 2)
+            animals.append({
+                'animal_nbr': a + 1,
+                'death_day': random.randint(n_days, n_days * 3),
+                'animal_history': [{'obs_day': d, 'net_weight': 20 + random.gauss(d / 20, 1)} for d in days],
+                'tumor_history': [{'obs_day': d, 'tumor_wt': random.uniform(50, 50 + d * 40)} for d in days]
+            })
+        tgroup.append({
+            'nbr_animals': n_animals,
+            'group_type': {'group_type': 'C' if g == 0 else 'T', 'description': 'Control' if g == 0 else 'Treated'},
+            'nsc_therapy': [{'nsc': 999999 if g == 0 else 1000 + g, 'treatment_schedule': 'Q1Dx5'}],
+            'animal': animals
+        })
+    return {
+        'expid': expid,
+        'exp_nbr': exp_nbr,
+        'implant_date': '2023-01-01',
+        'staging_date': '2023-01-08',
+        'cellline': {'cellname': 'CELL-1', 'panelcde': 'MEL'},
+        'tgroup': tgroup
+    }
+
+
+def bench_invivo_tabs(args):
+    """
+    Measures the latency of opening the tabs of an invivo experiment group. Cold runs clear the result cache before
+    every tab, which is what each tab cost when it ran its own aggregation; warm runs switch tabs after the experiment
+    has been loaded once.
+    """
+    coll = get_collection(args.mongo_uri, 'invivo')
+    coll.insert_one(make_invivo_experiment('BENCH-1', 1, args.groups))
+    dataService.INVIVO_COLL = coll
+    dataService.FIGURE_CACHE = None
+    dataService.SUMMARY_STORE = None
+    tabs = [
+        ('summary', lambda: dataService.get_invivo_summary_plots('BENCH-1')),
+        ('survival', lambda: dataService.get_km_graph('BENCH-1', 1, 1)),
+        ('averages', lambda: dataService.get_anml_weight_graphs('BENCH-1', 1, 1)),
+        ('boxes', lambda: dataService.get_invivo_box_plots('BENCH-1', 1, 1))
+    ]
+
+    print(f'Experiment with {args.groups} groups x 10 animals x 30 observations, {args.repeat} runs')
+    for label, clear in [('cold', True), ('warm', False)]:
+        times = dict()
+        dataService.RESULT_CACHE.clear()
+        for _ in range(args.repeat):
+            for tab, open_tab in tabs:
+                if clear:
+                    dataService.RESULT_CACHE.clear()
+                start = time.perf_counter()
+                open_tab()
+                times[tab] = times.get(tab, 0) + (time.perf_counter() - start) * 1000 / args.repeat
+        print(f'{label:>5}: ' + ' | '.join(f'{tab} {ms:8.2f} ms' for tab, ms in times.items()) +
+              f' | total {sum(times.values()):8.2f} ms')
+
+
+def bench_invivo_summary(args):
+    """
+    Compares building the invivo summary page from Mongo with rendering it from a materialized summary store.
+    """
+    coll = get_collection(args.mongo_uri, 'invivo')
+    coll.insert_one(make_invivo_experiment('BENCH-1', 1, args.groups, n_days=args.days))
+    dataService.INVIVO_COLL = coll
+    dataService.FIGURE_CACHE = None
+    with tempfile.TemporaryDirectory() as path:
+        store = SummaryStore(path)
+        store.write('BENCH-1', dataService.create_invivo_summary('BENCH-1'))
+        print(f'Experiment with {args.groups} groups x 10 animals x {args.days} observations, {args.repeat} runs, '
+              f'{os.path.getsize(store.file_path("BENCH-1")) / 1024:.1f} KB stored')
+        for label, summary_store in [('mongo', None), ('store', store)]:
+            dataService.SUMMARY_STORE = summary_store
+            elapsed = 0
+            for _ in range(args.repeat):
+                dataService.RESULT_CACHE.clear()
+                start = time.perf_counter()
+                dataService.get_invivo_summary_plots('BENCH-1')
+                elapsed += (time.perf_counter() - start) * 1000 / args.repeat
+            print(f'{label:>5}: {elapsed:8.2f} ms')
+
+
+def legacy_median_trace(anml_data_dict, wt_key):
+    """
+    The iterrows median used before get_group_stats.
+    :param anml_data_dict: dict: dict that contains animal data within the group
+    :param wt_key: string: the key for which data set to examine, net weight or tumor.
+    :return: Series: the median per observation day
+    """
+    median_dict = dict()
+    for x in anml_data_dict.keys():
+        animal = anml_data_dict[x]
+        for day in animal.iterrows():
+            data = day[1][wt_key]
+            key = day[1]['obs_day']
+            if key in median_dict.keys():
+                tmp_list = median_dict[key]
+                tmp_list.append(data)
+                median_dict[key] = tmp_list.copy()
+            else:
+                median_dict[key] = [data]
+    return pd.Series([pd.Series(median_dict[key]).median() for key in median_dict.keys()],
+                     index=list(median_dict.keys()))
+
+
+def legacy_animal_data_dict(group, history, wt_key):
+    """
+    The dataframe per animal that the weight plots were built from before the day matrix.
+    :param group: InvivoGroup: the group of animals
+    :param history: AnimalHistory: the weight or tumor history of the group
+    :param wt_key: string: the column name of the values
+    :return: dict: animal number to a dataframe with columns obs_day and wt_key
+    """
+    return {group.animals[i]: pd.DataFrame({'obs_day': day, wt_key: value})
+            for i, (day, value) in enumerate(history.split(len(group.animals)))}
+
+
+def legacy_box_table(anml_data_dict, wt_key):
+    """
+    The (observation day x animal) table built with a pd.concat per animal, as the box plots did before the day matrix.
+    :param anml_data_dict: dict: dict that contains animal data within the group
+    :param wt_key: string: the column name of the values
+    :return: DataFrame: indexed by obs_day with a column per animal
+    """
+    df = None
+    for i, w in enumerate(anml_data_dict.values()):
+        temp_df = w[[wt_key, 'obs_day']].set_index('obs_day')
+        temp_df.columns = [f'animal {i}']
+        df = temp_df if df is None else pd.concat([df, temp_df], axis=1)
+    return df
+
+
+def bench_median_trace(args):
+    """
+    Compares the iterrows median against the day matrix statistics (median, mean and percentile bands) for every
+    group of a synthetic invivo experiment.
+    """
+    experiment_doc = make_invivo_experiment('BENCH-1', 1, args.groups, n_days=args.days)
+    experiment = InvivoExperiment('BENCH-1', [experiment_doc])
+    groups = [(legacy_animal_data_dict(g, g.weight, 'net_weight'), g) for g in experiment.groups]
+
+    for data_dict, group in groups:
+        stats = dataService.get_group_stats(dataService.get_day_matrix(group, group.weight))
+        pd.testing.assert_series_equal(legacy_median_trace(data_dict, 'net_weight').sort_index(), stats['median'],
+                                       check_names=False, check_index_type=False)
+
+    print(f'{args.groups} groups x 10 animals x {args.days} observations, {args.repeat} runs')
+    for label, func in [('legacy iterrows', lambda d, g: legacy_median_trace(d, 'net_weight')),
+                        ('matrix stats', lambda d, g: dataService.get_group_stats(
+                            dataService.get_day_matrix(g, g.weight)))]:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for data_dict, group in groups:
+                func(data_dict, group)
+        ms = (time.perf_counter() - start) / (args.repeat * len(groups)) * 1000
+        print(f'{label:>16}: {ms:9.2f} ms per group')
+
+
+def bench_day_matrix(args):
+    """
+    Compares building the (observation day x animal) table of each group with a pd.concat per animal against the
+    single allocation day matrix.
+    """
+    experiment_doc = make_invivo_experiment('BENCH-1', 1, args.groups, n_days=args.days)
+    experiment = InvivoExperiment('BENCH-1', [experiment_doc])
+    groups = [(legacy_animal_data_dict(g, g.weight, 'net_weight'), g) for g in experiment.groups]
+
+    for data_dict, group in groups:
+        matrix = dataService.get_day_matrix(group, group.weight)
+        np.testing.assert_array_equal(legacy_box_table(data_dict, 'net_weight').sort_index().values, matrix.values)
+
+    print(f'{args.groups} groups x 10 animals x {args.days} observations, {args.repeat} runs')
+    for label, func in [('legacy concat', lambda d, g: legacy_box_table(d, 'net_weight')),
+                        ('day matrix', lambda d, g: dataService.get_day_matrix(g, g.weight))]:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for data_dict, group in groups:
+                func(data_dict, group)
+        ms = (time.perf_counter() - start) / (args.repeat * len(groups)) * 1000
+        print(f'{label:>16}: {ms:9.2f} ms per group')
+
+
+def check_kaplan_meier():
+    """
+    Checks the batch fit on a fixed control and treated group, with tied days and a missing day of death, against the
+    survival rates, exponential Greenwood confidence intervals and log-rank p-value that lifelines 0.30.3 gives for
+    the same groups (KaplanMeierFitter and statistics.logrank_test).
+    """
+    control = np.array([9, 11, 11, 12, 14, 15, 15, 17, 19, 22.])
+    treated = np.array([12, 15, np.nan, 18, 21, 21, 24, 27, 30, 34.])
+    expected = [
+        {'event_at': [0, 9, 11, 12, 14, 15, 17, 19, 22],
+         'survival_rate': [1, 0.9, 0.7, 0.6, 0.5, 0.3, 0.2, 0.1, 0],
+         'lower_ci': [1, 0.473009271362, 0.32871659328, 0.252668897004, 0.183605590619, 0.071134492323,
+                      0.030909024308, 0.005723456374, 0],
+         'upper_ci': [1, 0.985281393367, 0.891949041225, 0.827220967029, 0.753174076998, 0.577867330625,
+                      0.474714690441, 0.358127460508, 0]},
+        {'event_at': [0, 12, 15, 18, 21, 24, 27, 30, 34],
+         'survival_rate': [1, 8 / 9, 7 / 9, 6 / 9, 4 / 9, 3 / 9, 2 / 9, 1 / 9, 0],
+         'lower_ci': [1, 0.432965090226, 0.364751231165, 0.281682242222, 0.13587247762, 0.07828947346,
+                      0.033711455051, 0.006129241655, 0],
+         'upper_ci': [1, 0.983564028526, 0.939296442487, 0.878306757631, 0.719314589725, 0.622627302653,
+                      0.5130683239, 0.387664758009, 0]}
+    ]
+    km = fit_kaplan_meier([control, treated], [0, 0])
+    for curve, values in zip(km.curves, expected):
+        np.testing.assert_allclose(curve.index.values, values['event_at'])
+        for column in ['survival_rate', 'lower_ci', 'upper_ci']:
+            np.testing.assert_allclose(curve[column].values, values[column], rtol=1e-9, atol=1e-12, err_msg=column)
+    np.testing.assert_allclose(km.p_values, [np.nan, 0.005601098911166018], rtol=1e-9)
+
+
+def bench_kaplan_meier(args):
+    """
+    Checks the batch fit against fixed lifelines results, then compares a lifelines KaplanMeierFitter per group (plus
+    the control refit) against the batch fit of every group of a synthetic experiment. lifelines is only needed for
+    this comparison, which is skipped when it is not installed.
+    """
+    check_kaplan_meier()
+    print('Kaplan-Meier survival, confidence intervals and log-rank p-value match lifelines')
+    try:
+        from lifelines import KaplanMeierFitter
+    except ImportError:
+        print('lifelines is not installed, skipping the comparison')
+        return
+
+    experiment = InvivoExperiment('BENCH-1', [make_invivo_experiment('BENCH-1', 1, args.groups)])
+    death_days = [g.death_day for g in experiment.groups]
+    controls = [experiment.get_control_index(g.exp_nbr) for g in experiment.groups]
+
+    def legacy():
+        for days in death_days + [death_days[0]] * (len(death_days) - 1):
+            kmf = KaplanMeierFitter()
+            kmf.fit(durations=np.sort(days), event_observed=[1] * len(days))
+            kmf.confidence_interval_
+
+    batch = fit_kaplan_meier(death_days, controls)
+    for days, curve in zip(death_days, batch.curves):
+        kmf = KaplanMeierFitter().fit(durations=np.sort(days), event_observed=[1] * len(days))
+        np.testing.assert_allclose(curve['survival_rate'].values, kmf.survival_function_.iloc[:, 0].values)
+
+    print(f'{args.groups} groups x 10 animals, {args.repeat} runs')
+    for label, func in [('lifelines', legacy), ('batch fit', lambda: fit_kaplan_meier(death_days, controls))]:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            func()
+        ms = (time.perf_counter() - start) / args.repeat * 1000
+        print(f'{label:>16}: {ms:9.2f} ms per experiment')
+
+
+def measure(func, repeat=3):
+    """
+    Times the function, best of repeat runs, then runs it once more while tracing allocations, since tracing slows
+    down the run it traces.
+    :param func: function: the function to run
+    :param repeat: int: number of timed runs
+    :return: tuple: the result, elapsed milliseconds and peak traced memory in bytes
+    """
+    elapsed = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = min(elapsed, (time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    result = func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def bench_cursor_to_df(args):
+    """
+    Compares materializing oncoprint-shaped documents as a list of dicts for pd.DataFrame against streaming them into
+    typed columns with cursor_to_df. A generator stands in for the cursor so only the conversion is measured. Both
+    frames must hold the same values. The typed frame must be smaller and, once there is more than one slice of
+    frame_size documents to convert, peak at less traced memory. The speed ratio is only reported, since wall-clock
+    times are too noisy to assert on.
+    """
+    genes = [f'GENE{i}' for i in range(500)]
+    samples = [f'CELL-{i}' for i in range(60)]
+
+    def cursor():
+        rng = random.Random(0)
+        for _ in range(args.rows):
+            yield {'sample': rng.choice(samples), 'gene': rng.choice(genes), 'alteration': 'Amplification',
+                   'type': rng.choice(['AMP', 'HOMDEL', 'MISSENSE', None])}
+
+    frame_size = 20000
+    print(f'{args.rows:,} oncoprint documents')
+    results = []
+    for label, convert in [('list + DataFrame', lambda: pd.DataFrame([d for d in cursor()])),
+                           ('cursor_to_df', lambda: cursor_to_df(cursor(), QUERY_SCHEMAS['oncoprint'],
+                                                                 frame_size=frame_size))]:
+        df, ms, peak = measure(convert)
+        results.append((df, ms, peak))
+        print(f'{label:>16}: {ms:9.2f} ms | peak {peak / 2 ** 20:8.1f} MiB | '
+              f'frame {df.memory_usage(deep=True).sum() / 2 ** 20:8.1f} MiB')
+    (baseline, baseline_ms, baseline_peak), (typed, typed_ms, typed_peak) = results
+    assert baseline.equals(typed.astype(object)), 'cursor_to_df changed the values'
+    print(f'cursor_to_df is {baseline_ms / typed_ms:.2f}x the speed and peaks at {typed_peak / baseline_peak:.2f}x '
+          f'the memory of list + DataFrame')
+    assert typed.memory_usage(deep=True).sum() < baseline.memory_usage(deep=True).sum(), \
+        'cursor_to_df built a larger frame than list + DataFrame'
+    if args.rows > frame_size:
+        assert typed_peak < baseline_peak, 'cursor_to_df peaks at more memory than list + DataFrame'
+
+
+
+def bench_cell_graphs(args):
+    """
+    Measures building the cell line page from --rows results, already unwound and projected the way the
+    fivedose_cells aggregation returns them, and serializing the figure as Dash sends it to the browser.
+    """
+    rng = random.Random(0)
+    doses = ['one', 'two', 'three', 'four', 'five']
+    docs = []
+    for i in range(args.rows):
+        doc = {'expid': f'E{i % 400}', 'nsc': rng.randint(1, 800000)}
+        # Some results were stopped before all five doses
+        doc.update({dose: rng.uniform(-100, 100) for dose in doses[:rng.choice([3, 5, 5, 5])]})
+        docs.append(doc)
+
+    class Cells():
+        def aggregate(self, pipeline):
+            return iter(docs)
+
+    dataService.CELLS_COLL = Cells()
+    print(f'{args.rows:,} cell line results, {args.repeat} runs')
+    build = serialize = 0
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        figure = dataService.get_cell_graphs('BENCH')
+        middle = time.perf_counter()
+        payload = figure.to_json()
+        build += (middle - start) * 1000 / args.repeat
+        serialize += (time.perf_counter() - middle) * 1000 / args.repeat
+    print(f'build {build:8.2f} ms | to_json {serialize:8.2f} ms | payload {len(payload) / 2 ** 20:6.1f} MiB')
+
+class LatentCollection():
+    """
+    Delays every query of a collection by a fixed round trip, standing in for a remote cluster.
+    """
+    def __init__(self, coll, latency):
+        """
+        :param coll: Collection: the collection to delegate to
+        :param latency: float: seconds added to every aggregate and find
+        """
+        self.coll = coll
+        self.latency = latency
+
+    def aggregate(self, pipeline, *args, **kwargs):
+        time.sleep(self.latency)
+        return self.coll.aggregate(pipeline, *args, **kwargs)
+
+    def find(self, *args, **kwargs):
+        time.sleep(self.latency)
+        return self.coll.find(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.coll, name)
+
+
+def bench_app_store_init(args):
+    """
+    Measures the time to first render of the app-store: the sequential loaders the initialize callback used to
+    run before returning, against the background loaders app.py starts, whose first initialize returns at once
+    with placeholders and whose seeds then arrive as each loader finishes. The one-dose collection has --rows
+    experiments, and every query pays --latency ms.
+    """
+    rng = random.Random(0)
+    latency = args.latency / 1000
+    colls = {name: get_collection(args.mongo_uri, name) for name in ['fivedose', 'compounds', 'invivo', 'onedose']}
+    colls['fivedose'].insert_many([{'expid': f'FD{i}', 'fivedosensc': ','.join(str(rng.randint(1, 800000))
+                                                                               for _ in range(20))}
+                                   for i in range(100)])
+    colls['compounds'].insert_many([{'nsc': i, 'mv_dtp_disregistration_short': 'yes', 'cmpd_chem_name': f'chem {i}',
+                                     'preferred_name': [f'name {i}']} for i in range(100)])
+    colls['invivo'].insert_many([{'expid': f'IV{i}', 'invivonsc': str(rng.randint(1, 800000))} for i in range(100)])
+    colls['onedose'].insert_many([{'expid': i, 'onedosensc': ','.join(str(rng.randint(1, 800000))
+                                                                     for _ in range(rng.randint(1, 10)))}
+                                  for i in range(args.rows)])
+    dataService.FIVEDOSE_COLL = LatentCollection(colls['fivedose'], latency)
+    dataService.COMPOUNDS_COLL = LatentCollection(colls['compounds'], latency)
+    dataService.INVIVO_COLL = LatentCollection(colls['invivo'], latency)
+    dataService.ONEDOSE_COLL = LatentCollection(colls['onedose'], latency)
+
+    # Importing app starts its loaders; wait for them and the refresh threads so the runs below start cold
+    import app
+    while not all(future.done() for future in app.start_store_loaders().values()):
+        time.sleep(0.01)
+    time.sleep(1)
+    print(f'{args.rows:,} one-dose experiments, {args.latency:.0f} ms per query, {args.repeat} runs')
+
+    sequential = background = first_render = 0
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        expected = {key: loader() for key, loader in app.STORE_LOADERS.items()}
+        sequential += (time.perf_counter() - start) * 1000 / args.repeat
+
+        app.store_futures.clear()
+        app.store_attempts.clear()
+        app.store_retry_at.clear()
+        start = time.perf_counter()
+        data, _, settled, loaded = app.initialize(0, None)
+        first_render += (time.perf_counter() - start) * 1000 / args.repeat
+        n = 1
+        while not settled:
+            time.sleep(0.005)
+            update, _, settled, loaded = app.initialize(n, loaded)
+            data = data if update is dash.no_update else update
+            n += 1
+        background += (time.perf_counter() - start) * 1000 / args.repeat
+        assert data == expected, 'the background loaders published different seeds'
+    print(f'{"sequential":>12}: first render {sequential:9.1f} ms')
+    print(f'{"background":>12}: first render {first_render:9.1f} ms | every seed {background:9.1f} ms')
+
+
+def bench_mean_graph_batch(args):
+    """
+    Checks that the batch mean graph deltas of a whole experiment equal the per-NSC deltas of get_mean_graphs_data,
+    with values beyond the tested concentrations and a tline row without an NSC, then times both.
+    """
+    rng = random.Random(0)
+    experiment = make_fivedose_experiment('BENCH-1', args.nscs)
+    for row in experiment['tline']:
+        # Some results are beyond the tested range, or missing
+        row['gi50']['Average'] = rng.choice([-9.5, -3.0, None, row['gi50']['Average']])
+    experiment['tline'].append(dict(experiment['tline'][0], nsc=None))
+    coll = get_collection(args.mongo_uri, 'fivedose')
+    coll.insert_one(experiment)
+    dataService.FIVEDOSE_COLL = coll
+    nscs = list(range(1, args.nscs + 1))
+
+    def per_nsc():
+        dataService.RESULT_CACHE.clear()
+        return {nsc: dataService.get_mean_graphs_data(nsc, 'BENCH-1') for nsc in nscs}
+
+    expected, per_nsc_ms = measure(per_nsc)[:2]
+    batch, batch_ms = measure(lambda: dataService.get_mean_graph_batch('BENCH-1'))[:2]
+    for metric in ['gi50', 'tgi', 'lc50']:
+        rows = batch[batch['metric'] == metric]
+        for nsc in nscs:
+            frame = getattr(expected[nsc], metric)
+            got = rows[rows['nsc'] == nsc]
+            assert list(got['cellname']) == list(frame['cellname']), f'{metric} NSC {nsc}: cell lines differ'
+            assert np.array_equal(got['value'].to_numpy(np.float64), frame[metric].to_numpy(np.float64),
+                                  equal_nan=True), f'{metric} NSC {nsc}: values differ'
+            assert np.allclose(got['delta'].to_numpy(np.float64), frame['delta'].to_numpy(np.float64),
+                               rtol=0, atol=1e-12, equal_nan=True), f'{metric} NSC {nsc}: deltas differ'
+            assert np.array_equal(got['out_of_range'], frame['out_of_range']), f'{metric} NSC {nsc}: flags differ'
+    print(f'Experiment with {args.nscs} NSCs x 60 cell lines: batch deltas match the per-NSC mean graphs')
+    print(f'{"per NSC":>10}: {per_nsc_ms:9.2f} ms | {"batch":>10}: {batch_ms:9.2f} ms')
+
+
+BENCHMARKS = {
+    'fivedose-pipeline': bench_fivedose_pipeline,
+    'conc-resp': bench_conc_resp,
+    'fivedose-heatmap': bench_fivedose_heatmap,
+    'cursor-to-df': bench_cursor_to_df,
+    'cell-graphs': bench_cell_graphs,
+    'invivo-tabs': bench_invivo_tabs,
+    'invivo-summary': bench_invivo_summary,
+    'median-trace': bench_median_trace,
+    'day-matrix': bench_day_matrix,
+    'kaplan-meier': bench_kaplan_meier,
+    'app-store-init': bench_app_store_init,
+    'mean-graph-batch': bench_mean_graph_batch
+}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='DataService benchmarks on synthetic data')
+    parser.add_argument('benchmark', choices=BENCHMARKS.keys())
+    parser.add_argument('--mongo-uri', default=None, help='local mongod to use instead of mongomock')
+    parser.add_argument('--nscs', type=int, default=20, help='number of NSCs in the synthetic experiment')
+    parser.add_argument('--rows', type=int, default=100000,
+                        help='number of documents for cursor-to-df and cell-graphs, one-dose experiments of '
+                             'app-store-init')
+    parser.add_argument('--latency', type=float, default=50, help='milliseconds added to every query of app-store-init')
+    parser.add_argument('--groups', type=int, default=8, help='number of groups in the synthetic invivo experiment')
+    parser.add_argument('--days', type=int, default=300,
+                        help='number of observation days per animal for median-trace, day-matrix and invivo-summary')
+    parser.add_argument('--repeat', type=int, default=3, help='number of timed runs')
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
@@ -0,0 +1,77 @@
+"""
+Offline materializer of the data the app serves from local stores instead of Mongo. Completed experiments do not
+change, so their results are computed once here and the app only reads them.
+
+Run from this directory with the same .env as the app, for example:
+    python materialize.py invivo-summary
+    python materialize.py invivo-summary --expid 1234567 --expid 7654321 --force
+    python materialize.py fivedose-matrix
+"""
+import argparse
+import time
+
+from pages.dataservice import dataService
+
+
+def materialize_invivo_summary(args):
+    """
+    Writes the invivo summary of every expid, or of the given expids, to the summary store. Expids already in the
+    store are skipped unless --force is given.
+    """
+    store = dataService.SUMMARY_STORE
+    if store is None:
+        print('SUMMARY_STORE_PATH is empty, there is no summary store to write to')
+        return
+    expids = args.expid or sorted(e for e in dataService.INVIVO_COLL.distinct('expid') if e is not None)
+    start = time.perf_counter()
+    written = 0
+    for expid in expids:
+        if expid in store and not args.force:
+            continue
+        try:
+            store.write(expid, dataService.create_invivo_summary(expid))
+            written += 1
+        except Exception as e:
+            print(f'Summary of {expid} not materialized: {e}')
+        # Each experiment is only needed once, so it is not kept in the result cache
+        dataService.RESULT_CACHE.clear()
+    print(f'Materialized {written} of {len(expids)} invivo summaries into {store.path} '
+          f'in {time.perf_counter() - start:.1f}s')
+
+
+def materialize_fivedose_matrix(args):
+    """
+    Writes the heatmap matrix of every fivedose expid, or of the given expids, to the matrix store. Expids already in
+    the store are skipped unless --force is given.
+    """
+    store = dataService.MATRIX_STORE
+    if store is None:
+        print('FIVEDOSE_MATRIX_PATH is empty, there is no matrix store to write to')
+        return
+    expids = args.expid or sorted(e for e in dataService.FIVEDOSE_COLL.distinct('expid') if e is not None)
+    start = time.perf_counter()
+    written = 0
+    for expid in expids:
+        if expid in store and not args.force:
+            continue
+        try:
+            store.write(expid, dataService.create_fivedose_matrix(expid))
+            written += 1
+        except Exception as e:
+            print(f'Matrix of {expid} not materialized: {e}')
+    print(f'Materialized {written} of {len(expids)} fivedose matrices into {store.path} '
+          f'in {time.perf_counter() - start:.1f}s')
+
+
+MATERIALIZERS = {
+    'invivo-summary': materialize_invivo_summary,
+    'fivedose-matrix': materialize_fivedose_matrix
+}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Materialize precomputed results into the local stores of the app')
+    parser.add_argument('store', choices=MATERIALIZERS.keys())
+    parser.add_argument('--expid', action='append', help='expid to materialize, can be repeated (default: all)')
+    parser.add_argument('--force', action='store_true', help='rewrite expids that are already materialized')
+    args = parser.parse_args()
+    MATERIALIZERS[args.store](args)
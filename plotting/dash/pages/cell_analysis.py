@@ -1,6 +1,7 @@
 import dash
 from dash import html, dcc, Input, Output, State
 import dash_bootstrap_components as dbc
+from dash.exceptions import PreventUpdate
 from .dataservice import dataService
 
 dash.register_page(__name__, path='/cells')
@@ -29,9 +30,12 @@ left_select = dbc.Card(id='cells-sel-card', body=True, children=[
 @dash.callback(
     Output("cells-dropdown", "options"),
     Input("cells-nav", "id"),
-    State("app-store", "data")
+    Input("app-store", "data")
 )
 def initialize(nav, data):
+    # Also runs when app.py publishes newly loaded seeds, so a rendered page gets them
+    if data is None:
+        raise PreventUpdate
     return [{"label": x, "value": x} for x in data['nci_60_fd']]
 
 
@@ -41,15 +45,11 @@ def initialize(nav, data):
     prevent_initial_call=True
 )
 def create_cell_graphs(cell):
-    graphs = dataService.get_cell_graphs(cell)
+    figure = dataService.get_cell_graphs(cell)
     card = dbc.Card(id='cell-content-card', children=[
         dbc.CardHeader(html.H3(f'Cell {cell}')),
         dbc.CardBody([
-            dcc.Graph(figure=graphs[0]),
-            dcc.Graph(figure=graphs[1]),
-            dcc.Graph(figure=graphs[2]),
-            dcc.Graph(figure=graphs[3]),
-            dcc.Graph(figure=graphs[4]),
+            dcc.Graph(figure=figure),
         ]),
 
     ])
@@ -103,28 +103,12 @@ def initialize(search_value, radio):
 
         return options
 
-    # If the value is 2 it will search on the NSC's char_nsc field with regex
+    # If the value is 2 it will search the NSC autocomplete index, falling back to the char_nsc field with regex
     if radio == 2:
-        results = dataService.COMPOUNDS_COLL.aggregate([
-            {
-                '$match': {
-                    'char_nsc': {'$regex': search_value},
-                    'mv_dtp_disregistration_short.canonicalsmiles': {
-                        '$exists': True
-                    }
-                }
-            }, {
-                '$project': {
-                    '_id': 0,
-                    'nsc': 1
-                }
-            }, {
-                '$limit': 10
-            }
-        ])
+        nscs = dataService.search_nscs(search_value, 10)
 
         # Create options list for the dropdown
-        options = [{'label': r['nsc'], 'value': r['nsc']} for r in results]
+        options = [{'label': x, 'value': x} for x in nscs]
 
         return options
 
@@ -69,35 +69,24 @@ def get_left_select(expid, nsc):
 @dash.callback(
     Output("expid-dropdown", "options"),
     Input('expid-dropdown', 'search_value'),
-    State("app-store", "data"),
-    prevent_initial_call=True
+    Input("app-store", "data")
 )
 def initialize(search_value, data):
     """
-    The initial dropdown values are populated if no input has been made in the experiment ID input. From there, the
-    dropdown options are re-evaluated based on partial inputs that are similar to the input.
+    The initial dropdown values are populated if no input has been made in the experiment ID input, and again each
+    time app.py publishes newly loaded experiment IDs. From there, the dropdown options are re-evaluated based on
+    partial inputs that are similar to the input.
     :param search_value: string: the searched experiment ID
     :param data: dcc.Store: application wide Store object that has a set of prepared experiment IDs
     :return: list[dict]: returns a list of options that represent experiment IDs in the label: value format
     """
+    if data is None or (ctx.triggered_id == 'app-store' and search_value):
+        raise PreventUpdate
     if not search_value:
         return [{"label": x, "value": x} for x in data['fd_dict'].keys()]
     else:
-        results = dataService.FIVEDOSE_COLL.aggregate([
-            {
-                '$match': {
-                    'expid': {'$regex': str(search_value)}
-                }
-            }, {
-                '$project': {
-                    '_id': 0,
-                    'expid': 1
-                }
-            }, {
-                '$limit': 10
-            }
-        ])
-        options = [{'label': r['expid'], 'value': r['expid']} for r in results]
+        expids = dataService.search_expids(dataService.FIVEDOSE_COLL, search_value, 10)
+        options = [{'label': x, 'value': x} for x in expids]
 
         return options
 
@@ -178,14 +167,14 @@ def get_graphs(conc_clicks, active_tab, nsc, expid):
     # Creates similar, supplier report-looking plots based on active tab
     if active_tab == 'gi-50':
         print(f'IN GI-50: {active_tab}')
-        dataService.get_mean_graphs_data(nsc, expid)
-        return dcc.Graph(figure=dataService.get_gi50_graph(nsc))
+        data = dataService.get_mean_graphs_data(nsc, expid)
+        return dcc.Graph(figure=dataService.get_gi50_graph(data, nsc))
     if active_tab == 'lc-50':
-        dataService.get_mean_graphs_data(nsc, expid)
-        return dcc.Graph(figure=dataService.get_lc50_graph(nsc))
+        data = dataService.get_mean_graphs_data(nsc, expid)
+        return dcc.Graph(figure=dataService.get_lc50_graph(data, nsc))
     if active_tab == 'tgi':
-        dataService.get_mean_graphs_data(nsc, expid)
-        return dcc.Graph(figure=dataService.get_tgi_graph(nsc))
+        data = dataService.get_mean_graphs_data(nsc, expid)
+        return dcc.Graph(figure=dataService.get_tgi_graph(data, nsc))
     # This creates a Heatmaps section with a Select for the 3 types of heatmap metrics
     if active_tab == 'heatmap':
         return dbc.Col([
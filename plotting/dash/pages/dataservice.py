@@ -3,20 +3,1386 @@ The DataService module was originally designed to be a singleton service to hand
 along with handling business logic, so that the main content pages This is an ever-growing module that might be
 divided or not.
 """
+import bisect
+import contextlib
+import datetime
+import functools
+import inspect
+import itertools
+import json
+import math
 import os
 import random
+import sqlite3
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict, deque, namedtuple
+from types import MappingProxyType
 
 import numpy as np
 from dotenv import load_dotenv
 
 import pymongo
+from pymongo import monitoring
+from bson import ObjectId
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import plotly.graph_objects as go
 import plotly.express as px
-from lifelines import KaplanMeierFitter
+from plotly.subplots import make_subplots
 import matplotlib.colors as mcolors
 import colorsys
 from plotly.validators.scatter.marker import SymbolValidator
+from plotly.utils import PlotlyJSONEncoder
+
+
+# The GI50, TGI and LC50 mean graph frames of an NSC in a fivedose experiment. Bundles are cached and shared between
+# callback threads, so the frames are treated as read-only.
+MeanGraphData = namedtuple('MeanGraphData', ['gi50', 'tgi', 'lc50'])
+
+# The COMPARE plot style of a single cell line; immutable so the lookup tables can be shared between callback threads
+CellLineStyle = namedtuple('CellLineStyle', ['symbol', 'color', 'line_pattern'])
+
+
+# Optional environment settings for the Mongo connection pool, mapped to their MongoClient option and type.
+# Anything not set falls back to the pymongo defaults.
+MONGO_CLIENT_SETTINGS = {
+    'MONGO_MAX_POOL_SIZE': ('maxPoolSize', int),
+    'MONGO_MIN_POOL_SIZE': ('minPoolSize', int),
+    'MONGO_MAX_IDLE_TIME_MS': ('maxIdleTimeMS', int),
+    'MONGO_WAIT_QUEUE_TIMEOUT_MS': ('waitQueueTimeoutMS', int),
+    'MONGO_CONNECT_TIMEOUT_MS': ('connectTimeoutMS', int),
+    'MONGO_SOCKET_TIMEOUT_MS': ('socketTimeoutMS', int),
+    'MONGO_SERVER_SELECTION_TIMEOUT_MS': ('serverSelectionTimeoutMS', int),
+    'MONGO_READ_PREFERENCE': ('readPreference', str)
+}
+
+
+class CommandStatsListener(monitoring.CommandListener):
+    """
+    Records the number of commands and their latencies per collection for the internal stats endpoint. Only the most
+    recent latencies of each collection are kept for the percentiles.
+    """
+    def __init__(self, window=1000, max_pending=10000):
+        """
+        :param window: int: the number of most recent latencies kept per collection
+        :param max_pending: int: the number of started commands remembered until they complete; the oldest are
+                            forgotten first, so commands that never complete do not pile up
+        """
+        self.window = window
+        self.max_pending = max_pending
+        self._pending = OrderedDict()
+        self._counts = dict()
+        self._failures = dict()
+        self._latencies = dict()
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        # The collection is only on the started event, so it is remembered until the command completes. getMore
+        # carries the cursor id under its name and the collection under 'collection'.
+        key = 'collection' if event.command_name == 'getMore' else event.command_name
+        collection = event.command.get(key)
+        if not isinstance(collection, str):
+            collection = event.command_name
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = collection
+            if len(self._pending) > self.max_pending:
+                self._pending.popitem(last=False)
+
+    def succeeded(self, event):
+        self._record(event, failed=False)
+
+    def failed(self, event):
+        self._record(event, failed=True)
+
+    def _record(self, event, failed):
+        with self._lock:
+            collection = self._pending.pop((event.connection_id, event.request_id), event.command_name)
+            self._counts[collection] = self._counts.get(collection, 0) + 1
+            if failed:
+                self._failures[collection] = self._failures.get(collection, 0) + 1
+            if collection not in self._latencies:
+                self._latencies[collection] = deque(maxlen=self.window)
+            self._latencies[collection].append(event.duration_micros / 1000)
+
+    def stats(self):
+        """
+        Snapshot of the command counters.
+        :return: dict: per collection count, failures, and p50/p95 latency in milliseconds
+        """
+        with self._lock:
+            stats = dict()
+            for collection, count in self._counts.items():
+                latencies = np.array(self._latencies[collection])
+                stats[collection] = {
+                    'count': count,
+                    'failures': self._failures.get(collection, 0),
+                    'p50_ms': float(np.percentile(latencies, 50)),
+                    'p95_ms': float(np.percentile(latencies, 95))
+                }
+            return stats
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """
+    Tracks the connections checked out of the Mongo pools, which is where callback threads stall when the pool is
+    exhausted.
+    """
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.open_connections = 0
+        self.checkout_failures = 0
+        self._lock = threading.Lock()
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_flight -= 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections -= 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def stats(self):
+        """
+        Snapshot of the pool counters.
+        :return: dict: connections in flight, the high-water mark, open connections and failed check outs
+        """
+        with self._lock:
+            return {
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+                'open_connections': self.open_connections,
+                'checkout_failures': self.checkout_failures
+            }
+
+
+class ResultCache():
+    """
+    A size-bounded cache of query results shared by every callback thread in the process. Entries are evicted in
+    least-recently-used order once the cache is full, and they expire after a time-to-live so that reloaded
+    experiments are eventually picked up again.
+    """
+    def __init__(self, max_size=128, ttl=600):
+        """
+        :param max_size: int: the maximum number of entries held before the least recently used one is evicted
+        :param ttl: float: seconds an entry stays valid; 0 or None disables expiry
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        """
+        Return the cached value for the key, or call the loader to create it on a miss or an expired entry.
+        :param key: tuple: hashable key of the cached result
+        :param loader: function: no-argument function that produces the value when it is not cached
+        :return: object: the cached or freshly loaded value
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self.ttl or (time.monotonic() - entry[0]) < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+            self.misses += 1
+
+        # The loader runs outside the lock so that a slow query does not block other threads' hits
+        value = loader()
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def discard(self, keys):
+        """
+        Removes the given entries from the cache, keys that are not cached are ignored.
+        :param keys: iterable: the keys of the entries to remove
+        """
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        """
+        Removes every entry from the cache, the counters are left as they are.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Snapshot of the cache counters.
+        :return: dict: size, max_size, ttl, hits, misses, evictions and hit_rate of the cache
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits / total) if total else 0.0
+            }
+
+
+class PrefixIndex():
+    """
+    A sorted, in-memory index of strings that answers autocomplete prefix searches with a binary search.
+    """
+    def __init__(self, values=()):
+        """
+        :param values: iterable: the values to index; they are converted to strings and de-duplicated
+        """
+        self._keys = sorted(set(str(x) for x in values if x is not None))
+
+    def __len__(self):
+        return len(self._keys)
+
+    def search(self, prefix, limit=10):
+        """
+        Finds the indexed values that start with the prefix, in sorted order.
+        :param prefix: string: the typed search value
+        :param limit: int: the maximum number of values returned
+        :return: list: the matching values
+        """
+        results = []
+        idx = bisect.bisect_left(self._keys, prefix)
+        while idx < len(self._keys) and len(results) < limit and self._keys[idx].startswith(prefix):
+            results.append(self._keys[idx])
+            idx += 1
+        return results
+
+
+class AnimalHistory(namedtuple('AnimalHistory', ['animal', 'day', 'value'])):
+    """
+    The observations of every animal in an invivo group as flat arrays: the position of the animal within the group,
+    the observation day and the measured value, in recorded order. Missing days and values are NaN.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_histories(cls, histories, field):
+        """
+        :param histories: list: one list of observation documents per animal
+        :param field: string: the measurement to keep from each observation, e.g. net_weight or tumor_wt
+        :return: AnimalHistory: the flattened observations
+        """
+        animal, day, value = [], [], []
+        for i, history in enumerate(histories):
+            for obs in history or []:
+                animal.append(i)
+                day.append(obs.get('obs_day'))
+                value.append(obs.get(field))
+        return cls(np.array(animal, dtype=np.int32), np.array(day, dtype=float), np.array(value, dtype=float))
+
+    def split(self, n_animals):
+        """
+        Splits the observations per animal.
+        :param n_animals: int: the number of animals in the group
+        :return: list: a (days, values) tuple of arrays for each animal
+        """
+        if n_animals == 0:
+            return []
+        bounds = np.searchsorted(self.animal, np.arange(1, n_animals))
+        return list(zip(np.split(self.day, bounds), np.split(self.value, bounds)))
+
+    def matrix(self, n_animals):
+        """
+        Aligns the observations into an (observation day x animal) matrix in a single allocation. Days on which an
+        animal has no observation are NaN, as are observations without a day.
+        :param n_animals: int: the number of animals in the group
+        :return: tuple: the sorted observation days and the float matrix with a row per day and a column per animal
+        """
+        observed = ~np.isnan(self.day)
+        days, rows = np.unique(self.day[observed], return_inverse=True)
+        matrix = np.full((len(days), n_animals), np.nan)
+        matrix[rows, self.animal[observed]] = self.value[observed]
+        return days, matrix
+
+
+# A treatment group of an invivo experiment. animals holds the animal numbers, death_day the day of death of each
+# animal and weight and tumor the AnimalHistory of net weights and tumor weights.
+InvivoGroup = namedtuple('InvivoGroup', ['exp_nbr', 'nsc', 'group_type', 'description', 'size', 'schedule', 'cell',
+                                         'panel', 'animals', 'death_day', 'weight', 'tumor'])
+
+
+class InvivoExperiment():
+    """
+    All groups of an invivo experiment ID, loaded with a single query and shared by the survival, weight, box and
+    summary views. Follow-up experiments are stored as separate documents under the same ID with their own exp_nbr,
+    so groups are selected by exp_nbr and their position within it.
+    """
+    def __init__(self, expid, docs):
+        """
+        :param expid: string: the experiment ID
+        :param docs: iterable: the invivo documents of the experiment ID
+        """
+        self.expid = expid
+        self.exp_nbrs = []
+        self.groups = []
+        self.implant_date = None
+        self.staging_date = None
+        for doc in docs:
+            if not self.exp_nbrs:
+                self.implant_date = doc.get('implant_date')
+                self.staging_date = doc.get('staging_date')
+            self.exp_nbrs.append(doc.get('exp_nbr'))
+            cellline = doc.get('cellline', {})
+            for tgroup in doc.get('tgroup', []):
+                self.groups.append(self.create_group(doc.get('exp_nbr'), cellline, tgroup))
+
+    @staticmethod
+    def create_group(exp_nbr, cellline, tgroup):
+        """
+        Converts a tgroup document into an InvivoGroup.
+        :param exp_nbr: int: the experiment number of the document the group belongs to
+        :param cellline: dict: the cellline of the document
+        :param tgroup: dict: the tgroup document
+        :return: InvivoGroup: the group with its animal data in arrays
+        """
+        therapy = tgroup.get('nsc_therapy') or [{}]
+        animals = tgroup.get('animal', [])
+        return InvivoGroup(
+            exp_nbr=exp_nbr,
+            nsc=therapy[0].get('nsc'),
+            group_type=tgroup.get('group_type', {}).get('group_type'),
+            description=tgroup.get('group_type', {}).get('description'),
+            size=tgroup.get('nbr_animals'),
+            schedule=therapy[0].get('treatment_schedule'),
+            cell=cellline.get('cellname'),
+            panel=cellline.get('panelcde'),
+            animals=np.array([a.get('animal_nbr') for a in animals]),
+            death_day=np.array([a.get('death_day') for a in animals], dtype=float),
+            weight=AnimalHistory.from_histories([a.get('animal_history') for a in animals], 'net_weight'),
+            tumor=AnimalHistory.from_histories([a.get('tumor_history') for a in animals], 'tumor_wt')
+        )
+
+    def get_group_positions(self, exp_nbr=None):
+        """
+        :param exp_nbr: int: the experiment number, or None for the groups of every experiment number
+        :return: list: the positions in groups of the groups of the experiment number, in document order
+        """
+        if exp_nbr is None:
+            return list(range(len(self.groups)))
+        return [i for i, g in enumerate(self.groups) if g.exp_nbr == int(exp_nbr)]
+
+    def get_groups(self, exp_nbr=None):
+        """
+        :param exp_nbr: int: the experiment number, or None for the groups of every experiment number
+        :return: list: the InvivoGroups in document order
+        """
+        return [self.groups[i] for i in self.get_group_positions(exp_nbr)]
+
+    def get_group_index(self, group, exp_nbr=None):
+        """
+        :param group: int: 0-based position of the group within the experiment number
+        :param exp_nbr: int: the experiment number, or None to count over every experiment number
+        :return: int: the position of the group in groups
+        """
+        return self.get_group_positions(exp_nbr)[int(group)]
+
+    def get_group(self, group, exp_nbr=None):
+        """
+        :param group: int: 0-based position of the group within the experiment number
+        :param exp_nbr: int: the experiment number, or None to count over every experiment number
+        :return: InvivoGroup: the group
+        """
+        return self.groups[self.get_group_index(group, exp_nbr)]
+
+    def get_control_index(self, exp_nbr=None):
+        """
+        Finds the control group of an experiment number. Follow-up experiments don't always have their own control,
+        so the first control of the experiment ID is used when the experiment number has none.
+        :param exp_nbr: int: the experiment number, or None for the first control of any experiment number
+        :return: int: the position of the control group in groups, or None if the experiment ID has no control
+        """
+        for positions in [self.get_group_positions(exp_nbr), self.get_group_positions()]:
+            for i in positions:
+                if self.groups[i].group_type == 'C':
+                    return i
+        return None
+
+
+# The standard normal quantile of a two-sided 95% confidence interval
+Z_95 = 1.959963984540054
+
+# Kaplan-Meier fits of a batch of groups: a survival DataFrame per group, the position of the control each group was
+# tested against (None when it is a control or has none) and the log-rank p-values of those tests (NaN when untested).
+KaplanMeier = namedtuple('KaplanMeier', ['curves', 'controls', 'p_values'])
+
+
+def fit_kaplan_meier(death_days, controls):
+    """
+    Fits the Kaplan-Meier survival curves of a batch of groups in one vectorized pass. Deaths are counted into a
+    (group x day) matrix over the union of the days of death, from which the survival rates, exponential Greenwood
+    confidence intervals and log-rank tests of each group against its control are computed for all groups at once.
+    Every recorded day of death is an observed event; animals without one are left out.
+    :param death_days: list: an array of days of death per group
+    :param controls: list: the position of the control group of each group, or None when there is no control
+    :return: KaplanMeier: the curves are DataFrames indexed by event_at, starting at day 0, with columns at_risk,
+            observed, survival_rate, lower_ci and upper_ci
+    """
+    n_groups = len(death_days)
+    group = np.repeat(np.arange(n_groups), [len(d) for d in death_days])
+    days = np.concatenate(death_days) if n_groups else np.empty(0)
+    recorded = ~np.isnan(days)
+    timeline, columns = np.unique(days[recorded], return_inverse=True)
+    deaths = np.zeros((n_groups, len(timeline)))
+    np.add.at(deaths, (group[recorded], columns), 1)
+
+    # The animals at risk on a day are the ones that have not died before it
+    size = deaths.sum(axis=1, keepdims=True)
+    at_risk = size - np.cumsum(deaths, axis=1) + deaths
+    with np.errstate(divide='ignore', invalid='ignore'):
+        survival = np.cumprod(np.where(at_risk > 0, 1 - deaths / at_risk, 1), axis=1)
+        greenwood = np.cumsum(np.where(at_risk > deaths, deaths / (at_risk * (at_risk - deaths)), 0), axis=1)
+        log_survival = np.log(survival)
+        spread = Z_95 * np.sqrt(greenwood) / log_survival
+        lower = np.exp(-np.exp(np.log(-log_survival) - spread))
+        upper = np.exp(-np.exp(np.log(-log_survival) + spread))
+
+    # Log-rank test of each group against its control over the shared timeline
+    tested = [g for g in range(n_groups) if controls[g] is not None and controls[g] != g]
+    p_values = np.full(n_groups, np.nan)
+    if tested:
+        treated = np.array(tested)
+        control = np.array([controls[g] for g in tested])
+        total_deaths = deaths[treated] + deaths[control]
+        total_at_risk = at_risk[treated] + at_risk[control]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            share = np.where(total_at_risk > 0, at_risk[treated] / total_at_risk, 0)
+            expected = total_deaths * share
+            variance = np.where(total_at_risk > 1, total_deaths * share * (1 - share) * (total_at_risk - total_deaths) /
+                                (total_at_risk - 1), 0).sum(axis=1)
+            chi_squared = (deaths[treated] - expected).sum(axis=1) ** 2 / variance
+        p_values[treated] = [math.erfc(math.sqrt(x / 2)) if variance[i] > 0 else np.nan
+                             for i, x in enumerate(chi_squared)]
+
+    curves = []
+    for g in range(n_groups):
+        events = deaths[g] > 0
+        curve = pd.DataFrame({'at_risk': at_risk[g, events], 'observed': deaths[g, events],
+                              'survival_rate': survival[g, events], 'lower_ci': lower[g, events],
+                              'upper_ci': upper[g, events]}, index=pd.Index(timeline[events], name='event_at'))
+        if not events.any() or timeline[events][0] != 0:
+            start = pd.DataFrame({'at_risk': size[g], 'observed': 0.0, 'survival_rate': 1.0, 'lower_ci': 1.0,
+                                  'upper_ci': 1.0}, index=pd.Index([0.0], name='event_at'))
+            curve = pd.concat([start, curve])
+        curves.append(curve.fillna(1.0))
+    return KaplanMeier(curves=curves, controls=[None if g not in tested else controls[g] for g in range(n_groups)],
+                       p_values=p_values)
+
+
+class ControlIndex():
+    """
+    Links every invivo (expid, exp_nbr) to the control group its treated groups are compared with. Follow-up
+    experiments often have no 999999 control of their own, so they are linked to the control nearest by implant date,
+    first among the experiments with the same expid and then among those of the same cell line. The index is
+    persisted as JSON and refreshed incrementally with the documents changed since the last refresh: by the
+    updated_field timestamp when the collection has one, otherwise by _id, which only finds inserted documents and
+    only while every _id is a generated ObjectId. Otherwise refreshes rebuild the index from every document.
+    """
+    def __init__(self, path=None, updated_field=None):
+        """
+        :param path: string: the JSON file the index is persisted in, or None to keep it in memory only
+        :param updated_field: string: a timestamp field set whenever an invivo document is inserted or updated, or
+                None to scan incrementally by _id
+        """
+        self.path = path
+        self.updated_field = updated_field
+        self.last_id = None
+        self.last_updated = None
+        self.experiments = dict()
+        self.links = dict()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load()
+
+    @staticmethod
+    def key(expid, exp_nbr):
+        """
+        :return: string: the index key of an experiment number
+        """
+        return f'{expid}|{exp_nbr}'
+
+    @staticmethod
+    def to_day(value):
+        """
+        :param value: datetime or string: an implant date
+        :return: int: the date as a proleptic Gregorian ordinal, or None when it is missing or not a date
+        """
+        try:
+            return pd.Timestamp(value).toordinal()
+        except (TypeError, ValueError):
+            return None
+
+    def get(self, expid, exp_nbr):
+        """
+        Looks up the control group linked to an experiment number.
+        :param expid: string: the experiment ID
+        :param exp_nbr: int: the experiment number
+        :return: dict: the linked control with keys expid, exp_nbr and group, its 0-based position within that
+                experiment number, or None when no control was found
+        """
+        return self.links.get(self.key(expid, exp_nbr))
+
+    def load(self):
+        """
+        Reads the persisted index. A missing or unreadable file leaves the index empty so it is rebuilt on refresh.
+        """
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            experiments = data['experiments']
+            links = data['links']
+        except (OSError, ValueError, KeyError) as e:
+            print(f'Control index {self.path} not loaded: {e}')
+            return
+        self.experiments = experiments
+        self.links = links
+        self.last_id = data.get('last_id')
+        # An index scanned by another field, or by no timestamp, cannot continue by this one
+        if data.get('updated_field') == self.updated_field and data.get('last_updated') is not None:
+            self.last_updated = pd.Timestamp(data['last_updated']).to_pydatetime()
+
+    def save(self):
+        """
+        Writes the index to a temporary file and moves it into place, so readers never see a partial file.
+        """
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'last_id': self.last_id, 'updated_field': self.updated_field,
+                       'last_updated': None if self.last_updated is None else self.last_updated.isoformat(),
+                       'experiments': self.experiments, 'links': self.links}, f)
+        os.replace(tmp_path, self.path)
+
+    def refresh(self, coll, full=False):
+        """
+        Reads the invivo documents changed since the last refresh and relinks every experiment number, since a new
+        control can be nearer than the current link of older experiments. The scan is a full rebuild when full is
+        set, when nothing was indexed yet, or when there is no updated_field and the collection has an _id that is not
+        an ObjectId, as those do not sort after the last indexed _id.
+        :param coll: Collection: the invivo collection
+        :param full: bool: rebuild from every document instead of only the changed ones
+        :return: tuple: the number of documents read, and the set of expids whose experiments or control links
+                changed, so their cached results can be dropped
+        """
+        with self._lock:
+            if self.updated_field:
+                incremental = not full and self.last_updated is not None
+                match = {self.updated_field: {'$gt': self.last_updated}} if incremental else {}
+                order = self.updated_field
+            else:
+                incremental = (not full and self.last_id is not None and
+                               coll.find_one({'_id': {'$not': {'$type': 'objectId'}}}, {'_id': 1}) is None)
+                match = {'_id': {'$gt': ObjectId(self.last_id)}} if incremental else {}
+                order = '_id'
+            experiments = dict(self.experiments) if incremental else dict()
+            last_id = self.last_id if incremental else None
+            last_updated = self.last_updated if incremental else None
+            count = 0
+            projection = {
+                'expid': 1,
+                'exp_nbr': 1,
+                'implant_date': 1,
+                'cellline.cellname': 1,
+                'tgroup.group_type.group_type': 1
+            }
+            if self.updated_field:
+                projection[self.updated_field] = 1
+            for doc in coll.aggregate([
+                {
+                    '$match': match
+                }, {
+                    '$project': projection
+                }, {
+                    '$sort': {order: 1}
+                }
+            ]):
+                types = [t.get('group_type', {}).get('group_type') for t in doc.get('tgroup', [])]
+                experiments[self.key(doc.get('expid'), doc.get('exp_nbr'))] = {
+                    'expid': doc.get('expid'),
+                    'exp_nbr': doc.get('exp_nbr'),
+                    'cell': doc.get('cellline', {}).get('cellname'),
+                    'implant_day': self.to_day(doc.get('implant_date')),
+                    'control': types.index('C') if 'C' in types else None
+                }
+                last_id = str(doc['_id'])
+                if self.updated_field and doc.get(self.updated_field) is not None:
+                    last_updated = max(doc[self.updated_field], last_updated or doc[self.updated_field])
+                count += 1
+
+            links = self.link(experiments)
+            changed = {e['expid'] for key, e in experiments.items() if self.experiments.get(key) != e}
+            changed |= {e['expid'] for key, e in self.experiments.items() if key not in experiments}
+            changed |= {key.split('|')[0] for key in set(links) | set(self.links)
+                        if links.get(key) != self.links.get(key)}
+            self.links = links
+            self.experiments = experiments
+            self.last_id = last_id
+            self.last_updated = last_updated
+            if self.path:
+                self.save()
+            return count, changed
+
+    def link(self, experiments):
+        """
+        Finds the control of every experiment number: its own control group, else the nearest control by implant date
+        under the same expid, else the nearest control of the same cell line.
+        :param experiments: dict: the indexed experiment numbers by key
+        :return: dict: key to the linked control, for the experiment numbers a control was found for
+        """
+        by_expid = dict()
+        by_cell = dict()
+        for e in experiments.values():
+            if e['control'] is not None:
+                by_expid.setdefault(e['expid'], []).append(e)
+                if e['cell'] is not None:
+                    by_cell.setdefault(e['cell'], []).append(e)
+
+        def distance(e, control):
+            if e['implant_day'] is None or control['implant_day'] is None:
+                return float('inf')
+            return abs(e['implant_day'] - control['implant_day'])
+
+        links = dict()
+        for key, e in experiments.items():
+            if e['control'] is not None:
+                candidates = [e]
+            else:
+                candidates = by_expid.get(e['expid']) or by_cell.get(e['cell'])
+            if candidates:
+                control = min(candidates, key=lambda c: distance(e, c))
+                links[key] = {'expid': control['expid'], 'exp_nbr': control['exp_nbr'], 'group': control['control']}
+        return links
+
+    def stats(self):
+        """
+        :return: dict: the number of indexed experiment numbers and links, and the last indexed document
+        """
+        return {'experiments': len(self.experiments), 'links': len(self.links), 'last_id': self.last_id,
+                'last_updated': None if self.last_updated is None else self.last_updated.isoformat()}
+
+
+class SummaryStore():
+    """
+    A local store of materialized invivo summaries, one Parquet file per expid. Each file holds the daily box
+    statistics and mean and median curves of every group, with the dates and the group description table kept in the
+    file metadata. Invivo experiments do not change once completed, so the files are written offline by
+    materialize.py and only read by the app.
+    """
+    METADATA_KEY = b'invivo_summary'
+
+    def __init__(self, path):
+        """
+        :param path: string: the directory of the store, created if it does not exist
+        """
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path, exist_ok=True)
+
+    def file_path(self, expid):
+        """
+        :param expid: string: the experiment ID
+        :return: string: the file of the expid, with characters that are not safe in file names quoted
+        """
+        return os.path.join(self.path, f"{urllib.parse.quote(str(expid), safe='')}.parquet")
+
+    def __contains__(self, expid):
+        return os.path.exists(self.file_path(expid))
+
+    def read(self, expid):
+        """
+        :param expid: string: the experiment ID
+        :return: dict: the summary as written by write, or None when the expid has not been materialized
+        """
+        try:
+            table = pq.read_table(self.file_path(expid))
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        summary = json.loads(table.schema.metadata[self.METADATA_KEY])
+        summary['curves'] = table.to_pandas()
+        return summary
+
+    def write(self, expid, summary):
+        """
+        Writes a summary to a temporary file and moves it into place, so readers never see a partial file.
+        :param expid: string: the experiment ID
+        :param summary: dict: the summary from DataService.create_invivo_summary
+        """
+        metadata = {key: value for key, value in summary.items() if key != 'curves'}
+        table = pa.Table.from_pandas(summary['curves'], preserve_index=False)
+        table = table.replace_schema_metadata({**table.schema.metadata,
+                                               self.METADATA_KEY: json.dumps(metadata, default=str)})
+        file_path = self.file_path(expid)
+        pq.write_table(table, f'{file_path}.tmp', compression='zstd')
+        os.replace(f'{file_path}.tmp', file_path)
+
+    def stats(self):
+        """
+        :return: dict: the hit and miss counts and number of stored expids
+        """
+        files = sum(1 for name in os.listdir(self.path) if name.endswith('.parquet'))
+        return {'hits': self.hits, 'misses': self.misses, 'expids': files}
+
+
+# The metrics of the fivedose heatmaps, in the order they are stacked in a MetricMatrix
+FIVEDOSE_METRICS = ('gi50', 'tgi', 'lc50')
+
+# The (metric x cell line x NSC) float32 averages of a fivedose experiment with the labels of its axes
+MetricMatrix = namedtuple('MetricMatrix', ['values', 'metrics', 'cell_lines', 'nscs'])
+
+
+class MetricMatrixStore():
+    """
+    A local store of the fivedose heatmap matrices, one .npy file of (metric x cell line x NSC) float32 averages and
+    one JSON file of its labels per expid. The .npy files are memory mapped, so a heatmap reads its metric straight
+    from the page cache without copying or parsing. Completed experiments do not change, so the files are written
+    offline by materialize.py and only read by the app.
+    """
+    def __init__(self, path):
+        """
+        :param path: string: the directory of the store, created if it does not exist
+        """
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._matrices = dict()
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def file_path(self, expid, extension):
+        """
+        :param expid: string: the experiment ID
+        :param extension: string: 'npy' for the matrix or 'json' for its labels
+        :return: string: the file of the expid, with characters that are not safe in file names quoted
+        """
+        return os.path.join(self.path, f"{urllib.parse.quote(str(expid), safe='')}.{extension}")
+
+    def __contains__(self, expid):
+        return os.path.exists(self.file_path(expid, 'npy')) and os.path.exists(self.file_path(expid, 'json'))
+
+    def read(self, expid):
+        """
+        :param expid: string: the experiment ID
+        :return: MetricMatrix: the memory mapped matrix of the expid, or None when it has not been materialized
+        """
+        with self._lock:
+            matrix = self._matrices.get(expid)
+        if matrix is None:
+            try:
+                with open(self.file_path(expid, 'json')) as f:
+                    labels = json.load(f)
+                values = np.load(self.file_path(expid, 'npy'), mmap_mode='r')
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+            matrix = MetricMatrix(values, labels['metrics'], labels['cell_lines'], labels['nscs'])
+            if values.shape != (len(matrix.metrics), len(matrix.cell_lines), len(matrix.nscs)):
+                # The files are being rewritten
+                self.misses += 1
+                return None
+            with self._lock:
+                self._matrices[expid] = matrix
+        self.hits += 1
+        return matrix
+
+    def write(self, expid, matrix):
+        """
+        Writes a matrix and its labels to temporary files and moves them into place.
+        :param expid: string: the experiment ID
+        :param matrix: MetricMatrix: the matrix from DataService.create_fivedose_matrix
+        """
+        npy_path, json_path = self.file_path(expid, 'npy'), self.file_path(expid, 'json')
+        with open(f'{npy_path}.tmp', 'wb') as f:
+            np.save(f, np.ascontiguousarray(matrix.values, dtype=np.float32))
+        with open(f'{json_path}.tmp', 'w') as f:
+            json.dump({'metrics': list(matrix.metrics), 'cell_lines': list(matrix.cell_lines),
+                       'nscs': list(matrix.nscs)}, f)
+        os.replace(f'{npy_path}.tmp', npy_path)
+        os.replace(f'{json_path}.tmp', json_path)
+        with self._lock:
+            self._matrices.pop(expid, None)
+
+    def stats(self):
+        """
+        :return: dict: the hit and miss counts, number of stored expids and of memory mapped matrices
+        """
+        files = sum(1 for name in os.listdir(self.path) if name.endswith('.npy'))
+        return {'hits': self.hits, 'misses': self.misses, 'expids': files, 'mapped': len(self._matrices)}
+
+
+class FigureCache():
+    """
+    An on-disk cache of serialized Plotly figures in a SQLite file. Because the cache lives in a file, it survives
+    restarts and is shared by every gunicorn worker on the host. Once the stored JSON exceeds the size cap, the least
+    recently used figures are evicted.
+    """
+    def __init__(self, path, max_bytes):
+        """
+        :param path: string: path of the SQLite file, created if it does not exist
+        :param max_bytes: int: the maximum total size of the stored figure JSON
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS figures ('
+                         'key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)')
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # A connection per call keeps the cache safe to use from every callback thread. The connection's own context
+        # manager only commits or rolls back, so closing() is what releases it and its file handle.
+        with contextlib.closing(sqlite3.connect(self.path, timeout=30)) as conn, conn:
+            yield conn
+
+    def get_or_create(self, name, args, builder):
+        """
+        Returns the cached result of a figure builder, or runs the builder and stores its result.
+        :param name: string: name of the figure builder
+        :param args: tuple: the arguments the builder was called with; they must be JSON serializable
+        :param builder: function: no-argument function that builds the figure(s) on a miss
+        :return: object: a Figure, or the list/dict of Figures and plain values the builder returns
+        """
+        key = f'{name}:{json.dumps(args, default=str)}'
+        with self._connect() as conn:
+            row = conn.execute('SELECT value FROM figures WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                conn.execute('UPDATE figures SET accessed = ? WHERE key = ?', (time.time(), key))
+        if row is not None:
+            self.hits += 1
+            return self.decode(row[0])
+
+        self.misses += 1
+        value = builder()
+        encoded = self.encode(value)
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO figures (key, value, size, accessed) VALUES (?, ?, ?, ?)',
+                         (key, encoded, len(encoded), time.time()))
+            self._evict(conn)
+        return value
+
+    def _evict(self, conn):
+        """
+        Removes the least recently used figures until the stored JSON is within the size cap.
+        :param conn: Connection: open connection to the cache file
+        """
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM figures').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evict = []
+        for key, size in conn.execute('SELECT key, size FROM figures ORDER BY accessed ASC'):
+            if total <= self.max_bytes:
+                break
+            evict.append((key,))
+            total -= size
+        conn.executemany('DELETE FROM figures WHERE key = ?', evict)
+        self.evictions += len(evict)
+
+    def encode(self, value):
+        """
+        Serializes a builder result to JSON, marking the Figures so they can be rebuilt on the way out.
+        :param value: object: a Figure, or a list/dict of Figures and plain values
+        :return: string: the JSON
+        """
+        def mark(x):
+            if isinstance(x, go.Figure):
+                return {'__figure__': x}
+            if isinstance(x, dict):
+                return {k: mark(v) for k, v in x.items()}
+            if isinstance(x, (list, tuple)):
+                return [mark(v) for v in x]
+            if isinstance(x, (datetime.date, datetime.datetime)):
+                # Dates are only displayed, so they are kept exactly as they print
+                return str(x)
+            return x
+        return json.dumps(mark(value), cls=PlotlyJSONEncoder)
+
+    def decode(self, encoded):
+        """
+        Rebuilds a builder result from its JSON.
+        :param encoded: string: JSON created by encode
+        :return: object: the Figure, or the list/dict of Figures and plain values
+        """
+        return json.loads(encoded, object_hook=lambda d: go.Figure(d['__figure__']) if '__figure__' in d else d)
+
+    def discard(self, name, args_list):
+        """
+        Removes the cached results of a figure builder for the given arguments, under any render settings.
+        :param name: string: name of the figure builder, without the render settings cached_figure appends
+        :param args_list: iterable: the argument tuples of the results to remove
+        """
+        suffixes = tuple(f':{json.dumps(args, default=str)}' for args in args_list)
+        if not suffixes:
+            return
+        with self._connect() as conn:
+            # Keys are '{name}@{render settings}:{args}', and '@' sorts just before 'A'
+            keys = [(key,) for key, in conn.execute('SELECT key FROM figures WHERE key >= ? AND key < ?',
+                                                    (f'{name}@', f'{name}A'))
+                    if key.endswith(suffixes)]
+            conn.executemany('DELETE FROM figures WHERE key = ?', keys)
+
+    def clear(self):
+        """
+        Removes every figure from the cache file.
+        """
+        with self._connect() as conn:
+            conn.execute('DELETE FROM figures')
+
+    def stats(self):
+        """
+        Snapshot of the figure cache counters.
+        :return: dict: entries, bytes, max_bytes, hits, misses and evictions of this process
+        """
+        with self._connect() as conn:
+            entries, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM figures').fetchone()
+        return {'entries': entries, 'bytes': size, 'max_bytes': self.max_bytes,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling of a line: keeps the first and last point, and from each of the
+    threshold - 2 buckets in between the point forming the largest triangle with the previously kept point and the
+    average of the next bucket.
+    :param x: ndarray: the numeric, ascending x values
+    :param y: ndarray: the y values
+    :param threshold: int: the number of points to keep
+    :return: ndarray: the ascending indices of the kept points
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = np.nanmean(y[next_start:next_end]) if np.isfinite(y[next_start:next_end]).any() else y[a]
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        indices[i + 1] = a
+    return indices
+
+
+def minmax_indices(y, n_out):
+    """
+    Min-max downsampling: splits the points into n_out / 2 consecutive buckets and keeps the lowest and highest point
+    of each, so the extremes survive for points without a meaningful x order such as category axes.
+    :param y: ndarray: the y values
+    :param n_out: int: the maximum number of points to keep
+    :return: ndarray: the ascending indices of the kept points
+    """
+    n = len(y)
+    buckets = max(1, n_out // 2)
+    if n <= n_out:
+        return np.arange(n)
+    size = math.ceil(n / buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    blocks = padded.reshape(buckets, size)
+    starts = np.arange(buckets) * size
+    lowest = starts + np.where(np.isnan(blocks), np.inf, blocks).argmin(axis=1)
+    highest = starts + np.where(np.isnan(blocks), -np.inf, blocks).argmax(axis=1)
+    indices = np.unique(np.concatenate([lowest, highest]))
+    return indices[indices < n]
+
+
+def tile_labels(labels, factor):
+    """
+    :param labels: array: the labels of a heatmap axis
+    :param factor: int: the number of consecutive labels merged into a tile
+    :return: list: the label of every tile, 'first - last' for tiles of more than one label
+    """
+    labels = [str(label) for label in labels]
+    tiles = []
+    for start in range(0, len(labels), factor):
+        last = min(start + factor, len(labels)) - 1
+        tiles.append(labels[start] if start == last else f'{labels[start]} - {labels[last]}')
+    return tiles
+
+
+def tile_heatmap(z, max_cells):
+    """
+    Averages a heatmap matrix over rectangular tiles so that it has at most max_cells cells. Columns are merged
+    before rows, since the heatmaps have far more NSCs or genes than cell lines.
+    :param z: ndarray: the (rows x columns) matrix, NaN for missing cells
+    :param max_cells: int: the maximum number of cells to keep
+    :return: tuple: the tiled matrix, and the number of rows and of columns merged into a tile
+    """
+    rows, cols = z.shape
+    col_factor = min(cols, math.ceil(rows * cols / max_cells))
+    row_factor = math.ceil(rows * math.ceil(cols / col_factor) / max_cells)
+    tiled_rows, tiled_cols = math.ceil(rows / row_factor), math.ceil(cols / col_factor)
+    padded = np.full((tiled_rows * row_factor, tiled_cols * col_factor), np.nan)
+    padded[:rows, :cols] = z
+    blocks = padded.reshape(tiled_rows, row_factor, tiled_cols, col_factor)
+    counts = np.isfinite(blocks).sum(axis=(1, 3))
+    sums = np.nansum(blocks, axis=(1, 3))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / counts, np.nan), row_factor, col_factor
+
+
+class FigureRenderer():
+    """
+    Adapts built figures to what the browser can draw. Depending on the render mode, scatter traces switch to WebGL
+    above a point count; scatters above a larger count are downsampled (LTTB for lines over a numeric x, min-max
+    otherwise), unless they are marker-only WebGL scatters over categories, and heatmaps above a cell count are
+    averaged over tiles. The changed traces are counted per builder; the size of the JSON sent is only measured when
+    measure_payload is set, since serializing every figure is costly.
+    """
+    MODES = ('auto', 'svg', 'webgl')
+    # Per-point attributes of scatter traces that are subset along with x and y when downsampling
+    POINT_ATTRIBUTES = ('x', 'y', 'text', 'hovertext', 'customdata', 'ids')
+    MARKER_ATTRIBUTES = ('color', 'size', 'symbol', 'opacity')
+
+    def __init__(self, mode='auto', webgl_points=1000, max_points=5000, max_cells=100000, measure_payload=False):
+        """
+        :param mode: string: 'auto' switches scatters to WebGL above webgl_points, 'svg' and 'webgl' force one type
+        :param webgl_points: int: number of points of a scatter above which 'auto' draws it with WebGL
+        :param max_points: int: number of points a scatter is downsampled to, 0 to never downsample
+        :param max_cells: int: number of cells a heatmap is tiled to, 0 to never tile
+        :param measure_payload: bool: debug option that serializes every rendered figure to record and print its size
+        """
+        if mode not in self.MODES:
+            raise ValueError(f'Render mode {mode} is not one of {self.MODES}')
+        self.mode = mode
+        self.webgl_points = webgl_points
+        self.max_points = max_points
+        self.max_cells = max_cells
+        self.measure_payload = measure_payload
+        self._stats = dict()
+        self._lock = threading.Lock()
+
+    def signature(self):
+        """
+        :return: string: the settings, part of the figure cache keys so figures are rebuilt when they change
+        """
+        return f'{self.mode}/{self.webgl_points}/{self.max_points}/{self.max_cells}'
+
+    def render(self, name, value):
+        """
+        Renders the figures a builder returned and counts the traces it changed.
+        :param name: string: name of the figure builder
+        :param value: object: a Figure, or the list/dict of Figures and plain values the builder returns
+        :return: object: the value with every Figure rendered
+        """
+        counts = {'renders': 1, 'webgl': 0, 'downsampled': 0, 'tiled': 0}
+        if isinstance(value, go.Figure):
+            value = self.render_figure(value, counts)
+        elif isinstance(value, list):
+            value = [self.render_figure(v, counts) if isinstance(v, go.Figure) else v for v in value]
+        elif isinstance(value, dict):
+            value = {k: self.render_figure(v, counts) if isinstance(v, go.Figure) else v for k, v in value.items()}
+        payload = len(json.dumps(value, cls=PlotlyJSONEncoder)) if self.measure_payload else None
+        with self._lock:
+            stats = self._stats.setdefault(name, {'renders': 0, 'webgl': 0, 'downsampled': 0, 'tiled': 0})
+            for key, count in counts.items():
+                stats[key] += count
+            if payload is not None:
+                stats['last_bytes'] = payload
+                stats['max_bytes'] = max(stats.get('max_bytes', 0), payload)
+        if payload is not None:
+            print(f'Rendered {name}: {payload / 1024:.1f} KB, {counts["webgl"]} WebGL, {counts["downsampled"]} '
+                  f'downsampled and {counts["tiled"]} tiled traces')
+        return value
+
+    def render_figure(self, fig, counts):
+        """
+        :param fig: Figure: the figure to render
+        :param counts: dict: the webgl, downsampled and tiled trace counts, incremented for the changed traces
+        :return: Figure: the figure, or a new one when any trace changed
+        """
+        traces = [self.render_trace(trace, counts, self.category_x(fig, trace)) for trace in fig.data]
+        if all(new is old for new, old in zip(traces, fig.data)):
+            return fig
+        return go.Figure(data=traces, layout=fig.layout)
+
+    @staticmethod
+    def category_x(fig, trace):
+        """
+        :param fig: Figure: the figure of the trace
+        :param trace: BaseTraceType: a trace of the figure
+        :return: bool: whether the x values of the trace are categories, by axis type or by their own type
+        """
+        axis = getattr(trace, 'xaxis', None) or 'x'
+        axis_type = fig.layout.to_plotly_json().get(f'xaxis{axis[1:]}', {}).get('type')
+        if axis_type == 'category':
+            return True
+        x = getattr(trace, 'x', None)
+        return axis_type != 'linear' and x is not None and not np.issubdtype(np.asarray(x).dtype, np.number)
+
+    def render_trace(self, trace, counts, category_x=False):
+        """
+        Marker-only WebGL scatters over categories are never downsampled: every point is a distinct item, such as a
+        compound, that would no longer be shown or found, and WebGL draws them all without trouble.
+        :param trace: BaseTraceType: a trace of a figure
+        :param counts: dict: the webgl, downsampled and tiled trace counts, incremented when the trace changes
+        :param category_x: bool: whether the x values of the trace are categories
+        :return: BaseTraceType: the trace itself when it is left as is, else its replacement
+        """
+        if trace.type == 'heatmap' and self.max_cells and trace.z is not None:
+            z = np.asarray(trace.z, dtype=np.float64)
+            if z.ndim == 2 and z.size > self.max_cells:
+                counts['tiled'] += 1
+                return self.tile_trace(trace, z)
+        if trace.type not in ('scatter', 'scattergl') or trace.y is None:
+            return trace
+
+        n = len(trace.y)
+        gl = self.mode == 'webgl' or (self.mode == 'auto' and (trace.type == 'scattergl' or n > self.webgl_points))
+        every_point = gl and category_x and 'lines' not in (trace.mode or 'lines')
+        props = None
+        if self.max_points and n > self.max_points and not every_point:
+            props = self.downsample(trace)
+            counts['downsampled'] += 1
+        if props is None and (trace.type == 'scattergl') == gl:
+            return trace
+        props = props if props is not None else trace.to_plotly_json()
+        props.pop('type', None)
+        if gl and trace.type != 'scattergl':
+            counts['webgl'] += 1
+        return go.Scattergl(props, skip_invalid=True) if gl else go.Scatter(props, skip_invalid=True)
+
+    def downsample(self, trace):
+        """
+        :param trace: BaseTraceType: a scatter trace with more than max_points points
+        :return: dict: the properties of the trace reduced to the kept points
+        """
+        props = trace.to_plotly_json()
+        y = np.asarray(trace.y, dtype=np.float64)
+        n = len(y)
+        x = None if trace.x is None else np.asarray(trace.x)
+        line = 'lines' in (trace.mode or 'lines')
+        if line and x is not None and np.issubdtype(x.dtype, np.number) and np.all(np.diff(x) >= 0):
+            keep = lttb_indices(x, y, self.max_points)
+        else:
+            keep = minmax_indices(y, self.max_points)
+
+        for key in self.POINT_ATTRIBUTES:
+            values = props.get(key)
+            if values is not None and not isinstance(values, str) and len(values) == n:
+                props[key] = np.asarray(values)[keep]
+        marker = props.get('marker')
+        if isinstance(marker, dict):
+            for key in self.MARKER_ATTRIBUTES:
+                values = marker.get(key)
+                if values is not None and not isinstance(values, str) and np.ndim(values) == 1 and len(values) == n:
+                    marker[key] = np.asarray(values)[keep]
+        return props
+
+    def tile_trace(self, trace, z):
+        """
+        :param trace: BaseTraceType: a heatmap trace with more than max_cells cells
+        :param z: ndarray: the matrix of the trace
+        :return: BaseTraceType: the heatmap of the tile averages, labelled with the first and last label of each tile
+        """
+        tiled, row_factor, col_factor = tile_heatmap(z, self.max_cells)
+        props = trace.to_plotly_json()
+        # The tile averages are rounded, since their full float precision would make up most of the payload
+        props['z'] = np.round(tiled, 4)
+        if trace.x is not None:
+            props['x'] = tile_labels(trace.x, col_factor)
+        if trace.y is not None:
+            props['y'] = tile_labels(trace.y, row_factor)
+        props.pop('type', None)
+        return go.Heatmap(props)
+
+    def stats(self):
+        """
+        :return: dict: per figure builder, the render count, changed traces and, when measured, last and largest payload
+                 in bytes
+        """
+        with self._lock:
+            return {'mode': self.mode, 'figures': {name: dict(stats) for name, stats in self._stats.items()}}
+
+
+def rendered_figure(name):
+    """
+    Decorator for DataService figure builders whose figures can grow large. The returned figures go through the
+    RENDERER, below cached_figure so that the rendered figures are the ones cached.
+    :param name: string: name of the builder, used in the render statistics
+    :return: function: the decorator
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            return self.RENDERER.render(name, func(self, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def cached_figure(name):
+    """
+    Decorator for DataService figure builders whose output only depends on their arguments. Results are served from
+    the on-disk FIGURE_CACHE when it is enabled, keyed by the arguments and the render settings. Keyword arguments
+    are bound to the builder's parameters, so a call by keyword or position, with or without a default, shares a key.
+    :param name: string: name of the builder, used in the cache key
+    :return: function: the decorator
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if self.FIGURE_CACHE is None:
+                return func(self, *args, **kwargs)
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            key_args = tuple(bound.arguments.values())[1:]
+            return self.FIGURE_CACHE.get_or_create(f'{name}@{self.RENDERER.signature()}', key_args,
+                                                   lambda: func(self, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+# Declared column types of the DataService queries for cursor_to_df. Measurements are float32, except the log10 molar
+# mean graph values, which keep float64 since their deltas are plotted and exported; the repeated panel, cell line
+# and gene names are categorical. Columns that are not listed keep the type pandas infers.
+QUERY_SCHEMAS = {
+    'onedose': {'panel_name': 'category', 'cell_name': 'category', 'panel_code': 'category', 'growth': 'float32'},
+    'mean_graphs': {'cellname': 'category', 'panel': 'category', 'gi50': 'float64', 'tgi': 'float64',
+                    'lc50': 'float64'},
+    'oncoprint': {'sample': 'category', 'gene': 'category'},
+    'cell_results': {'expid': 'category', 'one': 'float32', 'two': 'float32', 'three': 'float32',
+                     'four': 'float32', 'five': 'float32'}
+}
+
+
+def mean_graph_deltas(values, low, high, groups=None):
+    """
+    DTP mean graph deltas of log10 molar GI50, TGI or LC50 values. A value beyond the tested concentrations of its
+    cell line is clamped to the nearest tested concentration, since only that bound is known. The delta is the mean of
+    the clamped values over every cell line of the same NSC minus the clamped value, so positive deltas (bars to the
+    right) are cell lines more sensitive than the panel average. Missing values are NaN and left out of the means.
+    :param values: ndarray: the log10 molar values of every cell line result
+    :param low: ndarray: the lowest tested log10 concentration of every result, NaN when unknown
+    :param high: ndarray: the highest tested log10 concentration of every result, NaN when unknown
+    :param groups: ndarray: the 0-based NSC code of every result when the results of several NSCs are computed at
+            once, or None when they all belong to one NSC
+    :return: tuple: the clamped values, the deltas and an int8 flag per result: -1 when clamped to the lowest tested
+            concentration, 1 when clamped to the highest, 0 otherwise
+    """
+    values = np.asarray(values, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    high = np.asarray(high, dtype=np.float64)
+    # fmax and fmin ignore the NaN bounds of results without tested concentrations
+    clamped = np.where(np.isnan(values), np.nan, np.fmin(np.fmax(values, low), high))
+    out_of_range = np.where(values < low, -1, np.where(values > high, 1, 0)).astype(np.int8)
+
+    groups = np.zeros(len(values), dtype=np.int64) if groups is None else np.asarray(groups, dtype=np.int64)
+    n_groups = int(groups.max()) + 1 if len(groups) else 0
+    observed = ~np.isnan(clamped)
+    sums = np.bincount(groups[observed], weights=clamped[observed], minlength=n_groups)
+    counts = np.bincount(groups[observed], minlength=n_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+    return clamped, means[groups] - clamped, out_of_range
+
+
+def tested_range(concs):
+    """
+    :param concs: list: the tested log10 concentrations of a result
+    :return: tuple: the lowest and highest of them, NaN when there are none
+    """
+    concs = [c for c in concs or [] if c is not None]
+    return (min(concs), max(concs)) if concs else (np.nan, np.nan)
+
+
+def cursor_to_df(cursor, schema=None, batch_size=1000, frame_size=20000):
+    """
+    Builds a DataFrame from the cursor frame_size documents at a time: each slice is converted with
+    pd.DataFrame.from_records as it is fetched, the slice frames are concatenated once and the declared dtypes are
+    applied to the whole frame. Fields missing from a document are missing values. Categorical columns keep their
+    values in order of first appearance, which keeps the plotly legend and axis order the same as with object columns.
+    :param cursor: Cursor: a pymongo cursor or any iterable of flat documents
+    :param schema: dict: optional column name to dtype mapping, e.g. one of QUERY_SCHEMAS
+    :param batch_size: int: number of documents fetched per round trip
+    :param frame_size: int: number of documents converted to a frame at a time, large enough that the per call
+            overhead of from_records does not add up
+    :return: DataFrame: the documents as a dataframe with the declared dtypes
+    """
+    if hasattr(cursor, 'batch_size'):
+        cursor.batch_size(batch_size)
+    docs = iter(cursor)
+    frames = []
+    while True:
+        docs_slice = list(itertools.islice(docs, frame_size))
+        if not docs_slice:
+            break
+        frames.append(pd.DataFrame.from_records(docs_slice))
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+    for key, dtype in (schema or dict()).items():
+        if key not in df:
+            continue
+        if dtype == 'category':
+            # factorize numbers the values in order of first appearance, missing values are -1
+            codes, categories = pd.factorize(df[key])
+            df[key] = pd.Categorical.from_codes(codes, categories)
+        else:
+            df[key] = df[key].astype(dtype)
+    return df
 
 
 class DataService():
@@ -38,7 +1404,13 @@ class DataService():
         #                "LNS": "Non-Small Cell Lung Cancer"}
 
         # Mongo
-        self.CLIENT = pymongo.MongoClient(CONN_STRING, connect=True)
+        # The client is shared by every Dash callback thread, so the pool is sized from the environment and
+        # instrumented for the internal stats endpoint.
+        self.COMMAND_STATS = CommandStatsListener()
+        self.POOL_STATS = PoolStatsListener()
+        self.CLIENT = pymongo.MongoClient(CONN_STRING, connect=True,
+                                          event_listeners=[self.COMMAND_STATS, self.POOL_STATS],
+                                          **self.get_mongo_client_options())
         print(f'Mongo Client initialized...')
         self.DB = self.CLIENT.get_database('NCIDCTD')
         print(f'Mongo NCIDCTD DB initialized...')
@@ -50,6 +1422,62 @@ class DataService():
         self.ONCOKB_COLL = self.DB.get_collection('oncoprint')
         print(f'Collections initialized...')
 
+        # Number of documents fetched per round trip when query results are converted with cursor_to_df
+        self.CURSOR_BATCH_SIZE = int(os.getenv('CURSOR_BATCH_SIZE', 1000))
+
+        # Experiment results never change once loaded, so repeated tab clicks are served from here.
+        # RESULT_CACHE_SIZE is the number of (collection, expid, nsc, projection) entries held and
+        # RESULT_CACHE_TTL is the number of seconds before an entry is re-queried (0 never expires).
+        self.RESULT_CACHE = ResultCache(max_size=int(os.getenv('RESULT_CACHE_SIZE', 128)),
+                                        ttl=float(os.getenv('RESULT_CACHE_TTL', 600)))
+
+        # Built figures are stored in FIGURE_CACHE_PATH (an empty value disables the cache) and capped at
+        # FIGURE_CACHE_MAX_MB megabytes of figure JSON.
+        figure_cache_path = os.getenv('FIGURE_CACHE_PATH', 'figure_cache.sqlite')
+        self.FIGURE_CACHE = None
+        if figure_cache_path:
+            self.FIGURE_CACHE = FigureCache(figure_cache_path,
+                                            int(float(os.getenv('FIGURE_CACHE_MAX_MB', 256)) * 1024 * 1024))
+
+        # Fivedose heatmap matrices materialized by materialize.py are memory mapped from the FIVEDOSE_MATRIX_PATH
+        # directory; an empty value disables the store and the matrices are built from Mongo.
+        matrix_store_path = os.getenv('FIVEDOSE_MATRIX_PATH', 'fivedose_matrices')
+        self.MATRIX_STORE = MetricMatrixStore(matrix_store_path) if matrix_store_path else None
+
+        # Large figures are drawn with WebGL, downsampled or tiled depending on RENDER_MODE (auto, svg or webgl) and the
+        # RENDER_WEBGL_POINTS, RENDER_MAX_POINTS and RENDER_MAX_CELLS thresholds; 0 disables downsampling or tiling.
+        # RENDER_MEASURE_PAYLOAD=true serializes every rendered figure to log its size, for debugging only.
+        self.RENDERER = FigureRenderer(mode=os.getenv('RENDER_MODE', 'auto'),
+                                       webgl_points=int(os.getenv('RENDER_WEBGL_POINTS', 1000)),
+                                       max_points=int(os.getenv('RENDER_MAX_POINTS', 5000)),
+                                       max_cells=int(os.getenv('RENDER_MAX_CELLS', 100000)),
+                                       measure_payload=os.getenv('RENDER_MEASURE_PAYLOAD', '') == 'true')
+
+        # Invivo summaries materialized by materialize.py are read from the SUMMARY_STORE_PATH directory; an empty value
+        # disables the store and every summary is computed from Mongo.
+        summary_store_path = os.getenv('SUMMARY_STORE_PATH', 'invivo_summary')
+        self.SUMMARY_STORE = SummaryStore(summary_store_path) if summary_store_path else None
+
+        # Autocomplete prefix indexes of expids per collection and of compound NSCs. They are filled and refreshed
+        # every AUTOCOMPLETE_REFRESH_SECONDS by a background thread started with start_autocomplete_refresh.
+        self.EXPID_INDEX = dict()
+        self.NSC_INDEX = PrefixIndex()
+        self.AUTOCOMPLETE_REFRESH = float(os.getenv('AUTOCOMPLETE_REFRESH_SECONDS', 3600))
+        self._autocomplete_thread = None
+        self._autocomplete_lock = threading.Lock()
+
+        # Links invivo experiments to the control group they are compared with, including follow-up experiments that
+        # have no control of their own. It is persisted in CONTROL_INDEX_PATH (an empty value keeps it in memory) and
+        # picks up changed experiments every CONTROL_INDEX_REFRESH_SECONDS once start_control_index_refresh is called,
+        # by the CONTROL_INDEX_UPDATED_FIELD timestamp when the invivo documents have one. Without it only inserted
+        # documents are found, so the index is also rebuilt every CONTROL_INDEX_FULL_REFRESH_SECONDS.
+        self.CONTROL_INDEX = ControlIndex(os.getenv('CONTROL_INDEX_PATH', 'control_index.json') or None,
+                                          os.getenv('CONTROL_INDEX_UPDATED_FIELD') or None)
+        self.CONTROL_INDEX_REFRESH = float(os.getenv('CONTROL_INDEX_REFRESH_SECONDS', 3600))
+        self.CONTROL_INDEX_FULL_REFRESH = float(os.getenv('CONTROL_INDEX_FULL_REFRESH_SECONDS', 86400))
+        self._control_index_thread = None
+        self._control_index_lock = threading.Lock()
+
         # Chart Styles
         self.PLOT_STYLE_DF = pd.read_csv(
             os.path.abspath('../dash/assets/plot_styles.csv'))  # /dash/assets/    /dash/pages/
@@ -74,6 +1502,15 @@ class DataService():
         random.shuffle(symbols)
         self.SYMBOLS = symbols
 
+        # Style lookup tables built once from plot_styles.csv, keyed by line name and by (panel code, line name),
+        # so figure builders don't have to scan PLOT_STYLE_DF for every trace.
+        self.STYLE_BY_LINE, self.STYLE_BY_PANEL_LINE = self.create_style_index(self.PLOT_STYLE_DF)
+        # Cell lines missing from plot_styles.csv are given a palette style the first time they are plotted
+        self.FALLBACK_SYMBOLS = [x for x in symbols if isinstance(x, str) and not x.isdigit()
+                                 and not x.endswith('-open') and not x.endswith('-dot')]
+        self._fallback_styles = dict()
+        self._fallback_lock = threading.Lock()
+
         # OncoKB alteration Mapping
         self.ONCOKB_ALT_TYPE_MAP = {
             'Not Found': None,
@@ -87,6 +1524,174 @@ class DataService():
             'Splice_Site': None
         }
 
+    def start_autocomplete_refresh(self):
+        """
+        Starts the background thread that loads the autocomplete indexes and refreshes them periodically. Calling it
+        again does nothing.
+        """
+        with self._autocomplete_lock:
+            if self._autocomplete_thread is None:
+                self._autocomplete_thread = threading.Thread(target=self.refresh_autocomplete_loop,
+                                                             name='autocomplete-index', daemon=True)
+                self._autocomplete_thread.start()
+
+    def refresh_autocomplete_loop(self):
+        """
+        Reloads the autocomplete indexes until the process exits. A failed load keeps the previous indexes.
+        """
+        while True:
+            try:
+                self.load_autocomplete_indexes()
+            except Exception as e:
+                print(f'Autocomplete index refresh failed: {e}')
+            time.sleep(self.AUTOCOMPLETE_REFRESH)
+
+    def load_autocomplete_indexes(self):
+        """
+        Loads every expid of the fivedose, onedose and invivo collections and every compound NSC that has a SMILES
+        into prefix indexes. The indexes are replaced whole, so searches never see a partial load.
+        """
+        start = time.perf_counter()
+        expid_index = {coll.name: PrefixIndex(coll.distinct('expid'))
+                       for coll in (self.FIVEDOSE_COLL, self.ONEDOSE_COLL, self.INVIVO_COLL)}
+        nsc_index = PrefixIndex(self.COMPOUNDS_COLL.distinct('nsc', {
+            'mv_dtp_disregistration_short.canonicalsmiles': {
+                '$exists': True
+            }
+        }))
+        self.EXPID_INDEX = expid_index
+        self.NSC_INDEX = nsc_index
+        print(f'Autocomplete indexes loaded in {time.perf_counter() - start:.2f}s: '
+              f'{ {name: len(index) for name, index in expid_index.items()} } expids, {len(nsc_index)} NSCs')
+
+    def start_control_index_refresh(self):
+        """
+        Starts the background thread that builds the invivo control index, or brings a persisted one up to date, and
+        refreshes it periodically. Calling it again does nothing.
+        """
+        with self._control_index_lock:
+            if self._control_index_thread is None:
+                self._control_index_thread = threading.Thread(target=self.refresh_control_index_loop,
+                                                              name='control-index', daemon=True)
+                self._control_index_thread.start()
+
+    def refresh_control_index_loop(self):
+        """
+        Adds changed invivo experiments to the control index until the process exits, rebuilding it from every document
+        every CONTROL_INDEX_FULL_REFRESH_SECONDS when there is no updated field to find updated documents by. The
+        cached experiments, Kaplan-Meier fits and summary figures of the expids whose experiments or control links
+        changed are dropped.
+        A failed refresh keeps the previous index.
+        """
+        last_full = time.monotonic()
+        while True:
+            try:
+                start = time.perf_counter()
+                full = (self.CONTROL_INDEX.updated_field is None and
+                        time.monotonic() - last_full >= self.CONTROL_INDEX_FULL_REFRESH)
+                count, changed = self.CONTROL_INDEX.refresh(self.INVIVO_COLL, full=full)
+                if full:
+                    last_full = time.monotonic()
+                self.RESULT_CACHE.discard([(name, expid) for expid in changed for name in ('invivo', 'km')])
+                if self.FIGURE_CACHE is not None:
+                    self.FIGURE_CACHE.discard('invivo_summary_plots', [(expid,) for expid in changed])
+                print(f'Control index refreshed in {time.perf_counter() - start:.2f}s: {count} documents read, '
+                      f'{len(changed)} expids changed, {self.CONTROL_INDEX.stats()}')
+            except Exception as e:
+                print(f'Control index refresh failed: {e}')
+            time.sleep(self.CONTROL_INDEX_REFRESH)
+
+    def search_expids(self, coll, search_value, limit=10):
+        """
+        Autocomplete of experiment IDs. Prefix matches are answered from the in-memory index, and Mongo is only
+        queried with a regex when the index has no match or is not loaded yet.
+        :param coll: Collection: the fivedose, onedose or invivo collection
+        :param search_value: string: the typed search value
+        :param limit: int: the maximum number of experiment IDs returned
+        :return: list: matching experiment IDs
+        """
+        index = self.EXPID_INDEX.get(coll.name)
+        if index is not None:
+            results = index.search(str(search_value), limit)
+            if results:
+                return results
+
+        return [d['expid'] for d in coll.aggregate([
+            {
+                '$match': {
+                    'expid': {'$regex': str(search_value)}
+                }
+            }, {
+                '$project': {
+                    '_id': 0,
+                    'expid': 1
+                }
+            }, {
+                '$limit': limit
+            }
+        ])]
+
+    def search_nscs(self, search_value, limit=10):
+        """
+        Autocomplete of compound NSCs that have a SMILES. Prefix matches are answered from the in-memory index, and
+        Mongo is only queried with a regex on char_nsc when the index has no match.
+        :param search_value: string: the typed search value
+        :param limit: int: the maximum number of NSCs returned
+        :return: list: matching NSCs as integers
+        """
+        results = self.NSC_INDEX.search(str(search_value), limit)
+        if results:
+            return [int(x) for x in results]
+
+        return [d['nsc'] for d in self.COMPOUNDS_COLL.aggregate([
+            {
+                '$match': {
+                    'char_nsc': {'$regex': str(search_value)},
+                    'mv_dtp_disregistration_short.canonicalsmiles': {
+                        '$exists': True
+                    }
+                }
+            }, {
+                '$project': {
+                    '_id': 0,
+                    'nsc': 1
+                }
+            }, {
+                '$limit': limit
+            }
+        ])]
+
+    def get_mongo_client_options(self):
+        """
+        Reads the connection pool, timeout and read preference settings that are set in the environment.
+        :return: dict: MongoClient keyword arguments
+        """
+        options = dict()
+        for env_name, (option, cast) in MONGO_CLIENT_SETTINGS.items():
+            value = os.getenv(env_name)
+            if value:
+                options[option] = cast(value)
+        return options
+
+    def get_service_stats(self):
+        """
+        Collects the Mongo command, connection pool, cache, control index, materialized store and figure render
+        statistics for the internal stats endpoint.
+        :return: dict: the statistics with keys 'commands', 'pool', 'pool_options', 'result_cache', 'figure_cache',
+                'control_index', 'summary_store', 'matrix_store' and 'render'
+        """
+        return {
+            'commands': self.COMMAND_STATS.stats(),
+            'pool': self.POOL_STATS.stats(),
+            'pool_options': self.get_mongo_client_options(),
+            'result_cache': self.RESULT_CACHE.stats(),
+            'figure_cache': None if self.FIGURE_CACHE is None else self.FIGURE_CACHE.stats(),
+            'control_index': self.CONTROL_INDEX.stats(),
+            'summary_store': None if self.SUMMARY_STORE is None else self.SUMMARY_STORE.stats(),
+            'matrix_store': None if self.MATRIX_STORE is None else self.MATRIX_STORE.stats(),
+            'render': self.RENDERER.stats()
+        }
+
     def __del__(self):
         """
         Tries to close all open database connections in the event of application exit.
@@ -96,6 +1701,92 @@ class DataService():
         self.CLIENT.close()
         print('Closing connections and destructing.')
 
+    def get_cached_aggregate(self, coll, expid, nsc, projection, pipeline, schema=None):
+        """
+        Runs an aggregation through the result cache. The key is (collection, expid, nsc, projection) so that each
+        distinct shape of result for an experiment and NSC costs one round trip to Mongo.
+        :param coll: Collection: the Mongo collection to aggregate on
+        :param expid: string: experiment ID
+        :param nsc: int: NSC within the experiment
+        :param projection: dict: the final projection of the pipeline, or None when whole documents are returned
+        :param pipeline: list: the aggregation pipeline to run on a cache miss
+        :param schema: dict: optional column dtypes; when given the cursor is streamed into a DataFrame with
+                cursor_to_df and the frame is cached instead of the documents
+        :return: list or DataFrame: the result documents, or a DataFrame when a schema is given; callers must not
+                modify them as they are shared
+        """
+        projection_key = None if projection is None else tuple(sorted(projection.items()))
+        key = (coll.name, expid, int(nsc), projection_key)
+        if schema is not None:
+            return self.RESULT_CACHE.get(key, lambda: cursor_to_df(coll.aggregate(pipeline), schema,
+                                                                   self.CURSOR_BATCH_SIZE))
+        return self.RESULT_CACHE.get(key, lambda: [d for d in coll.aggregate(pipeline)])
+
+    @staticmethod
+    def build_tline_pipeline(expid, nsc, fields=None):
+        """
+        Builds an aggregation that returns the tline rows of a single NSC from an experiment. The tline array is
+        narrowed with $filter inside the document, so only the requested NSC's rows are unwound and sent over the
+        wire instead of every row of a multi-compound experiment.
+        :param expid: string: experiment ID
+        :param nsc: string: NSC within the experiment
+        :param fields: dict: optional projection of the rows, name: 1 to keep a field or name: '$path' to rename a
+                nested field; the whole row is returned when None
+        :return: list: the aggregation pipeline
+        """
+        rows = {
+            '$filter': {
+                'input': '$tline',
+                'as': 'row',
+                'cond': {
+                    '$eq': ['$$row.nsc', int(nsc)]
+                }
+            }
+        }
+        if fields is not None:
+            # $map trims each remaining row down to the requested fields on the server
+            rows = {
+                '$map': {
+                    'input': rows,
+                    'as': 'row',
+                    'in': {name: f'$$row.{name}' if path == 1 else f'$$row.{path[1:]}'
+                           for name, path in fields.items()}
+                }
+            }
+
+        return [
+            {
+                '$match': {
+                    'expid': expid,
+                    'tline.nsc': int(nsc)
+                }
+            }, {
+                '$project': {
+                    '_id': 0,
+                    'tline': rows
+                }
+            }, {
+                '$unwind': {
+                    'path': '$tline'
+                }
+            }, {
+                '$replaceRoot': {
+                    'newRoot': '$tline'
+                }
+            }
+        ]
+
+    def get_tline_rows(self, nsc, exp_id):
+        """
+        Retrieve the raw tline documents of an NSC from a fivedose experiment. The response curves and the mean graphs
+        are both derived from these rows, so they share a single cached query.
+        :param nsc: string: NSC within experiment
+        :param exp_id: string: experiment ID
+        :return: list: list of tline documents for the given NSC
+        """
+        pipeline = self.build_tline_pipeline(exp_id, nsc)
+        return self.get_cached_aggregate(self.FIVEDOSE_COLL, exp_id, nsc, None, pipeline)
+
     def get_df_by_nsc(self, nsc, exp_id):
         """
         MongoDB aggregation query to retrieve data for an NSC from a specific experiment.
@@ -103,36 +1794,7 @@ class DataService():
         :param exp_id: string: experiment ID
         :return: DataFrame: dataFrame of the experiment data for the given NSC
         """
-        data = [d for d in
-                (self.FIVEDOSE_COLL.aggregate(
-                    [
-                        {
-                            '$match': {
-                                'expid': exp_id
-                            }
-                        }, {
-                        '$project': {
-                            '_id': 0,
-                            'tline': 1
-                        }
-                    }, {
-                        '$unwind': {
-                            'path': '$tline'
-                        }
-                    }, {
-                        '$replaceRoot': {
-                            'newRoot': '$tline'
-                        }
-                    }, {
-                        '$match': {
-                            'nsc': int(nsc)
-                        }
-                    }
-                    ])
-                )
-                ]
-
-        df = pd.DataFrame(data)
+        df = pd.DataFrame(self.get_tline_rows(nsc, exp_id))
         return df
 
     def get_od_df_by_nsc(self, nsc, expid):
@@ -142,71 +1804,57 @@ class DataService():
         :param expid: string: experiment ID for which we are looking for result data
         :return: DataFrame: dataFrame of the onedose experiment data
         """
-        data = [d for d in
-                (self.ONEDOSE_COLL.aggregate(
-                    [
-                        {
-                            '$match': {
-                                'expid': expid
-                            }
-                        }, {
-                        '$project': {
-                            '_id': 0,
-                            'tline': 1
-                        }
-                    }, {
-                        '$unwind': {
-                            'path': '$tline'
-                        }
-                    }, {
-                        '$replaceRoot': {
-                            'newRoot': '$tline'
-                        }
-                    }, {
-                        '$match': {
-                            'nsc': int(nsc)
-                        }
-                    }, {
-                        '$project': {
-                            'nsc': 1,
-                            'panel_name': '$cellpnl.panelnme',
-                            'cell_name': '$cellline.cellname',
-                            'panel_code': '$cellline.panelcde',
-                            'growth': '$GrowthPercent.Average'
-                        }
-                    }
-                    ])
-                )
-                ]
-
-        df = pd.DataFrame(data)
+        projection = {
+            'nsc': 1,
+            'panel_name': '$cellpnl.panelnme',
+            'cell_name': '$cellline.cellname',
+            'panel_code': '$cellline.panelcde',
+            'growth': '$GrowthPercent.Average'
+        }
+        pipeline = self.build_tline_pipeline(expid, nsc, projection)
+        df = self.get_cached_aggregate(self.ONEDOSE_COLL, expid, nsc, projection, pipeline,
+                                       QUERY_SCHEMAS['onedose'])
 
         return df
 
+    def create_conc_resp_long_df(self, df):
+        """
+        Flattens the cellline and wgroup fields of fivedose results into a long-format table in a single pass, which
+        is then pivoted for the full and the per-panel concentration response matrices.
+        :param df: DataFrame: dataframe of response data in five dose.
+        :return: DataFrame: one row per cell line and concentration with columns panelcde, cellname, conc and growth
+        """
+        records = [
+            (cellline['panelcde'], cellline['cellname'], x['conc'], x['wg_growth_percent']['Average'])
+            for cellline, wgroup in zip(df['cellline'], df['wgroup'])
+            for x in wgroup
+        ]
+        return pd.DataFrame.from_records(records, columns=['panelcde', 'cellname', 'conc', 'growth'])
+
+    def pivot_conc_resp(self, long_df):
+        """
+        Pivots a long-format concentration response table into concentrations by cell lines. Cell lines keep the
+        order in which they appear in the experiment.
+        :param long_df: DataFrame: long-format table from create_conc_resp_long_df
+        :return: DataFrame: dataframe using concentrations as the index value, cell line as columns, and growth values
+        """
+        table = long_df.drop_duplicates(['conc', 'cellname'], keep='last').pivot(
+            index='conc', columns='cellname', values='growth')
+        table = table[long_df['cellname'].unique()]
+        table.columns.name = None
+        return table
+
     def create_grouped_data_dict(self, df):
         """
         Create a dictionary of values divided up into the cell line panels as the keys.
         :param df: DataFrame: dataFrame of experiment data
         :return: dict: dictionary of data by cell line panel code
         """
-        data_dict = dict()
-        for row in range(df.index.size):
-            panelcde = df.iloc[row].cellline['panelcde']
-            cellline = df.iloc[row].cellline['cellname']
-            conc_resp = [x for x in df.iloc[row].wgroup]
-            conc = [x['conc'] for x in conc_resp]
-            growth = [x['wg_growth_percent']['Average'] for x in conc_resp]
-            growth_dict = {'conc': conc, cellline: growth}
-
-            tdf = pd.DataFrame(growth_dict)
-            tdf.set_index('conc', inplace=True)
-
-            if panelcde in data_dict.keys():
-                data_dict[panelcde] = pd.concat([data_dict[panelcde], tdf], axis=1)
-            else:
-                data_dict[panelcde] = tdf
-
-        return data_dict
+        if df.empty:
+            return dict()
+        long_df = self.create_conc_resp_long_df(df)
+        return {panelcde: self.pivot_conc_resp(panel_df)
+                for panelcde, panel_df in long_df.groupby('panelcde', sort=False)}
 
     def create_conc_resp_df(self, df):
         """
@@ -214,22 +1862,47 @@ class DataService():
         :param df: DataFrame: dataframe of response data in five dose.
         :return: DataFrame: dataframe using concentrations as the index value, cell line as columns, and growth values
         """
-        new_df = None
-        for row in range(df.index.size):
-            cellline = df.iloc[row].cellline['cellname']
-            conc_resp = [x for x in df.iloc[row].wgroup]
-            conc = [x['conc'] for x in conc_resp]
-            growth = [x['wg_growth_percent']['Average'] for x in conc_resp]
-            growth_dict = {'conc': conc, cellline: growth}
-
-            tdf = pd.DataFrame(growth_dict)
-            tdf.set_index('conc', inplace=True)
-            if new_df is None:
-                new_df = tdf.copy()
-            else:
-                new_df = pd.concat([new_df, tdf], axis=1)
+        if df.empty:
+            return None
+        return self.pivot_conc_resp(self.create_conc_resp_long_df(df))
 
-        return new_df
+    def create_style_index(self, style_df):
+        """
+        Creates the immutable cell line style lookup tables from the plot_styles.csv dataframe.
+        :param style_df: DataFrame: the COMPARE plot styles
+        :return: tuple: a mapping of line name to CellLineStyle and a mapping of (panel code, line name) to CellLineStyle
+        """
+        by_line = dict()
+        by_panel_line = dict()
+        for panel, line, symbol, color, pattern in zip(style_df['panel_cde'], style_df['line_name'],
+                                                        style_df['cell_line_symbol'], style_df['panel_color'],
+                                                        style_df['cell_line_line_pattern']):
+            style = CellLineStyle(symbol, color, 'solid' if pd.isna(pattern) else str(pattern))
+            # The first entry for a line name wins, which is what the boolean mask lookup used to return
+            by_line.setdefault(line, style)
+            by_panel_line.setdefault((panel, line), style)
+        return MappingProxyType(by_line), MappingProxyType(by_panel_line)
+
+    def get_cell_line_style(self, cell, panel=None):
+        """
+        Looks up the style of a cell line, optionally within a panel. Cell lines that are not in plot_styles.csv get a
+        style from the shuffled COLORS and SYMBOLS palette, which stays the same for the life of the process.
+        :param cell: string: the cell line name
+        :param panel: string: the panel code of the cell line, or None to look up by line name only
+        :return: CellLineStyle: the symbol, color and line pattern of the cell line
+        """
+        style = self.STYLE_BY_LINE.get(cell) if panel is None else self.STYLE_BY_PANEL_LINE.get((panel, cell))
+        if style is not None:
+            return style
+
+        with self._fallback_lock:
+            style = self._fallback_styles.get(cell)
+            if style is None:
+                idx = len(self._fallback_styles)
+                style = CellLineStyle(self.FALLBACK_SYMBOLS[idx % len(self.FALLBACK_SYMBOLS)],
+                                      self.COLORS[idx % len(self.COLORS)], 'solid')
+                self._fallback_styles[cell] = style
+        return style
 
     def get_conc_resp_graph(self, df, nsc):
         """
@@ -241,11 +1914,7 @@ class DataService():
         conc_resp_fig = go.Figure()
         nsc_df = self.create_conc_resp_df(df)
         for cell in nsc_df.columns:
-            style = self.PLOT_STYLE_DF[self.PLOT_STYLE_DF['line_name'] == cell][
-                ['cell_line_symbol', 'panel_color', 'cell_line_line_pattern']]
-            line_pattern = str(
-                style['cell_line_line_pattern'].iat[0] if not style['cell_line_line_pattern'].isna().any() else 'solid')
-
+            style = self.get_cell_line_style(cell)
             conc_resp_fig.add_trace(
                 go.Scatter(
                     x=nsc_df[cell].index,
@@ -253,8 +1922,8 @@ class DataService():
                     mode='lines+markers',
                     name=f'{cell}',
                     line_shape='spline',
-                    marker={'symbol': f"{style['cell_line_symbol'].iat[0]}-open", 'size': 12},
-                    line={'color': style['panel_color'].iat[0], 'dash': line_pattern}
+                    marker={'symbol': f"{style.symbol}-open", 'size': 12},
+                    line={'color': style.color, 'dash': style.line_pattern}
                 ))
         conc_resp_fig.update_xaxes(title=f'Concentration (log{self.subscr10} mol)', )
         conc_resp_fig.update_yaxes(title='Growth Inhibition Pct (GI%)')
@@ -273,11 +1942,7 @@ class DataService():
         conc_resp_fig = go.Figure()
 
         for cell in nsc_df.columns:
-            style = \
-            self.PLOT_STYLE_DF[(self.PLOT_STYLE_DF['panel_cde'] == panel) & (self.PLOT_STYLE_DF['line_name'] == cell)][
-                ['cell_line_symbol', 'panel_color', 'cell_line_line_pattern']]
-            line_pattern = str(
-                style['cell_line_line_pattern'].iat[0] if not style['cell_line_line_pattern'].isna().any() else 'solid')
+            style = self.get_cell_line_style(cell, panel)
             conc_resp_fig.add_trace(
                 go.Scatter(
                     x=nsc_df[cell].index,
@@ -285,8 +1950,8 @@ class DataService():
                     mode='lines+markers',
                     name=f'{cell}',
                     line_shape='spline',
-                    marker={'symbol': f"{style['cell_line_symbol'].iat[0]}-open", 'size': 12},
-                    line={'color': style['panel_color'].iat[0], 'dash': line_pattern}
+                    marker={'symbol': f"{style.symbol}-open", 'size': 12},
+                    line={'color': style.color, 'dash': style.line_pattern}
                 ))
         conc_resp_fig.update_xaxes(title=f'Concentration (log{self.subscr10} mol)')
         conc_resp_fig.update_yaxes(title='Growth Inhibition Pct (GI%)')
@@ -319,14 +1984,58 @@ class DataService():
 
     def get_mean_graphs_data(self, nsc, expid):
         """
-        Initializes the instance data for the graphs of fivedose TGI, GI50, and LC50. Sets them as instance variables
-        in order to prevent additional database calls. It's not really necessary, but it is just for speed improvement.
+        Returns the data for the graphs of fivedose TGI, GI50, and LC50 as one bundle. Bundles are cached per
+        (expid, nsc), so the three tabs share one computation and concurrent users never see each other's data.
+        :param nsc: string: the NSC of the experiment
+        :param expid: string: the experiment ID
+        :return: MeanGraphData: the gi50, tgi and lc50 dataframes with cellname, panel, metric, delta and out_of_range
+                columns
+        """
+        return self.RESULT_CACHE.get(('mean_graphs', expid, int(nsc)),
+                                     lambda: self.create_mean_graphs_data(nsc, expid))
+
+    def create_mean_graphs_data(self, nsc, expid):
+        """
+        Creates the bundle of GI50, TGI, and LC50 dataframes for get_mean_graphs_data.
         :param nsc: string: the NSC of the experiment
         :param expid: string: the experiment ID
-        :return:None: simply a helping function to optimize some performance
+        :return: MeanGraphData: the gi50, tgi and lc50 dataframes
         """
         print(f'IN GET MEAN_GRAPHS_DATA WITH {nsc} and expid {expid}')
-        data = self.FIVEDOSE_COLL.aggregate([
+        # Shares the cached tline rows with the concentration response tabs instead of another aggregation
+        rows = self.get_tline_rows(nsc, expid)
+        data = (
+            {
+                'cellname': d.get('cellline', {}).get('cellname'),
+                'panel': d.get('cellpnl', {}).get('panelnme'),
+                'tgi': d.get('tgi', {}).get('Average'),
+                'gi50': d.get('gi50', {}).get('Average'),
+                'lc50': d.get('lc50', {}).get('Average')
+            }
+            for d in rows
+        )
+        df = cursor_to_df(data, QUERY_SCHEMAS['mean_graphs'])
+        low, high = np.array([tested_range([w.get('conc') for w in d.get('wgroup', [])]) for d in rows],
+                             dtype=np.float64).reshape(-1, 2).T
+
+        frames = dict()
+        for metric in MeanGraphData._fields:
+            frame = df[['cellname', 'panel', metric]].copy()
+            _, frame['delta'], frame['out_of_range'] = mean_graph_deltas(frame[metric].values, low, high)
+            frames[metric] = frame
+
+        print(f"Data loaded for GI50,LC50,TGI for nsc {nsc}")
+        return MeanGraphData(**frames)
+
+    def get_mean_graph_batch(self, expid):
+        """
+        Computes the mean graph deltas of every NSC in a fivedose experiment at once, for COMPARE-style exports.
+        Pivot the result on nsc and cellname for an (NSC x cell line) delta matrix of a metric.
+        :param expid: string: the experiment ID
+        :return: DataFrame: a row per NSC, cell line and metric with columns nsc, cellname, panel, metric, value,
+                delta and out_of_range, as in the frames of get_mean_graphs_data
+        """
+        rows = self.FIVEDOSE_COLL.aggregate([
             {
                 '$match': {
                     'expid': expid
@@ -334,57 +2043,56 @@ class DataService():
             }, {
                 '$project': {
                     '_id': 0,
-                    'tline': 1
+                    'tline': {
+                        '$map': {
+                            'input': '$tline',
+                            'as': 'row',
+                            'in': {
+                                'nsc': '$$row.nsc',
+                                'cellname': '$$row.cellline.cellname',
+                                'panel': '$$row.cellpnl.panelnme',
+                                'concs': '$$row.wgroup.conc',
+                                **{metric: f'$$row.{metric}.Average' for metric in MeanGraphData._fields}
+                            }
+                        }
+                    }
                 }
             }, {
                 '$unwind': {
-                    'path': '$tline',
-                    'preserveNullAndEmptyArrays': False
-                }
-            }, {
-                '$match': {
-                    'tline.nsc': int(nsc)
+                    'path': '$tline'
                 }
             }, {
-                '$project': {
-                    'cellname': '$tline.cellline.cellname',
-                    'panel': '$tline.cellpnl.panelnme',
-                    'tgi': '$tline.tgi.Average',
-                    'gi50': '$tline.gi50.Average',
-                    'lc50': '$tline.lc50.Average'
+                '$replaceRoot': {
+                    'newRoot': '$tline'
                 }
             }
         ])
-        df = pd.DataFrame([d for d in data])
-
-        gi50 = df[['cellname', 'panel', 'gi50']]
-        lc50 = df[['cellname', 'panel', 'lc50']]
-        tgi = df[['cellname', 'panel', 'tgi']]
-
-        # Add the delta [to the mean] columns
-        # TODO: this delta value is incorrect and needs to be recalculated based on internal DTP 'delta' formula
-        gi50_mean = gi50['gi50'].mean()
-        gi50['delta'] = gi50['gi50'].copy().apply(lambda x: x - gi50_mean)
-        lc50_mean = lc50['lc50'].mean()
-        lc50['delta'] = lc50['lc50'].copy().apply(lambda x: x - lc50_mean)
-        tgi_mean = tgi['tgi'].mean()
-        tgi['delta'] = tgi['tgi'].copy().apply(lambda x: x - tgi_mean)
-
-        # set as instance variables
-        self.LC50_DF = lc50
-        self.GI50_DF = gi50
-        self.TGI_DF = tgi
-
-        print(f"Data loaded for GI50,LC50,TGI for nsc {nsc}")
-
-    def get_tgi_graph(self, nsc):
+        df = cursor_to_df(rows, QUERY_SCHEMAS['mean_graphs'], self.CURSOR_BATCH_SIZE)
+        # Rows without an NSC belong to no mean graph, and factorize would give them the group -1
+        df = df[df['nsc'].notna()].reset_index(drop=True) if 'nsc' in df else df.iloc[0:0]
+        if df.empty:
+            return pd.DataFrame(columns=['nsc', 'cellname', 'panel', 'metric', 'value', 'delta', 'out_of_range'])
+        low, high = np.array([tested_range(concs) for concs in df['concs']], dtype=np.float64).reshape(-1, 2).T
+        groups, _ = pd.factorize(df['nsc'])
+
+        frames = []
+        for metric in MeanGraphData._fields:
+            frame = df[['nsc', 'cellname', 'panel']].copy()
+            frame.insert(3, 'metric', metric)
+            frame['value'] = df[metric]
+            _, frame['delta'], frame['out_of_range'] = mean_graph_deltas(frame['value'].values, low, high, groups)
+            frames.append(frame)
+        return pd.concat(frames, ignore_index=True).astype({'metric': 'category'})
+
+    def get_tgi_graph(self, data, nsc):
         """
         Creates the TGI graph for fivedose data.
+        :param data: MeanGraphData: the mean graph bundle from get_mean_graphs_data
         :param nsc: string: NSC used for the experiment
         :return: Figure: the TGI plot for fivedose experiment
         """
-        xr = (self.TGI_DF['delta'].abs().max()) * 1.10
-        bar1 = px.bar(self.TGI_DF,
+        xr = (data.tgi['delta'].abs().max()) * 1.10
+        bar1 = px.bar(data.tgi,
                       x="delta",
                       y="cellname",
                       labels={"delta": f"Total Growth Inhibition Conc (Log{self.subscr10} Mol) Mean Deltas",
@@ -393,7 +2101,7 @@ class DataService():
                       orientation='h',
                       title=f"TGI | NSC {nsc}",
                       height=750,
-                      range_x=[xr, -xr]
+                      range_x=[-xr, xr]
                       )
         bar1.update_traces(width=1)
         bar1.update_layout(title_x=0.45)
@@ -401,14 +2109,15 @@ class DataService():
 
         return bar1
 
-    def get_gi50_graph(self, nsc):
+    def get_gi50_graph(self, data, nsc):
         """
         Creates the GI50 graph for fivedose data.
+        :param data: MeanGraphData: the mean graph bundle from get_mean_graphs_data
         :param nsc: string: NSC used for the experiment
         :return: Figure: the GI50 plot for fivedose experiment
         """
-        xr = (self.GI50_DF['delta'].abs().max()) * 1.10
-        bar1 = px.bar(self.GI50_DF,
+        xr = (data.gi50['delta'].abs().max()) * 1.10
+        bar1 = px.bar(data.gi50,
                       x="delta",
                       y="cellname",
                       labels={"delta": f"Growth Inhibition 50 Conc (Log{self.subscr10} Mol) Mean Deltas",
@@ -417,7 +2126,7 @@ class DataService():
                       orientation='h',
                       title=f"GI50 | NSC {nsc}",
                       height=750,
-                      range_x=[xr, -xr]
+                      range_x=[-xr, xr]
                       )
         bar1.update_traces(width=1)
         bar1.update_layout(title_x=0.45)
@@ -425,14 +2134,15 @@ class DataService():
 
         return bar1
 
-    def get_lc50_graph(self, nsc):
+    def get_lc50_graph(self, data, nsc):
         """
         Creates the LC50 graph for fivedose data.
+        :param data: MeanGraphData: the mean graph bundle from get_mean_graphs_data
         :param nsc: string: NSC used for the experiment
         :return: Figure: the LC50 plot for fivedose experiment
         """
-        xr = (self.LC50_DF['delta'].abs().max()) * 1.10
-        bar1 = px.bar(self.LC50_DF,
+        xr = (data.lc50['delta'].abs().max()) * 1.10
+        bar1 = px.bar(data.lc50,
                       x="delta",
                       y="cellname",
                       labels={"delta": f"Lethal 50 Conc (Log{self.subscr10} Mol) Mean Deltas", "cellname": "Cell Line"},
@@ -440,7 +2150,7 @@ class DataService():
                       orientation='h',
                       title=f"LC50 | NSC {nsc}",
                       height=750,
-                      range_x=[xr, -xr]
+                      range_x=[-xr, xr]
                       )
         bar1.update_traces(width=1)
         bar1.update_layout(title_x=0.45)
@@ -495,97 +2205,140 @@ class DataService():
 
         return [growth_graph, mean_graph]
 
-    def make_survivals(self, kmdf):
+    def get_invivo_experiment(self, expid):
         """
-        Helper function for KM Graph, to get decimal values
-        :param kmdf: Lifelines.KMF: Kaplan-Meier object based on survival data
-        :return: list: list of the survival rates in decimal form ie 0.7, 0.6, 0.5, etc
+        Retrieve an invivo experiment with all its groups and animal histories. The experiment is loaded with a single
+        query and kept in the result cache, so switching between the survival, weight, box and summary tabs of an
+        experiment reuses it.
+        :param expid: string: the experiment ID
+        :return: InvivoExperiment: the groups of every experiment number under the ID
         """
-        survival_list = list()
-        n = kmdf['at_risk'].iloc()[0]
-        for i, x in enumerate(kmdf['at_risk']):
-            s = ((x - kmdf['observed'].iloc()[i]) / n)
-            survival_list.append(s)
-        return survival_list
+        return self.RESULT_CACHE.get(('invivo', expid), lambda: self.load_invivo_experiment(expid))
 
-    def get_km_graph(self, expid, group):
+    def load_invivo_experiment(self, expid):
         """
-        Creates the Kaplan-Meier Survival plot.
-        :param expid: string: experiment ID of the invivo experiment
-        :param nsc: string: NSC data within the experiment
-        :param group: string: group number within the experiment, 0-based index!
-        :return: Figure: plotly figure representing the KM survival line
+        Queries the fields of an invivo experiment used by the invivo views.
+        :param expid: string: the experiment ID
+        :return: InvivoExperiment: the groups of every experiment number under the ID
         """
-        grp = int(group)
-        pipeline = [
+        data = self.INVIVO_COLL.aggregate([
             {
                 '$match': {
                     'expid': expid
                 }
             }, {
                 '$project': {
-                    'tgroup.animal.death_day': 1,
                     '_id': 0,
-                    'tgroup.nsc_therapy.nsc': 1,
                     'expid': 1,
+                    'exp_nbr': 1,
+                    'implant_date': 1,
+                    'staging_date': 1,
                     'cellline.cellname': 1,
-                    'cellline.panelcde': 1,
-                    'tgroup.group_type.group_type': 1
-                }
-            }, {
-                '$unwind': {
-                    'path': '$tgroup',
-                    'preserveNullAndEmptyArrays': False
-                }
-            }, {
-                '$set': {
-                    'animals': '$tgroup.animal.death_day',
-                    'nsc': '$tgroup.nsc_therapy.nsc',
-                    'group_type': '$tgroup.group_type.group_type'
-                }
-            }, {
-                '$unset': 'tgroup'
-            }, {
-                '$set': {
-                    'nsc': {'$first': '$nsc'}
+                    'cellline.panelcde': 1,
+                    'tgroup.nbr_animals': 1,
+                    'tgroup.group_type': 1,
+                    'tgroup.nsc_therapy.nsc': 1,
+                    'tgroup.nsc_therapy.treatment_schedule': 1,
+                    'tgroup.animal.animal_nbr': 1,
+                    'tgroup.animal.death_day': 1,
+                    'tgroup.animal.animal_history.obs_day': 1,
+                    'tgroup.animal.animal_history.net_weight': 1,
+                    'tgroup.animal.tumor_history.obs_day': 1,
+                    'tgroup.animal.tumor_history.tumor_wt': 1
                 }
             }
-        ]
-        data = self.INVIVO_COLL.aggregate(pipeline)
-        df = pd.DataFrame([d for d in data])
-
-        # Prepare columns for KMF
-        delta = [1 for _ in range(len(df['animals'][grp]))] # makes a list of 1s equal to size of group
-        time = df['animals'][grp] # represents the day of death for each animal in the group
-        time.sort() # we sort the days in order to create a KM event table
-
-        #group = [df['nsc'][grp] for x in delta] no idea what this line was for, getting rid of it soon
-
-
-        # Create KM Object
-        kmf = KaplanMeierFitter()
-        kmf.fit(durations=time, event_observed=delta, )
-
-        # Create a DF from the KM Data Object
-        km_df = kmf.event_table.copy()
+        ])
+        return InvivoExperiment(expid, data)
 
-        # Add in slightly transformed survival rates
-        km_df['survival_rate'] = self.make_survivals(km_df)
+    def get_km_data(self, expid):
+        """
+        Retrieve the Kaplan-Meier fits of every group of an invivo experiment. They are fitted together and cached
+        per experiment ID, so switching groups or overlaying several groups does not refit anything.
+        :param expid: string: experiment ID of the invivo experiment
+        :return: KaplanMeier: the curves, controls and log-rank p-values, by position in InvivoExperiment.groups
+        """
+        return self.RESULT_CACHE.get(('km', expid), lambda: self.create_km_data(expid))
 
-        # Confidence Interval values
-        ci_df = kmf.confidence_interval_
-        ci_df.columns = ['lower_ci', 'upper_ci']
-        km_df = km_df.join(ci_df)
+    def create_km_data(self, expid):
+        """
+        Fits the Kaplan-Meier curves of every group of an invivo experiment, testing each group against the control
+        of its experiment number.
+        :param expid: string: experiment ID of the invivo experiment
+        :return: KaplanMeier: the curves, controls and log-rank p-values, by position in InvivoExperiment.groups
+        """
+        experiment = self.get_invivo_experiment(expid)
+        controls = [self.get_linked_control_index(experiment, g.exp_nbr) for g in experiment.groups]
+        return fit_kaplan_meier([g.death_day for g in experiment.groups], controls)
+
+    def get_linked_control_index(self, experiment, exp_nbr):
+        """
+        Finds the control group under the same experiment ID that an experiment number is compared with, from the
+        control index when it has a link there and otherwise from the experiment itself.
+        :param experiment: InvivoExperiment: the experiment
+        :param exp_nbr: int: the experiment number
+        :return: int: the position of the control in experiment.groups, or None when it is not under the same ID
+        """
+        link = self.CONTROL_INDEX.get(experiment.expid, exp_nbr)
+        if link is None:
+            return experiment.get_control_index(exp_nbr)
+        if link['expid'] != experiment.expid:
+            return None
+        return experiment.get_group_index(link['group'], link['exp_nbr'])
+
+    def get_km_linked_control(self, expid, group):
+        """
+        Fits the control group that the control index links to from another experiment ID, for follow-up
+        experiments whose own experiment ID has no control.
+        :param expid: string: experiment ID of the treated group
+        :param group: InvivoGroup: the treated group
+        :return: tuple: the control's curve, a label naming its experiment and the log-rank p-value of the group
+                against it, or None when no control is linked
+        """
+        link = self.CONTROL_INDEX.get(expid, group.exp_nbr)
+        if link is None or link['expid'] == expid:
+            return None
+        control_experiment = self.get_invivo_experiment(link['expid'])
+        index = control_experiment.get_group_index(link['group'], link['exp_nbr'])
+        pair = fit_kaplan_meier([group.death_day, control_experiment.groups[index].death_day], [1, None])
+        return self.get_km_data(link['expid']).curves[index], f"{link['expid']} #{link['exp_nbr']}", pair.p_values[0]
+
+    def get_km_graph(self, expid, group, exp_nbr=None):
+        """
+        Creates the Kaplan-Meier Survival plot.
+        :param expid: string: experiment ID of the invivo experiment
+        :param group: string: group number within the experiment, 0-based index!
+        :param exp_nbr: int: the experiment number the group number refers to, or None to count over all of them
+        :return: Figure: plotly figure representing the KM survival line
+        """
+        grp = int(group)
+        experiment = self.get_invivo_experiment(expid)
+        index = experiment.get_group_index(grp, exp_nbr)
+        group = experiment.groups[index]
+        km_data = self.get_km_data(expid)
+        km_df = km_data.curves[index]
 
         # Create a set of variables for dynamic titles
-        cellline = df['cellline'][grp]['cellname'] # collected from the query
-        panel = df['cellline'][grp]['panelcde']
-        nsc = df['nsc'][grp] # collected from initial query as well, sort of doing an 2 coordinate ID method
-        if df['group_type'][grp] == 'C':
+        if group.group_type == 'C':
             treatment_txt = 'Control Group'
         else:
-            treatment_txt = f'NSC {nsc}'
-        title_txt = f'Survival {expid} - Group {grp + 1}| Panel {panel} - Cell {cellline} | {treatment_txt}'
+            treatment_txt = f'NSC {group.nsc}'
+        title_txt = f'Survival {expid} - Group {grp + 1}| Panel {group.panel} - Cell {group.cell} | {treatment_txt}'
+        control_curve = None
+        p_value = km_data.p_values[index]
+        if group.group_type != 'C':
+            if km_data.controls[index] is not None:
+                control_curve = km_data.curves[km_data.controls[index]]
+                control_name = 'Control'
+            else:
+                # It is the case that some Invivo experiments are spread out and worked on
+                # at different time intervals.  The follow up ones don't always have a 999999 control
+                # in the experiment, so the control index links them to a control of another experiment.
+                linked = self.get_km_linked_control(expid, group)
+                if linked is not None:
+                    control_curve, control_label, p_value = linked
+                    control_name = f'Control ({control_label})'
+        if not np.isnan(p_value):
+            title_txt += f' | Log-rank p={p_value:.3g}'
 
         # Assemble the Plotly Figure
         fig = go.Figure()
@@ -600,145 +2353,39 @@ class DataService():
         fig.update_xaxes(range=[0, (km_df.index.max() * 1.05)], title_text='Timeline (days)')
         fig.update_yaxes(title_text='Survival Rate')
 
-        # It is the case that some Invivo experiments are spread out and worked on
-        # at different time intervals.  The follow up ones don't always have a 999999 control
-        # in the experiment.  I'm not sure if the data model will change or if we need to somehow
-        # combine experiments that refer to an old control or somehow connect experiments to their
-        # control parents.  Seems odd.
-        try:
-            if df['group_type'][grp] != 'C':
-                control_trace = self.get_km_control(df[df['group_type'] == 'C'].head(1).copy()) # in the event of 1+ control
-                fig.add_trace(control_trace)
-        except:
-            print('Control Exception encountered.')
+        if control_curve is not None:
+            fig.add_trace(self.get_km_control(control_curve, control_name))
+        elif group.group_type != 'C':
+            print('No control found in experiment')
 
         return fig
 
-    def get_km_control(self, df):
+    def get_km_control(self, km_df, name='Control'):
         """
         Creates the Plotly trace of the control group survival rates.
-        :param df: DataFrame: dataframe of the experiment
+        :param km_df: DataFrame: the Kaplan-Meier curve of the control group from get_km_data
+        :param name: string: the legend name of the trace
         :return: Graph_Object: plotly scatter graph object of the survival line.
         """
-        key = 0
-        if df.size == 0:
-            raise Exception('No control found in experiment')
-        elif df.size > 1:
-            delta = [1 for _ in range(len(df['animals'][key]))]
-            time = df['animals'][key]
-            time.sort()
-
-            kmf2 = KaplanMeierFitter()
-            kmf2.fit(durations=time, event_observed=delta, )
-
-            # Create a DF from the KM Data Object
-            km2_df = kmf2.event_table.copy()
-
-            # Add in slightly transformed survival rates
-            km2_df['survival_rate'] = self.make_survivals(km2_df)
-
-            control_trace = go.Scatter(x=km2_df.index, y=km2_df['survival_rate'], line_shape='hv', mode='lines+markers',
-                                       line_color='rgb(0,0,0)', name='Control', marker={'symbol': 'cross'})
-            return control_trace
-        else:
-            delta = [1 for _ in range(len(df['animals']))]
-            time = df['animals']
-            time.sort()
-
-            kmf2 = KaplanMeierFitter()
-            kmf2.fit(durations=time, event_observed=delta, )
-
-            # Create a DF from the KM Data Object
-            km2_df = kmf2.event_table.copy()
-
-            # Add in slightly transformed survival rates
-            km2_df['survival_rate'] = self.make_survivals(km2_df)
+        control_trace = go.Scatter(x=km_df.index, y=km_df['survival_rate'], line_shape='hv', mode='lines+markers',
+                                   line_color='rgb(0,0,0)', name=name, marker={'symbol': 'cross'})
+        return control_trace
 
-            control_trace = go.Scatter(x=km2_df.index, y=km2_df['survival_rate'], line_shape='hv', mode='lines',
-                                       line_color='rgb(0,0,0)', name='Control')
-
-            return control_trace
-
-    def get_anml_weight_graphs(self, expid, nsc, group):
+    def get_anml_weight_graphs(self, expid, exp_nbr, group):
         """
         Creates the plots for the animal net weight and tumor weight in invivo experiments per group.
         :param expid: string: the experiment ID
-        :param nsc: string: the NSC within the experiment
+        :param exp_nbr: int: the experiment number the group number refers to
         :param group: int: the group number within the experiment
         :return: dict: key for each plotly figure.
         """
-        grp = int(group)
-        pipeline = [
-            {
-                '$match': {
-                    'expid': expid
-                }
-            }, {
-                '$project': {
-                    'tgroup.animal': 1,
-                    '_id': 0,
-                    'tgroup.nsc_therapy.nsc': 1,
-                    'expid': 1,
-                    'cellline.cellname': 1,
-                    'cellline.panelcde': 1
-                }
-            }, {
-                '$unwind': {
-                    'path': '$tgroup',
-                    'preserveNullAndEmptyArrays': False
-                }
-            }, {
-                '$set': {
-                    'animals': '$tgroup.animal.animal_nbr',
-                    'weight': '$tgroup.animal.animal_history',
-                    'tumor': '$tgroup.animal.tumor_history',
-                    'nsc': '$tgroup.nsc_therapy.nsc'
-                }
-            }, {
-                '$unset': 'tgroup'
-            }, {
-                '$match': {
-                    '$or': [
-                        {
-                            'nsc': {
-                                '$eq': 999999
-                            }
-                        }, {
-                            'nsc': {
-                                '$eq': int(nsc)
-                            }
-                        }
-                    ]
-                }
-            }, {
-                '$set': {
-                    'nsc': {
-                        '$first': '$nsc'
-                    }
-                }
-            }
-        ]
-        data = self.INVIVO_COLL.aggregate(pipeline)
-        data = [d for d in data]
-
-        # animal_nbr will have a list of animal subject numbers
-        # for the first group of testing
-        animal_nbr = data[grp]['animals']
-
-        anml_data_dict_wt = dict()
-        for i, wt in enumerate(data[grp]['weight']):
-            anml_data_dict_wt[animal_nbr[i]] = pd.DataFrame(wt)
-
-        anml_data_dict_tum = dict()
-        for i, wt in enumerate(data[grp]['tumor']):
-            anml_data_dict_tum[animal_nbr[i]] = pd.DataFrame(wt)
-
-        cell_line = data[grp]['cellline']['cellname']
-        panel_code = data[grp]['cellline']['panelcde']
+        group = self.get_invivo_experiment(expid).get_group(group, exp_nbr)
 
         # Create a Figure with animal weights
-        animal_weight_fig = self.get_animal_weight_figure(anml_data_dict_wt, cell_line, panel_code, nsc, expid)
-        tumor_fig = self.get_tumor_weight_figure(anml_data_dict_tum, cell_line, panel_code, nsc, expid)
+        animal_weight_fig = self.get_animal_weight_figure(self.get_day_matrix(group, group.weight), group.cell,
+                                                          group.panel, group.nsc, expid)
+        tumor_fig = self.get_tumor_weight_figure(self.get_day_matrix(group, group.tumor), group.cell, group.panel,
+                                                 group.nsc, expid)
 
         weights_dict = dict()
 
@@ -747,19 +2394,35 @@ class DataService():
 
         return weights_dict
 
-    def get_tumor_weight_figure(self, anml_data_dict, cell_line, panel_code, nsc, expid):
-        fig = go.Figure()
+    def get_day_matrix(self, group, history):
+        """
+        Builds the (observation day x animal) table of a group that the weight, box and summary plots are made from.
+        :param group: InvivoGroup: the group of animals
+        :param history: AnimalHistory: the weight or tumor history of the group
+        :return: DataFrame: indexed by obs_day with a column per animal number; missing observations are NaN
+        """
+        days, matrix = history.matrix(len(group.animals))
+        return pd.DataFrame(matrix, index=pd.Index(days, name='obs_day'), columns=group.animals)
 
-        for animal in anml_data_dict.keys():
-            fig.add_trace(
-                go.Scatter(
-                    x=anml_data_dict[animal]['obs_day'],
-                    y=anml_data_dict[animal]['tumor_wt'],
-                    name=f'Subject {animal}'
-                )
-            )
+    def get_animal_traces(self, day_matrix):
+        """
+        Create a line trace per animal, skipping the days on which the animal has no observation.
+        :param day_matrix: DataFrame: the group table from get_day_matrix
+        :return: list: a plotly scatter trace per animal
+        """
+        traces = []
+        for animal, values in day_matrix.items():
+            observed = values.notna().values
+            traces.append(go.Scatter(x=day_matrix.index[observed], y=values.values[observed], name=f'Subject {animal}'))
+        return traces
 
-        fig.add_trace(self.get_median_trace(anml_data_dict, 'tumor_wt'))
+    def get_tumor_weight_figure(self, day_matrix, cell_line, panel_code, nsc, expid):
+        fig = go.Figure()
+        stats = self.get_group_stats(day_matrix)
+        fig.add_traces(self.get_band_traces(stats))
+        fig.add_traces(self.get_animal_traces(day_matrix))
+        fig.add_trace(self.get_median_trace(stats))
+        fig.add_trace(self.get_mean_trace(stats))
 
         fig.update_layout(title=self.get_invivo_title(cell_line, panel_code, nsc, expid, 'Tumor Weight'))
         fig.update_yaxes(title_text='Animal Tumor Weight(mg)')
@@ -767,10 +2430,10 @@ class DataService():
 
         return fig
 
-    def get_animal_weight_figure(self, anml_data_dict, cell_line, panel_code, nsc, expid):
+    def get_animal_weight_figure(self, day_matrix, cell_line, panel_code, nsc, expid):
         """
         Creates the actual plotly figure that contains the graph.
-        :param anml_data_dict: dict: data structure that contains animal data within the group
+        :param day_matrix: DataFrame: the (observation day x animal) net weights of the group from get_day_matrix
         :param cell_line: string: the cell line being examined.
         :param panel_code: string: the panel to which the cell belongs
         :param nsc: string: the NSC used in this part of the experiment
@@ -779,17 +2442,11 @@ class DataService():
         """
 
         fig = go.Figure()
-
-        for animal in anml_data_dict.keys():
-            fig.add_trace(
-                go.Scatter(
-                    x=anml_data_dict[animal]['obs_day'],
-                    y=anml_data_dict[animal]['net_weight'],
-                    name=f'Subject {animal}'
-                )
-            )
-
-        fig.add_trace(self.get_median_trace(anml_data_dict, 'net_weight'))
+        stats = self.get_group_stats(day_matrix)
+        fig.add_traces(self.get_band_traces(stats))
+        fig.add_traces(self.get_animal_traces(day_matrix))
+        fig.add_trace(self.get_median_trace(stats))
+        fig.add_trace(self.get_mean_trace(stats))
 
         fig.update_layout(title=self.get_invivo_title(cell_line, panel_code, nsc, expid, 'Animal Weight'))
         fig.update_yaxes(title_text='Animal Net Weight(g)')
@@ -815,39 +2472,58 @@ class DataService():
 
         return fig_title
 
-    def get_median_trace(self, anml_data_dict, wt_key):
+    def get_group_stats(self, day_matrix):
+        """
+        Computes the daily statistics of a group of animals across the rows of its day matrix.
+        :param day_matrix: DataFrame: the group table from get_day_matrix
+        :return: DataFrame: indexed by obs_day with columns median, mean and the p10, p25, p75 and p90 percentiles
+        """
+        stats = pd.DataFrame({'median': day_matrix.median(axis=1), 'mean': day_matrix.mean(axis=1)})
+        percentiles = day_matrix.quantile([0.10, 0.25, 0.75, 0.90], axis=1).transpose()
+        percentiles.columns = ['p10', 'p25', 'p75', 'p90']
+        return stats.join(percentiles)
+
+    def get_median_trace(self, stats):
         """
         Create a trace for a plotly figure to represent the median value
-        :param anml_data_dict: dict: dict that contains animal data within the group
-        :param wt_key: string: the key for which data set to examine, net weight or tumor.
+        :param stats: DataFrame: the group statistics from get_group_stats
         :return: Figure: scatter plot representing the median weight
         """
-        median_dict = dict()
-        for x in anml_data_dict.keys():
-            animal = anml_data_dict[x]
-            for day in animal.iterrows():
-                data = day[1][wt_key]
-                key = day[1]['obs_day']
-                if key in median_dict.keys():
-                    tmp_list = median_dict[key]
-                    tmp_list.append(data)
-                    median_dict[key] = tmp_list.copy()
-                else:
-                    median_dict[key] = [data]
-        medians = list()
-        for key in median_dict.keys():
-            med = pd.Series(median_dict[key]).median()
-            medians.append(med)
-
         fig = go.Scatter(
-            x=list(median_dict.keys()),
-            y=medians,
+            x=stats.index,
+            y=stats['median'],
             name='Median',
             line_color='black',
             line_dash='dash'
         )
         return fig
 
+    def get_mean_trace(self, stats):
+        """
+        Create a trace of the daily mean of a group, hidden until selected in the legend.
+        :param stats: DataFrame: the group statistics from get_group_stats
+        :return: Figure: scatter plot representing the mean weight
+        """
+        return go.Scatter(x=stats.index, y=stats['mean'], name='Mean', line_color='gray', line_dash='dot',
+                          visible='legendonly')
+
+    def get_band_traces(self, stats):
+        """
+        Create the shaded 10th-90th percentile and interquartile ribbons of a group. Each ribbon is an invisible upper
+        line followed by a lower line filled up to it.
+        :param stats: DataFrame: the group statistics from get_group_stats
+        :return: list: the plotly scatter traces of the ribbons
+        """
+        traces = []
+        for lower, upper, name, fillcolor in [('p10', 'p90', '10th-90th Percentile', 'rgba(0,0,0,0.08)'),
+                                              ('p25', 'p75', 'Interquartile Range', 'rgba(0,0,0,0.16)')]:
+            traces.append(go.Scatter(x=stats.index, y=stats[upper], mode='lines', line_color='rgba(255,255,255,0)',
+                                     legendgroup=name, showlegend=False, hoverinfo='skip'))
+            traces.append(go.Scatter(x=stats.index, y=stats[lower], mode='lines', line_color='rgba(255,255,255,0)',
+                                     fill='tonexty', fillcolor=fillcolor, legendgroup=name, name=name,
+                                     hoverinfo='skip'))
+        return traces
+
     def get_invivo_experiment_nbrs(self, expid):
         """
         Retrieve the specific experiment number for a given experiment ID. This is needed when an experiment has been
@@ -855,18 +2531,8 @@ class DataService():
         :param expid: string: the experiment ID
         :return: list: a list of experiment numbers; sometimes it will be a list of length 1
         """
-        return [d for d in self.INVIVO_COLL.aggregate([
-            {
-                '$match': {
-                    'expid': expid
-                }
-            }, {
-                '$project': {
-                    'exp_nbr': 1,
-                    '_id': 0
-                }
-            }
-        ])]
+        # Loading the experiment here means the tabs opened next are served from the result cache
+        return [{'exp_nbr': n} for n in self.get_invivo_experiment(expid).exp_nbrs]
 
     def get_invivo_group_numbers(self, exp, expid):
         """
@@ -875,134 +2541,27 @@ class DataService():
         :param expid: string: experiment ID of the invivo experiment
         :return: list(range): list of the animal group numbers of the experiment
         """
-        pipeline = [
-            {
-                '$match': {
-                    'expid': expid,
-                    'exp_nbr': int(exp)
-                }
-            }, {
-                '$project': {
-                    'tgroup.animal': 1,
-                    '_id': 0,
-                }
-            },{
-                '$unwind': {
-                    'path': '$tgroup'
-                }
-            }, {
-                '$count': 'count'
-            }
-        ]
-
-        data = self.INVIVO_COLL.aggregate(pipeline)
-        res = [d for d in data]
+        return range(0, len(self.get_invivo_experiment(expid).get_groups(exp)))
 
-        return range(0, res[0]['count'])
-
-    def get_invivo_box_plots(self, expid, nsc, group):
+    def get_invivo_box_plots(self, expid, exp_nbr, group):
         """
         Entry point to create the box plots for the invivo experiment for net weight and tumor weight.
         :param expid: string: the invivo experiment ID
-        :param nsc: nsc: the NSC being examined within the experiment
+        :param exp_nbr: int: the experiment number the group number refers to
         :param group: string: the specific group number within the experiment
         :return: dict: a dictionary with keys: weight and tumor that each have a plotly box plot Figure as the value
         """
-        pipeline = [
-            {
-                '$match': {
-                    'expid': expid
-                }
-            }, {
-                '$project': {
-                    'tgroup.animal': 1,
-                    '_id': 0,
-                    'tgroup.nsc_therapy.nsc': 1,
-                    'expid': 1,
-                    'cellline.cellname': 1,
-                    'cellline.panelcde': 1
-                }
-            }, {
-                '$unwind': {
-                    'path': '$tgroup',
-                    'preserveNullAndEmptyArrays': False
-                }
-            }, {
-                '$set': {
-                    'animals': '$tgroup.animal.animal_nbr',
-                    'weight': '$tgroup.animal.animal_history',
-                    'tumor': '$tgroup.animal.tumor_history',
-                    'nsc': '$tgroup.nsc_therapy.nsc'
-                }
-            }, {
-                '$unset': 'tgroup'
-            }, {
-                '$match': {
-                    '$or': [
-                        {
-                            'nsc': {
-                                '$eq': 999999
-                            }
-                        }, {
-                            'nsc': {
-                                '$eq': int(nsc)
-                            }
-                        }
-                    ]
-                }
-            }, {
-                '$set': {
-                    'nsc': {
-                        '$first': '$nsc'
-                    }
-                }
-            }
-        ]
+        group_num = int(group)
+        print(f"expid: {expid} | exp_nbr:{exp_nbr} | group_num:{group_num}")
+        group = self.get_invivo_experiment(expid).get_group(group_num, exp_nbr)
 
-        data = self.INVIVO_COLL.aggregate(pipeline)
-        data = [d for d in data]
+        cell_nsc_text = f"NSC {group.nsc} | {group.panel} - {group.cell}"
 
-        group_num = int(group)
-        print(f"expid: {expid} | nsc:{nsc} | group_num:{group_num}")
-
-        weights = data[group_num]['weight']
-        cellline = data[group_num]['cellline']
-        nsc = data[group_num]['nsc']
-        tumor_weights = data[group_num]['tumor']
-
-        cell_nsc_text = f"NSC {nsc} | {cellline['panelcde']} - {cellline['cellname']}"
-
-        df = None
-        for i, w in enumerate(tumor_weights):
-            name = f"animal {i}"
-            if i == 0:
-                df = pd.DataFrame(w)
-                df = df[['tumor_wt', 'obs_day']]
-                df.set_index('obs_day', inplace=True)
-                df.columns = [name]
-            else:
-                temp_df = pd.DataFrame(w)
-                temp_df = temp_df[['tumor_wt', 'obs_day']]
-                temp_df.set_index('obs_day', inplace=True)
-                temp_df.columns = [name]
-                df = pd.concat([df, temp_df], axis=1)
+        df = self.get_day_matrix(group, group.tumor)
         tumor_box = px.box(df.transpose(), labels={'value': 'Weight (mg)', 'obs_day': 'Time (days)'},
                            title=f'Animal Tumor Weight Box Plots {cell_nsc_text}')
 
-        df = None
-        for i, w in enumerate(weights):
-            name = f"animal {i}"
-            if i == 0:
-                df = pd.DataFrame(w)
-                df = df[['obs_day','net_weight']]
-                df.set_index('obs_day', inplace=True)
-                df.columns = [name]
-            else:
-                temp_df = pd.DataFrame(w)
-                temp_df = temp_df[['obs_day','net_weight']]
-                temp_df.set_index('obs_day', inplace=True)
-                temp_df.columns = [name]
-                df = pd.concat([df, temp_df], axis=1)
+        df = self.get_day_matrix(group, group.weight)
         box = px.box(df.transpose(), labels={'value': 'Net Weight (g)', 'obs_day': 'Time (days)'},
                      title=f'Animal Weight Box Plots {cell_nsc_text}')
 
@@ -1024,217 +2583,117 @@ class DataService():
                         ])
         return comp.next()
 
+    def get_invivo_summary(self, expid):
+        """
+        Retrieve the summary of an invivo experiment from the summary store, or compute it from Mongo when the expid
+        has not been materialized.
+        :param expid: string: the experiment ID of the invivo experiment
+        :return: dict: the summary from create_invivo_summary
+        """
+        if self.SUMMARY_STORE is not None:
+            summary = self.SUMMARY_STORE.read(expid)
+            if summary is not None:
+                return summary
+        return self.create_invivo_summary(expid)
+
+    def create_invivo_summary(self, expid):
+        """
+        Computes the data shown on the invivo summary page: the daily box statistics, net weight mean and tumor weight
+        median of each group, and the group description table.
+        :param expid: string: the experiment ID of the invivo experiment
+        :return: dict: with keys 'expid', 'implant_dt', 'staging_dt', 'descriptions', 'groups' (the plotted group
+            numbers) and 'curves', a DataFrame with a row per group, measure ('net_wt' or 'tum_wt') and obs_day
+        """
+        experiment = self.get_invivo_experiment(expid)
+
+        curves = []
+        groups = []
+        # Groups without animals are not plotted, so the plotted group numbers skip them
+        for group in [g for g in experiment.groups if len(g.animals) > 0]:
+            groups.append(len(groups) + 1)
+            for measure, history in (('net_wt', group.weight), ('tum_wt', group.tumor)):
+                day_matrix = self.get_day_matrix(group, history)
+                # The mean and median are taken over the observed values; the boxes carry the last observation of an
+                # animal forward to later days.
+                stats = self.get_box_stats(day_matrix.ffill())
+                stats['mean'] = day_matrix.mean(axis=1).ffill()
+                stats['median'] = day_matrix.median(axis=1).ffill()
+                stats.insert(0, 'measure', measure)
+                stats.insert(0, 'group', groups[-1])
+                curves.append(stats.reset_index())
+
+        columns = ['group', 'measure', 'obs_day', 'q1', 'box_median', 'q3', 'lowerfence', 'upperfence', 'mean', 'median']
+        curves = pd.concat(curves, ignore_index=True) if curves else pd.DataFrame(columns=columns)
+        curves = curves.astype({'group': 'int16', 'measure': 'category', 'obs_day': 'int32', 'q1': 'float32',
+                                'box_median': 'float32', 'q3': 'float32', 'lowerfence': 'float32',
+                                'upperfence': 'float32', 'mean': 'float32', 'median': 'float32'})
+
+        # fill out data table for descriptions, dictionary
+        descriptions = []
+        for i, group in enumerate(experiment.groups, start=1):
+            panel = '(Panel N/A)' if group.panel is None else group.panel
+            nsc = '(No NSC)' if group.nsc is None else group.nsc
+            descriptions.append({'group': f'Group {i}', 'description': f'Type: {group.description}; NSC: {nsc}; Schedule: {group.schedule}; Cell {group.cell}; Panel: {panel}; Size: {group.size}'})
+        return {'expid': experiment.expid, 'implant_dt': experiment.implant_date,
+                'staging_dt': experiment.staging_date, 'descriptions': descriptions, 'groups': groups,
+                'curves': curves[columns]}
+
+    def get_box_stats(self, day_matrix):
+        """
+        Computes the daily box plot statistics of a group the way plotly draws its boxes: quartiles, and whiskers at
+        the furthest values within 1.5 times the interquartile range.
+        :param day_matrix: DataFrame: the group table from get_day_matrix
+        :return: DataFrame: indexed by obs_day with columns q1, box_median, q3, lowerfence and upperfence
+        """
+        values = day_matrix.values
+        q1, median, q3 = np.nanpercentile(values, [25, 50, 75], axis=1)
+        iqr = q3 - q1
+        inside = (values >= (q1 - 1.5 * iqr)[:, None]) & (values <= (q3 + 1.5 * iqr)[:, None])
+        lowerfence = np.nanmin(np.where(inside, values, np.nan), axis=1)
+        upperfence = np.nanmax(np.where(inside, values, np.nan), axis=1)
+        return pd.DataFrame({'q1': q1, 'box_median': median, 'q3': q3, 'lowerfence': lowerfence,
+                             'upperfence': upperfence}, index=day_matrix.index)
+
+    @cached_figure('invivo_summary_plots')
     def get_invivo_summary_plots(self,expid):
         """
         Generate the plots and table data for an invivo experiment summary, similar to supplier
-        reports format.
+        reports format. The data comes from the summary store when the expid has been materialized.
         :param expid: string: the experiment ID of the invivo experiment
-        :return: dict: contains a dictionary with keys: 'expid', 'net_wt_fig', 'tum_wt_fig', 'tum_wt', 'implant_dt',
+        :return: dict: contains a dictionary with keys: 'expid', 'net_wt_fig', 'tum_wt_fig', 'implant_dt',
             'staging_dt', and 'descriptions'; these are all used within the presentation of the data.
         """
-        data = self.INVIVO_COLL.aggregate([
-                {
-                    '$match': {
-                        'expid': expid
-                    }
-                }, {
-                    '$project': {
-                        'expid': 1,
-                        'tgroup': 1,
-                        'cell': '$cellline.cellname',
-                        'panel': '$cellline.panelcde',
-                        'implant_date': 1,
-                        'staging_date': 1,
-                        '_id': 0
-                    }
-                }, {
-                    '$unwind': {
-                        'path': '$tgroup'
-                    }
-                }, {
-                    '$project': {
-                        'expid': 1,
-                        'cell': 1,
-                        'panel': 1,
-                        'implant_date': 1,
-                        'staging_date': 1,
-                        'schedule': {
-                            '$arrayElemAt': [
-                                '$tgroup.nsc_therapy.treatment_schedule', 0
-                            ]
-                        },
-                        'group_type': '$tgroup.group_type.description',
-                        'group_size': '$tgroup.nbr_animals',
-                        'animals_nt_wt': '$tgroup.animal.animal_history.net_weight',
-                        'animals_md_tm_wt': '$tgroup.animal.tumor_history.tumor_wt',
-                        'animals_obs_days': '$tgroup.animal.animal_history.obs_day',
-                        'nsc': {
-                            '$arrayElemAt': [
-                                '$tgroup.nsc_therapy.nsc', 0
-                            ]
-                        }
-                    }
-                }, {
-                    '$set': {
-                        'animal_data': {
-                            '$zip': {
-                                'inputs': [
-                                    '$animals_nt_wt', '$animals_md_tm_wt', '$animals_obs_days'
-                                ]
-                            }
-                        }
-                    }
-                }, {
-                    '$project': {
-                        'expid': 1,
-                        'cell': 1,
-                        'panel': 1,
-                        'nsc': 1,
-                        'group_type': 1,
-                        'group_size': 1,
-                        'implant_date': 1,
-                        'staging_date': 1,
-                        'animal_data': 1,
-                        'schedule': 1
-                    }
-                }
-            ])
-        data = [d for d in data]
-
-        implant_dt = data[0]['implant_date']
-        staging_dt = data[0]['staging_date']
-        # Next, we shall consolidate our data into plotly friendly structures
-        data_dict = {}
-        group_num = 1
-        # for each Group { dict with a key of animal_data }
-        for group in data:
-            net_wts = []
-            tum_wts = []
-            obsv_time = None
-
-            data_dict_key = f'Group{group_num}'
-
-            # Separate all the data into net_wts, tumor_wts
-            for animal in group['animal_data']:
-                net_wts.append(animal[0])
-                tum_wts.append(animal[1])
-                if obsv_time is None:
-                    obsv_time = animal[2]
-                elif obsv_time is not None:
-                    if len(obsv_time) < len(animal[2]):
-                        obsv_time = animal[2]
-                else:
-                    print('Error Setting Observation Time')
-            if len(net_wts) == 0:
-                continue
-            # Some of the data is missing observation timestamps.
-            #if obsv_time.size == 0:
-            #    obsv_time = range(0,len(net_wts[0])-1)
-
-            # Make a dictionary that contains group data organized into DFs
-
-            # Make a dataframe that has a mean col
-            netwt_df = pd.DataFrame(net_wts).transpose()
-            netwt_df['mean'] = netwt_df.mean(axis=1)
-            net_wt_obsv_time = obsv_time[:len(netwt_df['mean'])]
-            netwt_df['obsv_time'] = net_wt_obsv_time
-            netwt_df.fillna(method='ffill', inplace=True)
-            netwt_df.set_index('obsv_time', inplace=True,)
-
-            tumwt_df = pd.DataFrame(tum_wts).transpose()
-            tumwt_df['median'] = tumwt_df.median(axis=1)
-            tum_wt_obsv_time = obsv_time[:len(tumwt_df['median'])]
-            tumwt_df['obsv_time'] = tum_wt_obsv_time
-            tumwt_df.fillna(method='ffill', inplace=True)
-            tumwt_df.set_index('obsv_time', inplace=True)
-
-            # Make two members of data dict at net_wt,tum_wt
-            grp_data = {'net_wt': netwt_df, 'tum_wt': tumwt_df}
-
-            # Obviously we add it like this.
-            data_dict[data_dict_key] = grp_data
-
-            # increase the count because this is straightforward.
-            group_num += 1
+        summary = self.get_invivo_summary(expid)
+        curves = summary['curves']
 
         # Now it's time to make Two Plotly Figures
         # create the two Figure objects on which we will apply plots
         net_wt = go.Figure()
         tum_wt = go.Figure()
 
-        # To keep track of the group number as we process data, also used to group data.
-        grp_num = 1
-
         # Ensure unique colors for each trace
-        color_list = random.sample(range(len(self.COLORS)),k=len(data_dict.keys()))
-        # Set up an index value to be incremented over the following loop
-        color_count = 0
-
-        symbol_list = random.sample(range(len(self.SYMBOLS)),k=len(data_dict.keys()))
-        symbol_count = 0
-
-        for key in data_dict.keys():
-            # Get each dataframe of net weith and tumor from the data dict
-            nt_box_data = data_dict[key]['net_wt']
-            tum_box_data = data_dict[key]['tum_wt']
-
-            nt_mean = data_dict[key]['net_wt']['mean']
-            tum_med = data_dict[key]['tum_wt']['median']
-
-            # Since they share the same index, we will extract that
-            index = None
-            if nt_box_data.index.equals(tum_box_data.index):
-                index = nt_box_data.index
-            else:
-                print('Indexes are not the same! This is bad.')
-                break
-
-            # Ignore the last column, which is mean or median
-            nt_box_data = nt_box_data[nt_box_data.columns[:-1]]
-            tum_box_data = tum_box_data[tum_box_data.columns[:-1]]
-
-            x_vals = []
-            grp_size = len(nt_box_data.columns)
-            for i in index:
-                for j in range(0, grp_size):
-                    x_vals.append(i)
-
-            nt_box_y = []
-            tum_box_y = []
-
-            for i in index:
-                # iterate over the rows to create a box plot and add to each figure
-                for y in nt_box_data.loc[i]:
-                    # For multi-grouped box plots, we have to make a giant list
-                    # of each y value.
-                    nt_box_y.append(y)
-
-                for y in tum_box_data.loc[i]:
-                    tum_box_y.append(y)
-
-            # Increment the group number
+        color_list = random.sample(range(len(self.COLORS)),k=len(summary['groups']))
+        symbol_list = random.sample(range(len(self.SYMBOLS)),k=len(summary['groups']))
 
+        for i, grp_num in enumerate(summary['groups']):
+            group_curves = curves[curves['group'] == grp_num]
+            nt = group_curves[group_curves['measure'] == 'net_wt']
+            tum = group_curves[group_curves['measure'] == 'tum_wt']
             try:
-                color_num = color_list[color_count]
-                symbol_num = symbol_list[symbol_count]
-                net_wt.add_trace(
-                    go.Box(y=nt_box_y, x=x_vals, name=f'Group {grp_num}', marker=dict(color=self.COLORS[color_num])))
-                tum_wt.add_trace(
-                    go.Box(y=tum_box_y, x=x_vals, name=f'Group {grp_num}', marker=dict(color=self.COLORS[color_num])))
+                color = self.COLORS[color_list[i]]
+                symbol = self.SYMBOLS[symbol_list[i]]
+                # The boxes are drawn from the precomputed statistics; boxmode group handles the repeated days
+                net_wt.add_trace(self.get_summary_box(nt, f'Group {grp_num}', color))
+                tum_wt.add_trace(self.get_summary_box(tum, f'Group {grp_num}', color))
 
                 net_wt.add_trace(
-                    go.Scatter(x=nt_mean.index, y=nt_mean, mode='lines+markers', name=f'Group {grp_num} - Mean',
-                               line=dict(width=0.5, color=self.COLORS[color_num]),
-                               marker=dict(symbol=self.SYMBOLS[symbol_num], color=self.COLORS[color_num])))
+                    go.Scatter(x=nt['obs_day'], y=nt['mean'], mode='lines+markers', name=f'Group {grp_num} - Mean',
+                               line=dict(width=0.5, color=color), marker=dict(symbol=symbol, color=color)))
                 tum_wt.add_trace(
-                    go.Scatter(x=tum_med.index, y=tum_med, mode='lines+markers', name=f'Group {grp_num} - Median',
-                               line=dict(width=0.5, color=self.COLORS[color_num]),
-                               marker=dict(symbol=self.SYMBOLS[symbol_num], color=self.COLORS[color_num])))
+                    go.Scatter(x=tum['obs_day'], y=tum['median'], mode='lines+markers', name=f'Group {grp_num} - Median',
+                               line=dict(width=0.5, color=color), marker=dict(symbol=symbol, color=color)))
             except IndexError as e:
                 print(e.args)
-            grp_num += 1
-            color_count += 1
-            symbol_count += 1
 
         # After all the boxes are added, we set each figure to be Group mode to handle
         # the repeated X values
@@ -1248,96 +2707,70 @@ class DataService():
             yaxis_title='Tumor Weight (mg)', xaxis_title='Date Post-Implant',
             boxmode='group',# group boxes together for diff traces of x value
         )
+        return {'expid': summary['expid'], 'net_wt_fig': net_wt, 'tum_wt_fig': tum_wt,
+                'implant_dt': summary['implant_dt'], 'staging_dt': summary['staging_dt'],
+                'descriptions': summary['descriptions']}
 
-        # fill out data table for descriptions, dictionary
-        descriptions = []
-        for i in range(1,(len(data)+1)):
-            if 'panel' not in data[i-1].keys():
-                data[i-1]['panel'] = '(Panel N/A)'
-            if 'nsc' not in data[i-1].keys():
-                data[i-1]['nsc'] = '(No NSC)'
-            descriptions.append({'group': f'Group {i}', 'description': f'Type: {data[i-1]["group_type"]}; NSC: {data[i-1]["nsc"]}; Schedule: {data[i-1]["schedule"]}; Cell {data[i-1]["cell"]}; Panel: {data[i-1]["panel"]}; Size: {data[i-1]["group_size"]}'})
-        return {'expid':data[0]['expid'],'net_wt_fig': net_wt, 'tum_wt_fig': tum_wt, 'implant_dt': implant_dt,'staging_dt': staging_dt, 'descriptions': descriptions}
+    def get_summary_box(self, curves, name, color):
+        """
+        Creates a box trace from precomputed daily box statistics.
+        :param curves: DataFrame: the rows of one group and measure from create_invivo_summary
+        :param name: string: the legend name of the trace
+        :param color: string: the color of the boxes
+        :return: Graph_Object: plotly box graph object with a box per observation day
+        """
+        return go.Box(x=curves['obs_day'], q1=curves['q1'], median=curves['box_median'], q3=curves['q3'],
+                      lowerfence=curves['lowerfence'], upperfence=curves['upperfence'], name=name,
+                      marker=dict(color=color))
 
+    @rendered_figure('cell_graphs')
     def get_cell_graphs(self, cell):
         """
         Experimental function to see if we could aggregate data of cell lines across all experiments.
         :param cell: string: the cell line to examine
-        :return: list: list of figures for each of five dose experiment data per experiment.
-        """
-        data = [ d for d in
-                    self.CELLS_COLL.aggregate(
-                    [
-                        {
-                            '$match': {
-                                '_id': cell
-                            }
-                        }
-                    ])
-                ]
-        # Keys are _id, tgi, lhiconc, nsc
-        total = len(data[0]['results'])
-
-        expid = []
-        one = []
-        two = []
-        three = []
-        four = []
-        five = []
-        nsc = []
-        total = len(data[0]['results'])
-
-        for i,d in enumerate(data[0]['results']):
-            try:
-                expid.append(d['expid'])
-            except:
-                print(f'Failed on cell graphs for {d}')
-                expid.append('Failed')
-
-            try:
-                nsc.append(str(d['nsc']))
-            except:
-                print(f'Failed on cell graphs for {d}')
-                nsc.append(str(0))
-
-            try:
-                one.append(d['growth_pct'][0])
-            except IndexError or KeyError:
-                one.append(np.NaN)
-
-            try:
-                two.append(d['growth_pct'][1])
-            except IndexError or KeyError:
-                two.append(np.NaN)
-
-            try:
-                three.append(d['growth_pct'][2])
-            except IndexError or KeyError:
-                three.append(np.NaN)
-
-            try:
-                four.append(d['growth_pct'][3])
-            except IndexError or KeyError:
-                four.append(np.NaN)
-
-            try:
-                five.append(d['growth_pct'][4])
-            except IndexError or KeyError:
-                five.append(np.NaN)
-
-
-
-
-        df = pd.DataFrame({'expid': expid, 'nsc':nsc, 'one':one, 'two': two, 'three': three, 'four': four, 'five': five})
-
-        fig1 = px.scatter(data_frame=df[['nsc','one','expid']].sort_values(by='one',ascending=True), x='nsc', y='one', title=f'First Doses', range_y=[(df['one'].max()*1.1), -110.0])
-        fig2 = px.scatter(data_frame=df[['nsc','two','expid']].sort_values(by='two',ascending=True), x='nsc', y='two', title=f'Second Doses', range_y=[(df['two'].max()*1.1), -110.0])
-        fig3 = px.scatter(data_frame=df[['nsc','three','expid']].sort_values(by='three',ascending=True), x='nsc', y='three', title=f'Thrid Doses', range_y=[(df['three'].max()*1.1), -110.0])
-        fig4 = px.scatter(data_frame=df[['nsc','four','expid']].sort_values(by='four',ascending=True), x='nsc', y='four', title=f'Fourth Doses', range_y=[(df['four'].max()*1.1), -110.0])
-        fig5 = px.scatter(data_frame=df[['nsc','five','expid']].sort_values(by='five',ascending=True), x='nsc', y='five', title=f'Fifth Doses', range_y=[(df['five'].max()*1.1), -110.0])
-
-        figures = [fig1,fig2,fig3,fig4,fig5]
-        return figures
+        :return: Figure: a figure with a subplot of the growth percentages of every result per dose
+        """
+        # Each result has expid, nsc and growth_pct; the results are unwound and the five doses picked out in Mongo so
+        # they stream into typed columns instead of arriving as one document holding every result of the cell line.
+        doses = {'one': 0, 'two': 1, 'three': 2, 'four': 3, 'five': 4}
+        df = cursor_to_df(self.CELLS_COLL.aggregate(
+            [
+                {
+                    '$match': {
+                        '_id': cell
+                    }
+                }, {
+                    '$unwind': {
+                        'path': '$results'
+                    }
+                }, {
+                    '$project': {
+                        '_id': 0,
+                        'expid': {'$ifNull': ['$results.expid', 'Failed']},
+                        'nsc': {'$ifNull': ['$results.nsc', 0]},
+                        **{name: {'$arrayElemAt': ['$results.growth_pct', i]} for name, i in doses.items()}
+                    }
+                }
+            ]), QUERY_SCHEMAS['cell_results'], self.CURSOR_BATCH_SIZE)
+        # (results x doses) growth percentages; results with fewer than five doses are padded with NaN
+        growth = df.reindex(columns=list(doses)).to_numpy(dtype=np.float64, na_value=np.nan)
+        # The NSCs stay numbers on a category axis; object arrays of strings are deep copied element by element when
+        # the traces are added, which dominated the build time of the largest cell lines
+        nscs = df['nsc'].to_numpy()
+
+        titles = ['First Doses', 'Second Doses', 'Third Doses', 'Fourth Doses', 'Fifth Doses']
+        fig = make_subplots(rows=len(doses), cols=1, subplot_titles=titles, vertical_spacing=0.04)
+        for i in range(len(doses)):
+            # Each subplot lists the NSCs in ascending order of their growth at that dose; NaN sorts last
+            order = np.argsort(growth[:, i], kind='stable')
+            fig.add_trace(go.Scattergl(x=nscs[order], y=growth[order, i], mode='markers', name=titles[i],
+                                       showlegend=False, hovertemplate='NSC %{x}<br>Growth %{y}<extra></extra>'),
+                          row=i + 1, col=1)
+            top = np.nanmax(growth[:, i]) * 1.1 if np.isfinite(growth[:, i]).any() else 110.0
+            fig.update_yaxes(range=[top, -110.0], title_text='Growth %', row=i + 1, col=1)
+            fig.update_xaxes(type='category', title_text='NSC', row=i + 1, col=1)
+        fig.update_layout(height=450 * len(doses))
+        return fig
 
     def get_all_expids_by_nsc(self, insc):
         """
@@ -1422,14 +2855,28 @@ class DataService():
 
         return pd.DataFrame(data_dict)
 
-    def get_fivedose_heatmap(self, expid, type):
+    def get_fivedose_matrix(self, expid):
         """
-        Create a heatmap of a five dose experiment given an experiment ID for GI50, TGI, and LC50
+        Retrieve the heatmap matrix of a five dose experiment from the matrix store, or build it from Mongo and keep it
+        in the result cache when the expid has not been materialized. Either way, switching metrics reuses it.
         :param expid: string: the experiment ID of a five dose experiment
-        :param type: string: which metric to use for dataset; the GI50, LC50, or TGI
-        :return: Figure: plotly Heatmap for the experiment based on metric of GI50, LC50, or TGI across all NSCs
+        :return: MetricMatrix: the GI50, TGI and LC50 averages by cell line and NSC
+        """
+        if self.MATRIX_STORE is not None:
+            matrix = self.MATRIX_STORE.read(expid)
+            if matrix is not None:
+                return matrix
+        return self.RESULT_CACHE.get(('fivedose_matrix', expid), lambda: self.create_fivedose_matrix(expid))
+
+    def create_fivedose_matrix(self, expid):
+        """
+        Builds the (metric x cell line x NSC) matrix of a five dose experiment in one query for all three metrics.
+        Cell lines and NSCs are sorted as strings and repeated results are averaged, like the pivot table the heatmap
+        was made from; missing results are NaN.
+        :param expid: string: the experiment ID of a five dose experiment
+        :return: MetricMatrix: the GI50, TGI and LC50 averages by cell line and NSC
         """
-        df = pd.DataFrame(self.FIVEDOSE_COLL.aggregate([
+        data = next(self.FIVEDOSE_COLL.aggregate([
             {
                 '$match': {
                     'expid': expid
@@ -1438,17 +2885,44 @@ class DataService():
                 '$project': {
                     'nsc': '$tline.nsc',
                     'cell_line': '$tline.cellline.cellname',
-                    'panel': '$tline.cellline.panelcde',
-                    type: f'$tline.{type}.Average',
+                    **{metric: f'$tline.{metric}.Average' for metric in FIVEDOSE_METRICS},
                     '_id': 0
                 }
             }
-        ]).next() )
-
-        # , dtype={'nsc': 'string', 'cell_line':'string', 'panel': 'string', 'gi50': 'float64'}
-        df['nsc'] = df['nsc'].apply(lambda x: str(x))
-
-        table = pd.pivot_table(df, values=type, index=['cell_line'], columns=['nsc']).fillna(0)
+        ]), {})
+
+        nscs = np.array([str(nsc) for nsc in data.get('nsc', [])], dtype=object)
+        cell_lines = np.array(data.get('cell_line', []), dtype=object)
+        metrics = np.array([[np.nan if v is None else v for v in data.get(metric, [None] * len(nscs))]
+                            for metric in FIVEDOSE_METRICS], dtype=np.float64).reshape(len(FIVEDOSE_METRICS), -1)
+        # Results without a cell line or a value of a metric are left out of that metric, like pivot_table drops them
+        valid = pd.notna(cell_lines)
+        cell_labels, rows = np.unique(cell_lines[valid].astype(str), return_inverse=True)
+        nsc_labels, cols = np.unique(nscs[valid].astype(str), return_inverse=True)
+        values = np.full((len(FIVEDOSE_METRICS), len(cell_labels), len(nsc_labels)), np.nan, dtype=np.float32)
+        for i, metric_values in enumerate(metrics[:, valid]):
+            observed = ~np.isnan(metric_values)
+            sums = np.zeros(values.shape[1:])
+            counts = np.zeros(values.shape[1:])
+            np.add.at(sums, (rows[observed], cols[observed]), metric_values[observed])
+            np.add.at(counts, (rows[observed], cols[observed]), 1)
+            np.divide(sums, counts, out=values[i], where=counts > 0, casting='unsafe')
+        return MetricMatrix(values, list(FIVEDOSE_METRICS), cell_labels.tolist(), nsc_labels.tolist())
+
+    @cached_figure('fivedose_heatmap')
+    @rendered_figure('fivedose_heatmap')
+    def get_fivedose_heatmap(self, expid, type):
+        """
+        Create a heatmap of a five dose experiment given an experiment ID for GI50, TGI, and LC50
+        :param expid: string: the experiment ID of a five dose experiment
+        :param type: string: which metric to use for dataset; the GI50, LC50, or TGI
+        :return: Figure: plotly Heatmap for the experiment based on metric of GI50, LC50, or TGI across all NSCs
+        """
+        matrix = self.get_fivedose_matrix(expid)
+        table = pd.DataFrame(matrix.values[matrix.metrics.index(type)], index=matrix.cell_lines, columns=matrix.nscs,
+                             copy=False)
+        # Like the pivot table, cell lines and NSCs without any result of the metric are left out
+        table = table.dropna(how='all').dropna(axis=1, how='all').fillna(0)
         # Thought --> Create traces PER panel group and combine on figure object.
         fig = go.Figure(data=go.Heatmap(x=table.columns,
                                         y=table.index,
@@ -1475,7 +2949,7 @@ class DataService():
         :param gene:
         :return:
         """
-        df = pd.DataFrame([d for d in self.ONCOKB_COLL.aggregate([
+        df = cursor_to_df(self.ONCOKB_COLL.aggregate([
                     {
                         '$match': {
                             'gene': gene
@@ -1486,8 +2960,7 @@ class DataService():
                         }
                     }
                 ]
-            )
-        ])
+            ), QUERY_SCHEMAS['oncoprint'], self.CURSOR_BATCH_SIZE)
         #df['type'] = df['type'].map(lambda x: self.ONCOKB_ALT_TYPE_MAP[x])
 
         return df
@@ -1498,7 +2971,7 @@ class DataService():
         :param cell: string: the cell line name
         :return: DataFrame: a dataframe of the oncokb data
         """
-        df = pd.DataFrame([d for d in self.ONCOKB_COLL.aggregate([
+        df = cursor_to_df(self.ONCOKB_COLL.aggregate([
                     {
                         '$match': {
                             'sample': cell
@@ -1509,8 +2982,7 @@ class DataService():
                         }
                     }
                 ]
-            )
-        ])
+            ), QUERY_SCHEMAS['oncoprint'], self.CURSOR_BATCH_SIZE)
 
         #df['type'] = df['type'].map(lambda x: self.ONCOKB_ALT_TYPE_MAP[x])
 
@@ -1521,7 +2993,7 @@ class DataService():
         Retrieve all data for a full OncoKB print excluding not found variation types
         :return: DataFrame: a dataframe of the oncokb data in oncoprint format (sample, gene, alteration, type)
         """
-        df = pd.DataFrame([d for d in self.ONCOKB_COLL.aggregate([
+        df = cursor_to_df(self.ONCOKB_COLL.aggregate([
                     {
                         '$match': {
                             'type': {
@@ -1536,8 +3008,7 @@ class DataService():
                         '$limit': 600
                     }
                 ]
-            )
-        ])
+            ), QUERY_SCHEMAS['oncoprint'], self.CURSOR_BATCH_SIZE)
 
         #df['type'] = df['type'].map(self.ONCOKB_ALT_TYPE_MAP)
 
@@ -1548,15 +3019,14 @@ class DataService():
         Retrieve all data for a full OncoKB print including not found variation types
         :return: DataFrame: a dataframe of the oncokb data in oncoPrint format (sample, gene, alteration, type)
         """
-        df = pd.DataFrame([d for d in self.ONCOKB_COLL.aggregate([
+        df = cursor_to_df(self.ONCOKB_COLL.aggregate([
                     {
                         '$project': {
                             '_id': 0
                         }
                     }
                 ]
-            )
-        ])
+            ), QUERY_SCHEMAS['oncoprint'], self.CURSOR_BATCH_SIZE)
 
         #df['type'] = df['type'].map(lambda x: self.ONCOKB_ALT_TYPE_MAP[x])
         return df
@@ -1627,6 +3097,8 @@ class DataService():
             ]
         )]
 
+    @cached_figure('onco_mrna_plot')
+    @rendered_figure('onco_mrna_plot')
     def get_onco_mrna_plot(self, genes):
         """
         Create a heatmap derived from the mrna_zscores.txt file in assets.
@@ -76,16 +76,20 @@ def get_left_select(expid, nsc):
 @dash.callback(
     Output("s-expid-dropdown", "options"),
     Input("invivo-nav", "id"),
-    State("app-store", "data"),
-    prevent_initial_call=True
+    Input("app-store", "data"),
+    State('s-expid-dropdown', 'search_value')
 )
-def initialize(nav, data):
+def initialize(nav, data, search_val):
     """
-    Populate the experiment ID dropdowns with a small list
+    Populate the experiment ID dropdowns with a small list, again each time app.py publishes newly loaded experiment
+    IDs unless a search is showing its results
     :param nav: the hook to listen for navigation events to this page
     :param data: dcc.Store: the container object of pre-loaded experiment IDs
+    :param search_val: string: the searched experiment ID
     :return: list: list of label: value dict objects to populate dropdown
     """
+    if data is None or search_val:
+        raise PreventUpdate
     print('Initialized Invivo Experiment ID dropdown')
     return [{"label": x, "value": x} for x in data['invivo_dict'].keys()]
 
@@ -96,21 +100,10 @@ def initialize(nav, data):
     prevent_initial_call=True
 )
 def update_expids_by_search(search_val):
-    return [{'label': d['expid'], 'value': d['expid']} for d in dataService.INVIVO_COLL.aggregate([
-        {
-            '$match': {
-                'expid': {'$regex': search_val}
-            }
-        }, {
-            '$project': {
-                '_id': 0,
-                'expid': 1
-            }
-
-        }, {
-            '$limit': 15
-        }
-    ])]
+    if not search_val:
+        raise PreventUpdate
+    expids = dataService.search_expids(dataService.INVIVO_COLL, search_val, 15)
+    return [{'label': x, 'value': x} for x in expids]
 
 @dash.callback(
     Output('s-exp-dropdown', 'options'),
@@ -180,7 +173,7 @@ def get_graphs(active_tab, group, exp, expid):
     Facilitates the process of generating the graphs and wrapping them in component object containers to be rendered.
     :param active_tab: string: the currently selected tab
     :param group: int: the currently selected group number
-    :param exp: int: the selected NSC
+    :param exp: int: the selected experiment number
     :param expid: string: the experiment ID searched on
     :return: dcc.Component: container of a set of plots to be rendered
     """
@@ -194,7 +187,7 @@ def get_graphs(active_tab, group, exp, expid):
             return get_summary_components(expid, exp)
         # This creates a Kaplan-Meier curve for a given group along with the control group
         if active_tab == 'survival-tab':
-            return dcc.Graph(figure=dataService.get_km_graph(expid, group))
+            return dcc.Graph(figure=dataService.get_km_graph(expid, group, exp))
         # This creates scatter-line plots of net weight and tumor weight
         if active_tab == 'average-tab':
             figures = dataService.get_anml_weight_graphs(expid, exp, group)
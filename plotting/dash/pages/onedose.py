@@ -6,6 +6,7 @@ This page represents the content necessary to render all things for the One Dose
 import dash
 from dash import html, dcc, Input, Output, State, ctx
 import dash_bootstrap_components as dbc
+from dash.exceptions import PreventUpdate
 
 from .dataservice import dataService
 
@@ -63,16 +64,19 @@ def get_left_select(nsc, expid):
 @dash.callback(
     Output("od-expid-dropdown", "options"),
     Input("onedose-nav", "id"),
-    State("app-store", "data")
+    Input("app-store", "data")
 )
 def initialize(nav, data):
     """
-    Provides the 25 pre-loaded experiment IDs from the dcc.Store object.
+    Provides the 25 pre-loaded experiment IDs from the dcc.Store object, again each time app.py publishes newly
+    loaded ones.
     :param nav: dummy object used to help hook
     :param data: dcc.Store component that contains application data loaded in app.py
     :return: list: the list of labels and values stored in the onedose_dict of 25 or less
                     in the left menu dropdown selections.
     """
+    if data is None:
+        raise PreventUpdate
     return [{"label": x, "value": x} for x in data['onedose_dict'].keys()]
 
 
@@ -81,21 +85,26 @@ def initialize(nav, data):
     Output(component_id='od-nsc-dropdown', component_property='value'),
     Output(component_id='od-submit-button', component_property='disabled'),
     Input(component_id='od-expid-dropdown', component_property='value'),
-    State("app-store", "data"),
+    Input("app-store", "data"),
+    State(component_id='od-nsc-dropdown', component_property='value'),
     prevent_initial_call=True
 )
-def get_nscs(expid, data):
+def get_nscs(expid, data, selected):
     """
-    Retrieves associated NSCs with the provided experiment ID.
+    Retrieves associated NSCs with the provided experiment ID, again when app.py publishes newly loaded ones.
     :param expid: onedose experiment ID
     :param data: dcc.Store accessor object
+    :param selected: the NSC currently selected, kept when the store is refreshed and still has it
     :return: list: list of NSCs in the experiment
             string: displayed value of populated dropdown for user experience
             boolean: enable or disable the button to submit for data
     """
-    nscs = data['onedose_dict'][expid]
+    if expid is None or data is None:
+        raise PreventUpdate
+    nscs = data['onedose_dict'].get(expid, [])
     if len(nscs) > 0:
-        return [{"label": x, "value": x} for x in nscs], nscs[0], False
+        value = selected if ctx.triggered_id == 'app-store' and selected in nscs else nscs[0]
+        return [{"label": x, "value": x} for x in nscs], value, False
     else:
         return [], 'None Found', True
 
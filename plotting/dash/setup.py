@@ -8,12 +8,12 @@ setup(
               'dash-bootstrap-components',
               'pandas',
               'numpy',
-              'lifelines',
               'matplotlib',
               'pymongo',
               'dotenv',
               'rdkit',
-              'dash_bio'
+              'dash_bio',
+              'pyarrow'
               ],
     url='',
     license='',